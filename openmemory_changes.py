@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+OpenMemory 记忆变更订阅
+把每个用户的记忆暴露为 MCP 资源，客户端订阅后在增删改时收到
+``notifications/resources/updated``，再按序号增量拉取变更，不必反复调用
+list_memories 下载全部记忆。
+
+资源地址：
+- ``memory://users/{user_id}``：用户的全部记忆及当前序号 ``seq``（完整同步）；
+- ``memory://users/{user_id}/changes?since=N``：序号大于 N 的变更（增量同步）。
+
+变更序号单调递增。内存中只保留最近 ``OPENMEMORY_CHANGE_RETENTION`` 条变更，
+``since`` 早于保留范围（或来自重启前）时返回 ``complete: false``，客户端应
+重新读取完整资源。
+"""
+
+import json
+import os
+import sys
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+URI_PREFIX = "memory://users/"
+SNAPSHOT_TEMPLATE = URI_PREFIX + "{user_id}"
+CHANGES_TEMPLATE = URI_PREFIX + "{user_id}/changes{?since}"
+
+
+def user_uri(user_id: str) -> str:
+    return URI_PREFIX + quote(user_id, safe="")
+
+
+def parse_uri(uri: str) -> Tuple[str, Optional[int]]:
+    """解析资源地址，返回 (user_id, since)；完整资源的 since 为 None"""
+    uri = str(uri)
+    if not uri.startswith(URI_PREFIX):
+        raise ValueError(f"未知资源: {uri}")
+    parts = urlsplit(uri)
+    path = parts.path.strip("/")
+    if path.endswith("/changes"):
+        since = parse_qs(parts.query).get("since", ["0"])[0]
+        try:
+            return unquote(path[:-len("/changes")]), int(since)
+        except ValueError:
+            raise ValueError(f"无效的序号: {since}")
+    if not path or "/" in path:
+        raise ValueError(f"未知资源: {uri}")
+    return unquote(path), None
+
+
+class ChangeFeed:
+    """按序号记录记忆变更，并向订阅者推送资源更新通知"""
+
+    def __init__(self, start_seq: int = 0, retention: Optional[int] = None):
+        self.seq = start_seq
+        # 保留的变更都晚于该序号；更早的增量请求无法满足
+        self.floor = start_seq
+        self.retention = retention or int(os.getenv("OPENMEMORY_CHANGE_RETENTION", "10000"))
+        self._changes: deque = deque()
+        self._subscriptions: Dict[str, Set[Any]] = {}  # uri -> 会话集合
+        self._users: Set[str] = set()
+        self.notifications_sent = 0
+
+    # --- 变更记录 ---
+
+    def record(self, user_id: str, op: str, memory_id: Optional[str] = None,
+               memory: Optional[dict] = None, seq: Optional[int] = None) -> int:
+        """记录一次变更；调用方有持久化序号（如存储日志序号）时传入 seq"""
+        self.seq = max(self.seq + 1, seq or 0)
+        change = {"seq": self.seq, "op": op, "user_id": user_id}
+        if memory_id is not None:
+            change["id"] = memory_id
+        if memory is not None:
+            change["memory"] = memory
+        self._changes.append(change)
+        if len(self._changes) > self.retention:
+            self.floor = self._changes.popleft()["seq"]
+        if op == "delete_all":
+            self._users.discard(user_id)
+        else:
+            self._users.add(user_id)
+        return self.seq
+
+    def known_users(self) -> List[str]:
+        """本进程内有过变更的用户"""
+        return sorted(self._users)
+
+    def changes_since(self, user_id: str, since: int) -> dict:
+        complete = self.floor <= since <= self.seq
+        changes = [c for c in self._changes if c["seq"] > since and c["user_id"] == user_id] if complete else []
+        return {"user_id": user_id, "since": since, "seq": self.seq, "complete": complete, "changes": changes}
+
+    # --- 资源内容 ---
+
+    def snapshot_json(self, user_id: str, memories: Iterable[dict], seq: Optional[int] = None) -> str:
+        """完整资源；seq 应在读取记忆之前取得，之后的变更可能重复出现但不会丢失"""
+        memories = list(memories)
+        return json.dumps({
+            "user_id": user_id,
+            "seq": self.seq if seq is None else seq,
+            "count": len(memories),
+            "memories": memories,
+        }, ensure_ascii=False, default=str)
+
+    def changes_json(self, user_id: str, since: int) -> str:
+        return json.dumps(self.changes_since(user_id, since), ensure_ascii=False, default=str)
+
+    # --- 订阅 ---
+
+    def subscribe(self, uri: str, session):
+        parse_uri(uri)
+        self._subscriptions.setdefault(str(uri), set()).add(session)
+
+    def unsubscribe(self, uri: str, session):
+        sessions = self._subscriptions.get(str(uri))
+        if sessions is not None:
+            sessions.discard(session)
+            if not sessions:
+                del self._subscriptions[str(uri)]
+
+    async def notify(self, user_id: str):
+        """通知订阅了该用户任一资源的会话；发送失败的会话视为已断开"""
+        for uri, sessions in list(self._subscriptions.items()):
+            try:
+                if parse_uri(uri)[0] != user_id:
+                    continue
+            except ValueError:
+                continue
+            for session in list(sessions):
+                try:
+                    await session.send_resource_updated(uri)
+                    self.notifications_sent += 1
+                except Exception as e:
+                    print(f"发送资源更新通知失败: {e}", file=sys.stderr)
+                    self.unsubscribe(uri, session)
+
+    async def publish(self, user_id: str, op: str, memory_id: Optional[str] = None,
+                      memory: Optional[dict] = None, seq: Optional[int] = None) -> int:
+        seq = self.record(user_id, op, memory_id, memory, seq)
+        await self.notify(user_id)
+        return seq
+
+    async def publish_mem0(self, user_id: str, results: Iterable[Any]) -> int:
+        """记录 Mem0 add 返回的全部事件，只通知一次"""
+        changes = mem0_changes(results)
+        for op, memory_id, memory in changes:
+            self.record(user_id, op, memory_id, memory)
+        if changes:
+            await self.notify(user_id)
+        return self.seq
+
+    def status(self) -> dict:
+        return {
+            "seq": self.seq,
+            "floor": self.floor,
+            "retained_changes": len(self._changes),
+            "subscriptions": sum(len(s) for s in self._subscriptions.values()),
+            "notifications_sent": self.notifications_sent,
+        }
+
+
+MEM0_EVENTS = {"ADD": "add", "UPDATE": "update", "DELETE": "delete"}
+
+
+def mem0_changes(results: Iterable[Any]) -> List[Tuple[str, Optional[str], Optional[dict]]]:
+    """把 Mem0 add 返回的事件（推理可能产生更新或删除）转为 (op, id, memory)"""
+    changes = []
+    for item in results:
+        if not isinstance(item, dict):
+            continue
+        op = MEM0_EVENTS.get(str(item.get("event", "ADD")).upper())
+        if op is None:
+            continue
+        changes.append((op, item.get("id"), None if op == "delete" else item))
+    return changes
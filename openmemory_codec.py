@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+OpenMemory 块压缩
+记忆文本很短且高度重复，逐块单独压缩效果有限；用从语料训练出的共享字典
+做预置字典后，小块也能获得较好的压缩率。默认使用标准库 zlib，安装了
+zstandard 时可选 zstd。
+
+每个压缩块带有自描述头部 ``MAGIC + 编码 + 字典ID``，更换编码或重新训练
+字典后旧块仍可读取。
+"""
+
+import random
+import re
+import struct
+import sys
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+MAGIC = b"OMC1"
+CODECS = ("none", "zlib", "zstd")
+_HEADER = struct.Struct(">4sBI")  # magic, 编码序号, 字典ID（0 表示无字典）
+
+# zlib 的预置字典最多利用 32KB 窗口
+DICT_SIZE = 32 * 1024
+TRAIN_SAMPLES = 5000
+
+_TOKEN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def _train_raw_dictionary(texts: List[str], size: int) -> bytes:
+    """统计高频词和相邻词对，按 频次×长度 取值最高的片段拼成字典
+
+    价值最高的片段放在末尾：zlib 匹配距离越近编码越短。
+    """
+    counts = Counter()
+    for text in texts:
+        tokens = _TOKEN.findall(text)
+        counts.update(tokens)
+        counts.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    scored = sorted(
+        ((count * len(piece.encode("utf-8")), piece) for piece, count in counts.items() if count > 1),
+        reverse=True
+    )
+    pieces = []
+    used = 0
+    for _, piece in scored:
+        data = piece.encode("utf-8") + b" "
+        if used + len(data) > size:
+            break
+        pieces.append(data)
+        used += len(data)
+    return b"".join(reversed(pieces))
+
+
+class BlockCodec:
+    """带共享字典的块压缩器"""
+
+    def __init__(self, codec: str = "zlib", level: int = 6):
+        if codec not in CODECS:
+            raise ValueError(f"不支持的压缩编码: {codec}")
+        if codec == "zstd" and not ZSTD_AVAILABLE:
+            print("Warning: zstandard not installed, falling back to zlib. Install with: pip install zstandard",
+                  file=sys.stderr)
+            codec = "zlib"
+        self.codec = codec
+        self.level = level
+        self.dictionaries: Dict[int, bytes] = {}
+        self.current_dict = 0
+        self.trained_on = 0  # 训练当前字典时的记忆数量
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self._zstd_dicts: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.codec != "none"
+
+    # --- 字典 ---
+
+    def should_train(self, corpus_size: int) -> bool:
+        """尚无字典，或语料规模比上次训练时翻倍"""
+        return self.enabled and corpus_size > 0 and (not self.current_dict or corpus_size >= 2 * self.trained_on)
+
+    def train(self, texts: Iterable[str], corpus_size: int):
+        texts = list(texts)
+        if len(texts) > TRAIN_SAMPLES:
+            texts = random.sample(texts, TRAIN_SAMPLES)
+        data = b""
+        if self.codec == "zstd":
+            try:
+                data = zstandard.train_dictionary(DICT_SIZE, [t.encode("utf-8") for t in texts]).as_bytes()
+            except zstandard.ZstdError:
+                # 样本太少时 zstd 无法训练，退回原始内容字典
+                data = b""
+        if not data:
+            data = _train_raw_dictionary(texts, DICT_SIZE)
+        if not data:
+            return
+        dict_id = max(self.dictionaries, default=0) + 1
+        self.dictionaries[dict_id] = data
+        self.current_dict = dict_id
+        self.trained_on = corpus_size
+
+    def _zstd_dict(self, dict_id: int):
+        zdict = self._zstd_dicts.get(dict_id)
+        if zdict is None:
+            data = self.dictionaries[dict_id]
+            if data.startswith(b"\x37\xa4\x30\xec"):
+                zdict = zstandard.ZstdCompressionDict(data)
+            else:
+                zdict = zstandard.ZstdCompressionDict(data, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+            self._zstd_dicts[dict_id] = zdict
+        return zdict
+
+    # --- 编解码 ---
+
+    def encode(self, data: bytes) -> bytes:
+        codec_no = CODECS.index(self.codec)
+        dict_id = self.current_dict
+        if self.codec == "zlib":
+            if dict_id:
+                compressor = zlib.compressobj(self.level, zdict=self.dictionaries[dict_id])
+            else:
+                compressor = zlib.compressobj(self.level)
+            payload = compressor.compress(data) + compressor.flush()
+        elif self.codec == "zstd":
+            dict_data = self._zstd_dict(dict_id) if dict_id else None
+            payload = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data).compress(data)
+        else:
+            payload, dict_id = data, 0
+        blob = _HEADER.pack(MAGIC, codec_no, dict_id) + payload
+        self.account(len(data), len(blob))
+        return blob
+
+    def decode(self, blob: bytes) -> bytes:
+        if not blob.startswith(MAGIC):
+            # 早期版本的冷存储段是不带头部的 zlib 流
+            return zlib.decompress(blob)
+        _, codec_no, dict_id = _HEADER.unpack_from(blob)
+        payload = memoryview(blob)[_HEADER.size:]
+        codec = CODECS[codec_no]
+        if codec == "zlib":
+            if dict_id:
+                decompressor = zlib.decompressobj(zdict=self.dictionaries[dict_id])
+            else:
+                decompressor = zlib.decompressobj()
+            return decompressor.decompress(payload) + decompressor.flush()
+        if codec == "zstd":
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("该数据使用zstd压缩，请安装 zstandard")
+            dict_data = self._zstd_dict(dict_id) if dict_id else None
+            return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(payload)
+        return bytes(payload)
+
+    # --- 持久化与统计 ---
+
+    def state(self) -> dict:
+        return {
+            "codec": self.codec,
+            "dictionaries": dict(self.dictionaries),
+            "current_dict": self.current_dict,
+            "trained_on": self.trained_on,
+        }
+
+    def load_state(self, state: Optional[dict]):
+        """恢复字典；编码本身仍以当前配置为准"""
+        if not state:
+            return
+        self.dictionaries = dict(state.get("dictionaries", {}))
+        self._zstd_dicts = {}
+        if state.get("codec") == self.codec:
+            self.current_dict = state.get("current_dict", 0)
+            self.trained_on = state.get("trained_on", 0)
+
+    def account(self, raw_bytes: int, compressed_bytes: int):
+        """计入压缩统计；启动时加载的快照块也要计入，否则重启后没有压缩率"""
+        self.raw_bytes += raw_bytes
+        self.compressed_bytes += compressed_bytes
+
+    def stats(self) -> dict:
+        return {
+            "codec": self.codec,
+            "dictionary_bytes": len(self.dictionaries.get(self.current_dict, b"")),
+            "dictionaries": len(self.dictionaries),
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "ratio": round(self.raw_bytes / self.compressed_bytes, 2) if self.compressed_bytes else None,
+        }
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+OpenMemory 响应编码
+为各个 MCP 服务器提供紧凑、可选字段的记忆结果编码，减少 stdio 传输字节数
+和客户端模型需要消费的 token。
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+# pretty: 各服务器原有的展示格式；json: 紧凑JSON；text: 每条一行的极简文本
+FORMATS = ("pretty", "json", "text")
+
+# 仅 json / text 格式支持的选项
+PROJECTION_OPTIONS = ("fields", "max_text_chars", "max_bytes")
+
+# 截断时优先处理的正文字段（简化版为 text，Mem0 为 memory）
+TEXT_FIELDS = ("text", "memory")
+
+# 追加到各工具 inputSchema.properties 中的通用参数
+FORMAT_SCHEMA = {
+    "format": {"type": "string", "enum": list(FORMATS), "description": "响应格式：pretty（默认，指定 fields / max_text_chars / max_bytes 时为 json）、json（紧凑JSON）、text（极简文本）"},
+    "fields": {"type": "array", "items": {"type": "string"}, "description": "仅返回这些字段，例如 [\"id\", \"text\"]"},
+    "max_text_chars": {"type": "integer", "description": "每条记忆正文的最大字符数，超出部分截断"},
+    "max_bytes": {"type": "integer", "description": "响应的最大字节数（含外层结构），放不下的记忆条目将被省略，第一条放不下时截断其正文"}
+}
+
+_compact = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def format_options(arguments: dict) -> Dict[str, Any]:
+    """从工具参数中提取编码选项
+
+    pretty 是各服务器的展示格式，不做投影和截断：指定了投影选项而未指定
+    格式时改用 json，显式要求 pretty 时报错。
+    """
+    projection = [key for key in PROJECTION_OPTIONS if arguments.get(key)]
+    fmt = arguments.get("format") or ("json" if projection else "pretty")
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的响应格式: {fmt}")
+    if fmt == "pretty" and projection:
+        raise ValueError(f"pretty 格式不支持 {', '.join(projection)}，请使用 json 或 text 格式")
+    return {
+        "fmt": fmt,
+        "fields": arguments.get("fields") or None,
+        "max_text_chars": arguments.get("max_text_chars") or None,
+        "max_bytes": arguments.get("max_bytes") or None,
+    }
+
+
+def unwrap_results(results: Any) -> List[Any]:
+    """兼容 Mem0 新旧版本：既可能返回列表，也可能返回 {"results": [...]}"""
+    if isinstance(results, dict) and isinstance(results.get("results"), list):
+        return results["results"]
+    if isinstance(results, list):
+        return results
+    return [results]
+
+
+def _project(item: Any, fields: Optional[List[str]], max_text_chars: Optional[int]) -> Any:
+    """字段投影并截断正文"""
+    if not isinstance(item, dict):
+        return item
+    if fields:
+        item = {key: item[key] for key in fields if key in item}
+    if max_text_chars:
+        for key in TEXT_FIELDS:
+            value = item.get(key)
+            if isinstance(value, str) and len(value) > max_text_chars:
+                # 不修改存储中的原始记录
+                item = {**item, key: value[:max_text_chars] + "…"}
+    return item
+
+
+def _text_line(item: Any) -> str:
+    if not isinstance(item, dict):
+        return str(item)
+    return "\t".join(str(value).replace("\n", " ") for value in item.values())
+
+
+def _wrap(fmt: str, parts: List[str], omitted: int) -> str:
+    if fmt == "json":
+        tail = f',"omitted":{omitted}}}' if omitted else "}"
+        return f'{{"count":{len(parts)},"results":[' + ",".join(parts) + "]" + tail
+    text = "\n".join(parts)
+    if omitted:
+        text += f"\n… +{omitted}"
+    return text
+
+
+def _overhead(fmt: str, count: int, omitted: int) -> int:
+    """count 条结果、省略 omitted 条时，条目之外的字节数（外层结构、分隔符、省略提示）"""
+    separators = max(count - 1, 0)
+    if fmt == "json":
+        size = len(f'{{"count":{count},"results":[]}}') + separators
+        return size + (len(f',"omitted":{omitted}') if omitted else 0)
+    return separators + (len(f"\n… +{omitted}".encode("utf-8")) if omitted else 0)
+
+
+def _fit(item: Any, encode, budget: int) -> Optional[str]:
+    """截断正文使单条记录不超过 budget 字节，无法放下时返回 None"""
+    if budget <= 0 or not isinstance(item, dict):
+        return None
+    key = next((k for k in TEXT_FIELDS if isinstance(item.get(k), str)), None)
+    if key is None:
+        return None
+    value = item[key]
+    best = None
+    low, high = 0, len(value) - 1
+    while low <= high:
+        middle = (low + high) // 2
+        part = encode({**item, key: value[:middle] + "…"})
+        if len(part.encode("utf-8")) <= budget:
+            best, low = part, middle + 1
+        else:
+            high = middle - 1
+    return best
+
+
+def encode_results(items: Iterable[Any], fmt: str = "json", fields: Optional[List[str]] = None,
+                   max_text_chars: Optional[int] = None, max_bytes: Optional[int] = None) -> str:
+    """单次遍历完成投影、截断和编码，输出不超过 max_bytes 字节
+
+    json 格式输出 ``{"count":N,"results":[...]}``，有条目被省略时附带
+    ``"omitted":K``；text 格式每条一行，字段以制表符分隔。预算包含外层结构
+    和省略提示；第一条就放不下时截断其正文，仍放不下则省略。预算小到连
+    空结果都放不下时，只输出空结果。
+    """
+    items = list(items)
+    encode = _compact if fmt == "json" else _text_line
+    parts = []
+    used = 0
+    for item in items:
+        item = _project(item, fields, max_text_chars)
+        part = encode(item)
+        size = len(part.encode("utf-8"))
+        if max_bytes:
+            count = len(parts) + 1
+            budget = max_bytes - used - _overhead(fmt, count, len(items) - count)
+            if size > budget:
+                if not parts:
+                    part = _fit(item, encode, budget)
+                    if part is not None:
+                        parts.append(part)
+                break
+        parts.append(part)
+        used += size
+    return _wrap(fmt, parts, len(items) - len(parts))
@@ -8,19 +8,53 @@ import asyncio
 import json
 import sys
 import os
+import time
 from typing import Any, Dict, List, Optional
 
-from mem0 import Memory
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
 from mcp.server.stdio import stdio_server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 from mcp.types import (
     Tool,
     TextContent,
+    Resource,
+    ResourceTemplate,
 )
 
-# Initialize Mem0 memory
-memory = Memory()
+from openmemory_format import FORMAT_SCHEMA, encode_results, format_options, unwrap_results
+from openmemory_ingest import IngestQueue
+from openmemory_scheduler import FairScheduler, SchedulerRejected
+from openmemory_profiling import CallProfiler, phase, to_thread
+from openmemory_mem0_config import build_mem0_config, describe_config, get_memory
+from openmemory_changes import CHANGES_TEMPLATE, SNAPSHOT_TEMPLATE, ChangeFeed, parse_uri, user_uri
+
+# Mem0 config from OPENMEMORY_MEM0_CONFIG and env vars (local vector store,
+# embedder and LLM); None keeps Mem0's defaults
+mem0_config = build_mem0_config()
+
+# Initialize Mem0 memory, shared by every tool call and the ingest workers
+memory = get_memory(mem0_config)
+
+# Memory change feed for resource subscriptions. Mem0 has no persistent change
+# counter, so sequence numbers start from the current time in microseconds and
+# stay ahead of anything a client saw before a restart.
+change_feed = ChangeFeed(start_seq=time.time_ns() // 1000)
+
+async def _process_ingest(job: dict):
+    """Run a queued add_memories job in the background."""
+    result = await asyncio.to_thread(memory.add, job["text"], user_id=job["user_id"], metadata=job["metadata"])
+    await change_feed.publish_mem0(job["user_id"], unwrap_results(result))
+    return result
+
+# Persistent queue for asynchronous add_memories
+ingest_queue = IngestQueue(_process_ingest)
+
+# Per-user fair scheduling, concurrency limits and rate limits for tool calls
+scheduler = FairScheduler()
+
+# Opt-in sampled profiling and slow-call log, controlled by env vars
+call_profiler = CallProfiler()
 
 class OpenMemoryMCPServer:
     def __init__(self):
@@ -28,6 +62,56 @@ class OpenMemoryMCPServer:
         self._setup_handlers()
     
     def _setup_handlers(self):
+        @self.server.list_resources()
+        async def handle_list_resources() -> List[Resource]:
+            """Expose each user's memories as a resource (users seen since startup)."""
+            return [
+                Resource(
+                    uri=user_uri(user_id),
+                    name=f"Memories of {user_id}",
+                    description="All memories of the user; subscribe for change notifications and read /changes?since=SEQ to resync",
+                    mimeType="application/json"
+                )
+                for user_id in change_feed.known_users()
+            ]
+        
+        @self.server.list_resource_templates()
+        async def handle_list_resource_templates() -> List[ResourceTemplate]:
+            return [
+                ResourceTemplate(
+                    uriTemplate=SNAPSHOT_TEMPLATE,
+                    name="User memories",
+                    description="All memories of a user with the current change sequence number",
+                    mimeType="application/json"
+                ),
+                ResourceTemplate(
+                    uriTemplate=CHANGES_TEMPLATE,
+                    name="Memory changes",
+                    description="Changes after sequence number since; reread the full resource when complete is false",
+                    mimeType="application/json"
+                ),
+            ]
+        
+        @self.server.read_resource()
+        async def handle_read_resource(uri) -> List[ReadResourceContents]:
+            user_id, since = parse_uri(str(uri))
+            if since is None:
+                # Take the sequence number first: changes racing the listing may be replayed, never lost
+                seq = change_feed.seq
+                results = await asyncio.to_thread(memory.get_all, user_id=user_id)
+                text = change_feed.snapshot_json(user_id, unwrap_results(results), seq=seq)
+            else:
+                text = change_feed.changes_json(user_id, since)
+            return [ReadResourceContents(content=text, mime_type="application/json")]
+        
+        @self.server.subscribe_resource()
+        async def handle_subscribe_resource(uri) -> None:
+            change_feed.subscribe(str(uri), self.server.request_context.session)
+        
+        @self.server.unsubscribe_resource()
+        async def handle_unsubscribe_resource(uri) -> None:
+            change_feed.unsubscribe(str(uri), self.server.request_context.session)
+        
         @self.server.list_tools()
         async def handle_list_tools() -> List[Tool]:
             """List available memory tools."""
@@ -40,7 +124,8 @@ class OpenMemoryMCPServer:
                         "properties": {
                             "text": {"type": "string", "description": "The text to store as memory"},
                             "user_id": {"type": "string", "description": "User identifier", "default": "default_user"},
-                            "metadata": {"type": "object", "description": "Optional metadata for the memory"}
+                            "metadata": {"type": "object", "description": "Optional metadata for the memory"},
+                            "async": {"type": "boolean", "description": "Return a job ID immediately and store the memory in the background", "default": False}
                         },
                         "required": ["text"]
                     }
@@ -53,7 +138,8 @@ class OpenMemoryMCPServer:
                         "properties": {
                             "query": {"type": "string", "description": "Search query"},
                             "user_id": {"type": "string", "description": "User identifier", "default": "default_user"},
-                            "limit": {"type": "integer", "description": "Maximum number of results", "default": 10}
+                            "limit": {"type": "integer", "description": "Maximum number of results", "default": 10},
+                            **FORMAT_SCHEMA
                         },
                         "required": ["query"]
                     }
@@ -64,7 +150,19 @@ class OpenMemoryMCPServer:
                     inputSchema={
                         "type": "object",
                         "properties": {
-                            "user_id": {"type": "string", "description": "User identifier", "default": "default_user"}
+                            "user_id": {"type": "string", "description": "User identifier", "default": "default_user"},
+                            **FORMAT_SCHEMA
+                        }
+                    }
+                ),
+                Tool(
+                    name="get_ingest_status",
+                    description="Report the status of queued add_memories jobs",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "job_id": {"type": "string", "description": "Job ID (optional)"},
+                            "user_id": {"type": "string", "description": "Only count jobs for this user (optional)"}
                         }
                     }
                 ),
@@ -80,17 +178,26 @@ class OpenMemoryMCPServer:
                 )
             ]
 
-        @self.server.call_tool()
-        async def handle_call_tool(name: str, arguments: dict) -> List[TextContent]:
-            """Handle tool calls."""
+        async def dispatch_tool(name: str, arguments: dict) -> List[TextContent]:
+            """Execute a single tool call."""
             try:
                 if name == "add_memories":
                     text = arguments.get("text", "")
                     user_id = arguments.get("user_id", "default_user")
                     metadata = arguments.get("metadata", {})
                     
+                    if arguments.get("async"):
+                        job_id = await ingest_queue.submit(text, user_id, metadata)
+                        return [TextContent(
+                            type="text",
+                            text=f"Memory queued for ingestion, job ID: {job_id}"
+                        )]
+                    
                     # Add memory using Mem0
-                    result = memory.add(text, user_id=user_id, metadata=metadata)
+                    with phase("mem0"):
+                        result = await to_thread(memory.add, text, user_id=user_id, metadata=metadata)
+                    with phase("notify"):
+                        await change_feed.publish_mem0(user_id, unwrap_results(result))
                     
                     return [TextContent(
                         type="text",
@@ -102,8 +209,18 @@ class OpenMemoryMCPServer:
                     user_id = arguments.get("user_id", "default_user")
                     limit = arguments.get("limit", 10)
                     
+                    # Validate format options before querying
+                    options = format_options(arguments)
+                    
                     # Search memories using Mem0
-                    results = memory.search(query, user_id=user_id, limit=limit)
+                    with phase("mem0"):
+                        results = await to_thread(memory.search, query, user_id=user_id, limit=limit)
+                    
+                    if options["fmt"] != "pretty":
+                        return [TextContent(
+                            type="text",
+                            text=encode_results(unwrap_results(results), **options)
+                        )]
                     
                     return [TextContent(
                         type="text",
@@ -113,19 +230,43 @@ class OpenMemoryMCPServer:
                 elif name == "list_memories":
                     user_id = arguments.get("user_id", "default_user")
                     
+                    options = format_options(arguments)
+                    
                     # Get all memories using Mem0
-                    results = memory.get_all(user_id=user_id)
+                    with phase("mem0"):
+                        results = await to_thread(memory.get_all, user_id=user_id)
+                    
+                    if options["fmt"] != "pretty":
+                        return [TextContent(
+                            type="text",
+                            text=encode_results(unwrap_results(results), **options)
+                        )]
                     
                     return [TextContent(
                         type="text",
                         text=f"All memories:\n{json.dumps(results, indent=2)}"
                     )]
                 
+                elif name == "get_ingest_status":
+                    status = ingest_queue.status(arguments.get("job_id"), arguments.get("user_id"))
+                    status["scheduler"] = scheduler.status()
+                    status["profiling"] = call_profiler.status()
+                    status["mem0"] = describe_config(mem0_config)
+                    status["changes"] = change_feed.status()
+                    
+                    return [TextContent(
+                        type="text",
+                        text=f"Ingest status:\n{json.dumps(status, indent=2)}"
+                    )]
+                
                 elif name == "delete_all_memories":
                     user_id = arguments.get("user_id", "default_user")
                     
                     # Delete all memories using Mem0
-                    result = memory.delete_all(user_id=user_id)
+                    with phase("mem0"):
+                        result = await to_thread(memory.delete_all, user_id=user_id)
+                    with phase("notify"):
+                        await change_feed.publish(user_id, "delete_all")
                     
                     return [TextContent(
                         type="text",
@@ -144,7 +285,31 @@ class OpenMemoryMCPServer:
                     text=f"Error executing {name}: {str(e)}"
                 )]
 
+        @self.server.call_tool()
+        async def handle_call_tool(name: str, arguments: dict) -> List[TextContent]:
+            """Handle tool calls after admission by the scheduler."""
+            arguments = arguments or {}
+            user_id = arguments.get("user_id", "default_user")
+            async with call_profiler.profile(name, user_id, arguments) as call:
+                try:
+                    async with scheduler.admit(name, user_id):
+                        if call:
+                            call.lap("queue")
+                        return await dispatch_tool(name, arguments)
+                except SchedulerRejected as e:
+                    return [TextContent(
+                        type="text",
+                        text=f"Request rejected: {str(e)}"
+                    )]
+
     async def run(self):
+        await ingest_queue.start()
+        capabilities = self.server.get_capabilities(
+            notification_options=NotificationOptions(),
+            experimental_capabilities={}
+        )
+        # get_capabilities never advertises resource subscriptions on its own
+        capabilities.resources.subscribe = True
         async with stdio_server() as (read_stream, write_stream):
             await self.server.run(
                 read_stream,
@@ -152,10 +317,7 @@ class OpenMemoryMCPServer:
                 InitializationOptions(
                     server_name="openmemory",
                     server_version="1.0.0",
-                    capabilities=self.server.get_capabilities(
-                        notification_options=NotificationOptions(),
-                        experimental_capabilities={}
-                    )
+                    capabilities=capabilities
                 )
             )
 
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+OpenMemory 简化版搜索索引
+按用户维护三元组（trigram）倒排索引：``{user_id: {trigram: array('I', [slot, ...])}}``，
+slot 是记忆在该用户列表中的位置。任何长度不小于 3 的子串都必然包含其所有
+三元组，因此子串搜索只需在倒排表的交集中验证候选，而不必扫描用户的全部记忆。
+
+倒排表只追加：删除或更新后留下的过期条目在验证阶段被过滤，用户列表压缩时
+整体重建。模糊搜索同样从倒排表收集共享足够多三元组的候选，再用带提前截断
+的编辑距离验证。
+
+大存储启动时可以按用户分片，在多个进程中并行构建；各进程把分片的倒排表以
+原始字节写入临时文件，主进程直接按字节恢复为数组。
+"""
+
+import marshal
+import multiprocessing
+import os
+import tempfile
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set
+
+TokenIndex = Dict[str, array]
+
+# 记忆总数低于此值时并行构建得不偿失
+PARALLEL_MIN_MEMORIES = int(os.getenv("OPENMEMORY_PARALLEL_INDEX_MIN", "50000"))
+
+# fork 模式下子进程直接继承该对象，避免把整个存储序列化给子进程
+_SOURCE: Optional[Dict[str, list]] = None
+
+
+def trigrams(text: str) -> Set[str]:
+    """返回文本（已小写）的三元组集合"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def index_add(index: TokenIndex, slot: int, text: str):
+    for gram in trigrams(text.lower()):
+        postings = index.get(gram)
+        if postings is None:
+            index[gram] = array("I", (slot,))
+        else:
+            postings.append(slot)
+
+
+def build_user_index(user_memories: List[Optional[dict]]) -> TokenIndex:
+    index: TokenIndex = {}
+    for slot, memory in enumerate(user_memories):
+        if memory is not None:
+            index_add(index, slot, memory["text"])
+    return index
+
+
+def candidates(index: TokenIndex, query_lower: str) -> Optional[Set[int]]:
+    """返回可能包含该子串的槽位；查询过短无法使用索引时返回None
+
+    结果可能包含已删除或已更新的过期槽位，调用方需要验证。
+    """
+    grams = trigrams(query_lower)
+    if not grams:
+        return None
+    postings = []
+    for gram in grams:
+        slots = index.get(gram)
+        if not slots:
+            return set()
+        postings.append(slots)
+    postings.sort(key=len)
+    result = set(postings[0])
+    for slots in postings[1:]:
+        result.intersection_update(slots)
+        if not result:
+            break
+    return result
+
+
+def default_max_distance(query_lower: str) -> int:
+    """未指定时的编辑距离上限：约每 6 个字符允许 1 处错误
+
+    三元组过滤的下界是 ``len(grams) - 3 * max_distance``。按每 3 个字符 1 处
+    错误取值时，下界对任何长度的查询都不超过 1，只要共享一个三元组就成为
+    候选，几乎等于全量扫描；按每 6 个字符取值，下界约为三元组数的一半。
+    """
+    return max(1, len(query_lower) // 6)
+
+
+def fuzzy_candidates(index: TokenIndex, query_lower: str, max_distance: int) -> Dict[int, int]:
+    """返回与查询共享足够多三元组的槽位及其共享数
+
+    每次编辑最多破坏 3 个三元组，因此编辑距离不超过 ``max_distance`` 的
+    匹配至少共享 ``len(grams) - 3 * max_distance`` 个三元组（至少为 1）。
+    """
+    grams = trigrams(query_lower)
+    if not grams:
+        return {}
+    shared = Counter()
+    for gram in grams:
+        postings = index.get(gram)
+        if postings:
+            shared.update(postings)
+    threshold = max(1, len(grams) - 3 * max_distance)
+    return {slot: count for slot, count in shared.items() if count >= threshold}
+
+
+def substring_distance(pattern: str, text: str, max_distance: int) -> Optional[int]:
+    """pattern 与 text 中任意子串的最小编辑距离，超过 max_distance 时返回None
+
+    Sellers 近似子串匹配，并用 Ukkonen 截断只计算仍可能不超过阈值的行。
+    """
+    m = len(pattern)
+    if m == 0:
+        return 0
+    cap = max_distance + 1
+    prev = [min(i, cap) for i in range(m + 1)]
+    last = min(max_distance, m)  # 最后一个值不超过阈值的行
+    best = prev[m] if m <= max_distance else cap
+    for ch in text:
+        cur = [0] + [cap] * m
+        top = min(last + 1, m)
+        for i in range(1, top + 1):
+            cost = 0 if pattern[i - 1] == ch else 1
+            cur[i] = min(prev[i] + 1, cur[i - 1] + 1, prev[i - 1] + cost, cap)
+        last = top
+        while last > 0 and cur[last] >= cap:
+            last -= 1
+        if last == m and cur[m] < best:
+            best = cur[m]
+            if best == 0:
+                return 0
+        prev = cur
+    return best if best <= max_distance else None
+
+
+def _partition(memories: Dict[str, list], shards: int) -> List[List[str]]:
+    """按记忆数量把用户贪心分配到各分片，使分片大小尽量均衡"""
+    buckets: List[List[str]] = [[] for _ in range(shards)]
+    sizes = [0] * shards
+    for user_id in sorted(memories, key=lambda u: len(memories[u]), reverse=True):
+        target = sizes.index(min(sizes))
+        buckets[target].append(user_id)
+        sizes[target] += len(memories[user_id])
+    return [bucket for bucket in buckets if bucket]
+
+
+def _build_shard(user_ids: List[str], out_dir: str, shard_no: int, source: Optional[Dict[str, list]] = None) -> str:
+    """子进程入口：构建一个分片的索引并写入文件，只返回文件路径"""
+    source = source if source is not None else _SOURCE
+    shard = {}
+    for user_id in user_ids:
+        index = build_user_index(source[user_id])
+        shard[user_id] = {gram: postings.tobytes() for gram, postings in index.items()}
+    path = os.path.join(out_dir, f"shard-{shard_no}.idx")
+    with open(path, "wb") as f:
+        marshal.dump(shard, f)
+    return path
+
+
+def build_token_index(memories: Dict[str, list], workers: Optional[int] = None) -> Dict[str, TokenIndex]:
+    """为所有用户构建索引，存储较大且有多核可用时并行构建"""
+    global _SOURCE
+    total = sum(len(user_memories) for user_memories in memories.values())
+    workers = workers or int(os.getenv("OPENMEMORY_INDEX_WORKERS", "0")) or os.cpu_count() or 1
+    workers = min(workers, len(memories))
+    if workers <= 1 or total < PARALLEL_MIN_MEMORIES:
+        return {user_id: build_user_index(user_memories) for user_id, user_memories in memories.items()}
+
+    use_fork = "fork" in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if use_fork else None)
+    result: Dict[str, TokenIndex] = {}
+    with tempfile.TemporaryDirectory(prefix="openmemory-index-") as out_dir:
+        _SOURCE = memories
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = []
+                for shard_no, user_ids in enumerate(_partition(memories, workers)):
+                    # 不支持 fork 的平台（如 Windows）只能把分片数据传给子进程
+                    source = None if use_fork else {user_id: memories[user_id] for user_id in user_ids}
+                    futures.append(pool.submit(_build_shard, user_ids, out_dir, shard_no, source))
+                for future in futures:
+                    with open(future.result(), "rb") as f:
+                        shard = marshal.load(f)
+                    for user_id, raw in shard.items():
+                        result[user_id] = {gram: array("I", data) for gram, data in raw.items()}
+        finally:
+            _SOURCE = None
+    return result
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+OpenMemory 异步写入队列
+add_memories 的"先接受、后处理"模式：请求先写入本地 SQLite 持久化队列并
+立即返回任务ID，由工作协程池在后台执行 Mem0 的事实抽取与向量化。
+未完成的任务在重启后会被重新执行。
+
+瞬时故障（熔断、超时、429/5xx）不会让任务失败：任务回到 pending，按指数
+退避稍后重试，累计 ``OPENMEMORY_INGEST_MAX_ATTEMPTS`` 次后才标记为 failed。
+参数错误等非瞬时故障立即标记为 failed。``memory.add`` 不是幂等的：调用已经
+开始后超时（``OutcomeUnknownError``）时写入可能已经生效，任务同样直接标记为
+failed 并在 error 中说明结果未知，由调用方确认后再决定是否重新提交。
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from openmemory_resilience import CircuitOpenError, is_retryable
+
+JOB_STATES = ("pending", "running", "done", "failed")
+
+
+class IngestQueue:
+    """基于 SQLite 的持久化写入队列与工作池"""
+
+    def __init__(self, process: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 db_path: Optional[str] = None, workers: Optional[int] = None,
+                 max_attempts: Optional[int] = None, retry_base: Optional[float] = None,
+                 retry_max: Optional[float] = None):
+        self.process = process
+        self.db_path = db_path or os.getenv("OPENMEMORY_INGEST_DB", "./openmemory_ingest.db")
+        self.worker_count = workers or int(os.getenv("OPENMEMORY_INGEST_WORKERS", "2"))
+        self.max_attempts = max_attempts or int(os.getenv("OPENMEMORY_INGEST_MAX_ATTEMPTS", "5"))
+        self.retry_base = retry_base if retry_base is not None else float(os.getenv("OPENMEMORY_INGEST_RETRY_BASE", "5"))
+        self.retry_max = retry_max if retry_max is not None else float(os.getenv("OPENMEMORY_INGEST_RETRY_MAX", "300"))
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                retry_at REAL
+            )
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        # 旧版队列库没有重试相关的列
+        if "attempts" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        if "retry_at" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN retry_at REAL")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)")
+        self._db.commit()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._retry_timers: Dict[str, asyncio.TimerHandle] = {}
+
+    async def start(self):
+        """启动工作池，并重新排队上次未完成的任务"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        # 上次退出时正在处理的任务视为未完成
+        self._db.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+        self._db.commit()
+        now = time.time()
+        rows = self._db.execute("SELECT id, retry_at FROM jobs WHERE status = 'pending' ORDER BY created_at").fetchall()
+        for job_id, retry_at in rows:
+            self._enqueue(job_id, (retry_at or now) - now)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        for handle in self._retry_timers.values():
+            handle.cancel()
+        self._retry_timers.clear()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, text: str, user_id: str, metadata: Optional[dict] = None) -> str:
+        """写入队列并返回任务ID"""
+        await self.start()
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        self._db.execute(
+            "INSERT INTO jobs (id, user_id, text, metadata, status, created_at, updated_at) VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+            (job_id, user_id, text, json.dumps(metadata or {}, ensure_ascii=False), now, now)
+        )
+        self._db.commit()
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def _enqueue(self, job_id: str, delay: float = 0):
+        if delay <= 0:
+            self._queue.put_nowait(job_id)
+            return
+
+        def ready():
+            self._retry_timers.pop(job_id, None)
+            self._queue.put_nowait(job_id)
+
+        self._retry_timers[job_id] = asyncio.get_running_loop().call_later(delay, ready)
+
+    def retry_delay(self, attempts: int) -> float:
+        """第 attempts 次失败后的等待时间：指数退避，带一半幅度的抖动"""
+        return min(self.retry_max, self.retry_base * (2 ** (attempts - 1))) * random.uniform(0.5, 1)
+
+    def _retry_later(self, job_id: str, attempts: int, error: str):
+        delay = self.retry_delay(attempts)
+        self._db.execute(
+            "UPDATE jobs SET status = 'pending', error = ?, attempts = ?, retry_at = ?, updated_at = ? WHERE id = ?",
+            (error, attempts, time.time() + delay, time.time(), job_id)
+        )
+        self._db.commit()
+        self._enqueue(job_id, delay)
+
+    def _set_status(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        self._db.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+            (status, None if result is None else json.dumps(result, ensure_ascii=False, default=str), error, time.time(), job_id)
+        )
+        self._db.commit()
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                row = self._db.execute(
+                    "SELECT user_id, text, metadata, attempts FROM jobs WHERE id = ? AND status = 'pending'", (job_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                self._set_status(job_id, "running")
+                job = {"id": job_id, "user_id": row[0], "text": row[1], "metadata": json.loads(row[2] or "{}")}
+                try:
+                    result = await self.process(job)
+                except asyncio.CancelledError:
+                    # 停机时保持 running，下次启动会重新排队
+                    raise
+                except Exception as e:
+                    attempts = row[3] + 1
+                    if (isinstance(e, CircuitOpenError) or is_retryable(e)) and attempts < self.max_attempts:
+                        self._retry_later(job_id, attempts, str(e))
+                    else:
+                        self._db.execute("UPDATE jobs SET attempts = ? WHERE id = ?", (attempts, job_id))
+                        self._set_status(job_id, "failed", error=str(e))
+                else:
+                    self._set_status(job_id, "done", result=result)
+            finally:
+                self._queue.task_done()
+
+    def counts(self, user_id: Optional[str] = None) -> Dict[str, int]:
+        """按状态统计任务数量"""
+        counts = dict.fromkeys(JOB_STATES, 0)
+        if user_id is None:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        else:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs WHERE user_id = ? GROUP BY status", (user_id,))
+        counts.update(dict(rows))
+        return counts
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._db.execute(
+            "SELECT id, user_id, status, result, error, created_at, updated_at, attempts, retry_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "user_id": row[1],
+            "status": row[2],
+            "result": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6],
+            "attempts": row[7],
+            "retry_at": row[8],
+        }
+
+    def recent_failures(self, user_id: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        query = "SELECT id, user_id, error, updated_at FROM jobs WHERE status = 'failed'"
+        params: tuple = ()
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params = (user_id,)
+        query += " ORDER BY updated_at DESC LIMIT ?"
+        rows = self._db.execute(query, params + (limit,))
+        return [{"id": r[0], "user_id": r[1], "error": r[2], "updated_at": r[3]} for r in rows]
+
+    def status(self, job_id: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """供 get_ingest_status 工具使用的汇总信息"""
+        status: Dict[str, Any] = {
+            "counts": self.counts(user_id),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "workers": len(self._workers),
+            "waiting_retry": len(self._retry_timers),
+            "recent_failures": self.recent_failures(user_id),
+        }
+        if job_id:
+            status["job"] = self.get_job(job_id)
+        return status
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+OpenMemory MCP 端到端压测工具
+以子进程方式启动任意一个服务器脚本，通过 stdin/stdout 按 MCP (JSON-RPC)
+协议与其通信，按配置的比例回放 add / search / list / delete 调用，统计
+吞吐量、延迟分位数、错误数以及服务器进程 RSS 随时间的变化。
+
+Mem0 服务器使用内置的桩实现（写入临时目录并置于 PYTHONPATH 最前），
+无需网络和 API 密钥即可离线运行。
+
+示例:
+    python openmemory_loadtest.py openmemory_simple.py --concurrency 16 --duration 30
+    python openmemory_loadtest.py openmemory_mcp_server_google.py --rate 200 --mix add=2,search=6,list=1,delete=1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+OPERATIONS = {
+    "add": "add_memories",
+    "search": "search_memory",
+    "list": "list_memories",
+    "delete": "delete_memory",
+}
+
+UUID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+# 服务器以文本形式返回的拒绝/错误提示
+REJECT_PREFIXES = ("⏳", "Request rejected")
+ERROR_PREFIXES = ("❌", "⚠️", "Error executing", "Unknown tool")
+
+WORDS = ("旅行 北京 上海 会议 咖啡 项目 截止 周五 提醒 偏好 "
+         "meeting coffee project deadline travel reminder prefers morning review roadmap").split()
+
+# 离线运行 Mem0 服务器用的桩实现，接口与 mem0.Memory 保持一致
+MEM0_STUB = '''
+import os, threading, time, uuid
+
+_LATENCY = float(os.getenv("OPENMEMORY_STUB_LATENCY_MS", "0")) / 1000
+
+
+class Memory:
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self._items = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config)
+
+    def _delay(self):
+        if _LATENCY:
+            time.sleep(_LATENCY)
+
+    def add(self, text, user_id=None, metadata=None):
+        self._delay()
+        item = {"id": str(uuid.uuid4()), "memory": text, "user_id": user_id, "metadata": metadata or {}}
+        with self._lock:
+            self._items[item["id"]] = item
+        return {"results": [{"id": item["id"], "memory": text, "event": "ADD"}]}
+
+    def search(self, query, user_id=None, limit=10):
+        self._delay()
+        q = query.lower()
+        with self._lock:
+            hits = [i for i in self._items.values() if i["user_id"] == user_id and q in i["memory"].lower()]
+        return {"results": hits[:limit]}
+
+    def get(self, memory_id):
+        with self._lock:
+            item = self._items.get(memory_id)
+            return dict(item) if item else None
+
+    def get_all(self, user_id=None):
+        with self._lock:
+            return {"results": [i for i in self._items.values() if i["user_id"] == user_id]}
+
+    def update(self, memory_id, data):
+        self._delay()
+        with self._lock:
+            self._items[memory_id]["memory"] = data
+        return {"message": "Memory updated successfully!"}
+
+    def delete(self, memory_id):
+        with self._lock:
+            self._items.pop(memory_id, None)
+        return {"message": "Memory deleted successfully!"}
+
+    def delete_all(self, user_id=None):
+        with self._lock:
+            for key in [k for k, v in self._items.items() if v["user_id"] == user_id]:
+                del self._items[key]
+        return {"message": "Memories deleted successfully!"}
+'''
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for item in spec.split(","):
+        op, _, weight = item.partition("=")
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise ValueError(f"未知操作: {op}（可选: {', '.join(OPERATIONS)}）")
+        mix[op] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """最近秩法分位数"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def read_rss_kb(pid: int) -> Optional[int]:
+    """读取进程常驻内存（KB）"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if PSUTIL_AVAILABLE:
+        try:
+            return psutil.Process(pid).memory_info().rss // 1024
+        except psutil.Error:
+            pass
+    return None
+
+
+class MCPStdioClient:
+    """最小化的 MCP stdio 客户端：按行收发 JSON-RPC 消息"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self._next_id = 0
+        self._pending: Dict[int, asyncio.Future] = {}
+        self.noise_lines = 0  # 服务器写到 stdout 的非协议输出
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self):
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+            except ValueError:
+                self.noise_lines += 1
+                continue
+            future = self._pending.pop(message.get("id"), None) if isinstance(message, dict) else None
+            if future is not None and not future.done():
+                future.set_result(message)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("服务器已退出"))
+
+    async def _send(self, message: dict):
+        self.process.stdin.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        await self.process.stdin.drain()
+
+    async def request(self, method: str, params: dict) -> dict:
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        await self._send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        return await future
+
+    async def initialize(self):
+        response = await self.request("initialize", {
+            "protocolVersion": "2024-11-05",
+            "capabilities": {},
+            "clientInfo": {"name": "openmemory-loadtest", "version": "1.0.0"},
+        })
+        if "error" in response:
+            raise RuntimeError(f"初始化失败: {response['error']}")
+        await self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+        return response["result"]
+
+    async def call_tool(self, name: str, arguments: dict) -> dict:
+        return await self.request("tools/call", {"name": name, "arguments": arguments})
+
+    async def close(self):
+        self._reader.cancel()
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.mix = parse_mix(args.mix)
+        self.latencies: Dict[str, List[float]] = {op: [] for op in self.mix}
+        self.counts: Dict[str, Dict[str, int]] = {op: {"ok": 0, "error": 0, "rejected": 0} for op in self.mix}
+        self.error_samples: List[str] = []
+        self.rss: List[tuple] = []
+        self.ids: Dict[str, List[str]] = {}
+        self.random = random.Random(args.seed)
+
+    def _pick(self) -> tuple:
+        ops = list(self.mix)
+        op = self.random.choices(ops, weights=[self.mix[o] for o in ops])[0]
+        user_id = f"load_user_{self.random.randrange(self.args.users)}"
+        if op == "delete" and not self.ids.get(user_id):
+            op = "add" if "add" in self.mix else op
+        return op, user_id
+
+    def _arguments(self, op: str, user_id: str) -> dict:
+        if op == "add":
+            return {"text": " ".join(self.random.choices(WORDS, k=self.args.words)), "user_id": user_id}
+        if op == "search":
+            return {"query": self.random.choice(WORDS), "user_id": user_id, "limit": 10}
+        if op == "list":
+            return {"user_id": user_id}
+        ids = self.ids.get(user_id) or [""]
+        return {"memory_id": ids.pop(self.random.randrange(len(ids))), "user_id": user_id}
+
+    async def _one(self, client: MCPStdioClient):
+        op, user_id = self._pick()
+        arguments = self._arguments(op, user_id)
+        started = time.perf_counter()
+        try:
+            response = await client.call_tool(OPERATIONS[op], arguments)
+        except ConnectionError as e:
+            self._record_error(op, str(e))
+            return
+        self.latencies[op].append(time.perf_counter() - started)
+        if "error" in response:
+            self._record_error(op, json.dumps(response["error"], ensure_ascii=False))
+            return
+        result = response.get("result", {})
+        text = "".join(item.get("text", "") for item in result.get("content", []))
+        if text.startswith(REJECT_PREFIXES):
+            self.counts[op]["rejected"] += 1
+        elif result.get("isError") or text.startswith(ERROR_PREFIXES):
+            self._record_error(op, text)
+        else:
+            self.counts[op]["ok"] += 1
+            if op == "add":
+                match = UUID_RE.search(text)
+                if match:
+                    self.ids.setdefault(user_id, []).append(match.group(0))
+
+    def _record_error(self, op: str, message: str):
+        self.counts[op]["error"] += 1
+        if len(self.error_samples) < 10:
+            self.error_samples.append(f"{op}: {message[:200]}")
+
+    async def _closed_loop(self, client: MCPStdioClient, deadline: float):
+        async def worker():
+            while time.monotonic() < deadline and not self._budget_exhausted():
+                self._issued += 1
+                await self._one(client)
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+
+    async def _open_loop(self, client: MCPStdioClient, deadline: float):
+        """按固定速率发起请求，不等待前一个请求完成（受 max_inflight 限制）"""
+        interval = 1.0 / self.args.rate
+        inflight = asyncio.Semaphore(self.args.max_inflight)
+        tasks = set()
+        next_at = time.monotonic()
+        while time.monotonic() < deadline and not self._budget_exhausted():
+            await inflight.acquire()
+            self._issued += 1
+            task = asyncio.create_task(self._one(client))
+            tasks.add(task)
+            task.add_done_callback(lambda t: (tasks.discard(t), inflight.release()))
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+        await asyncio.gather(*tasks)
+
+    def _budget_exhausted(self) -> bool:
+        return bool(self.args.requests) and self._issued >= self.args.requests
+
+    async def _sample_rss(self, pid: int, started: float):
+        while True:
+            rss = read_rss_kb(pid)
+            if rss is not None:
+                self.rss.append((round(time.monotonic() - started, 2), rss))
+            await asyncio.sleep(self.args.rss_interval)
+
+    async def run(self) -> dict:
+        script = os.path.abspath(self.args.server)
+        with tempfile.TemporaryDirectory(prefix="openmemory-load-") as workdir:
+            stub_dir = os.path.join(workdir, "stubs", "mem0")
+            os.makedirs(stub_dir)
+            with open(os.path.join(stub_dir, "__init__.py"), "w", encoding="utf-8") as f:
+                f.write(MEM0_STUB)
+            env = dict(os.environ)
+            env["PYTHONPATH"] = os.pathsep.join(
+                [os.path.join(workdir, "stubs"), os.path.dirname(script), env.get("PYTHONPATH", "")]
+            )
+            env["PYTHONIOENCODING"] = "utf-8"
+            for item in self.args.server_env:
+                key, _, value = item.partition("=")
+                env[key] = value
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, script,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                stderr=None if self.args.show_stderr else asyncio.subprocess.DEVNULL,
+                cwd=workdir, env=env, limit=16 * 1024 * 1024,
+            )
+            client = MCPStdioClient(process)
+            try:
+                await asyncio.wait_for(client.initialize(), self.args.startup_timeout)
+                tools = await client.request("tools/list", {})
+                available = {tool["name"] for tool in tools.get("result", {}).get("tools", [])}
+                for op in list(self.mix):
+                    if OPERATIONS[op] not in available:
+                        print(f"⚠️ 服务器未提供 {OPERATIONS[op]}，已从负载组合中移除", file=sys.stderr)
+                        del self.mix[op], self.latencies[op], self.counts[op]
+                if not self.mix:
+                    raise RuntimeError("负载组合中没有可用的工具")
+
+                self._issued = 0
+                started = time.monotonic()
+                sampler = asyncio.create_task(self._sample_rss(process.pid, started))
+                deadline = started + self.args.duration
+                if self.args.rate:
+                    await self._open_loop(client, deadline)
+                else:
+                    await self._closed_loop(client, deadline)
+                elapsed = time.monotonic() - started
+                sampler.cancel()
+            finally:
+                await client.close()
+                if process.returncode is None:
+                    process.terminate()
+                    try:
+                        await asyncio.wait_for(process.wait(), 5)
+                    except asyncio.TimeoutError:
+                        process.kill()
+            return self.report(elapsed, client.noise_lines)
+
+    def report(self, elapsed: float, noise_lines: int) -> dict:
+        def summary(values: List[float]) -> dict:
+            values = sorted(values)
+            ms = lambda v: None if v is None else round(v * 1000, 2)
+            return {
+                "count": len(values),
+                "p50_ms": ms(percentile(values, 50)),
+                "p90_ms": ms(percentile(values, 90)),
+                "p99_ms": ms(percentile(values, 99)),
+                "max_ms": ms(values[-1] if values else None),
+            }
+        everything = [v for values in self.latencies.values() for v in values]
+        completed = len(everything)
+        rss_values = [kb for _, kb in self.rss]
+        return {
+            "server": self.args.server,
+            "mode": f"rate={self.args.rate}/s" if self.args.rate else f"concurrency={self.args.concurrency}",
+            "elapsed_s": round(elapsed, 2),
+            "throughput_rps": round(completed / elapsed, 1) if elapsed else None,
+            "latency": summary(everything),
+            "operations": {op: {**self.counts[op], **summary(self.latencies[op])} for op in self.mix},
+            "errors": sum(c["error"] for c in self.counts.values()),
+            "rejected": sum(c["rejected"] for c in self.counts.values()),
+            "error_samples": self.error_samples,
+            "stdout_noise_lines": noise_lines,
+            "rss_kb": {
+                "start": rss_values[0] if rss_values else None,
+                "max": max(rss_values) if rss_values else None,
+                "end": rss_values[-1] if rss_values else None,
+                "samples": self.rss,
+            },
+        }
+
+
+def print_report(report: dict):
+    print(f"📊 {report['server']} ({report['mode']}, {report['elapsed_s']}s)")
+    print(f"   吞吐量: {report['throughput_rps']} 次/秒  错误: {report['errors']}  被拒绝: {report['rejected']}")
+    lat = report["latency"]
+    print(f"   延迟: p50={lat['p50_ms']}ms p90={lat['p90_ms']}ms p99={lat['p99_ms']}ms max={lat['max_ms']}ms")
+    for op, stats in report["operations"].items():
+        print(f"   - {op:<7} ok={stats['ok']:<6} err={stats['error']:<4} rej={stats['rejected']:<4} "
+              f"p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms")
+    rss = report["rss_kb"]
+    print(f"   RSS: 起始={rss['start']}KB 峰值={rss['max']}KB 结束={rss['end']}KB")
+    if report["stdout_noise_lines"]:
+        print(f"   ⚠️ 服务器向 stdout 写入了 {report['stdout_noise_lines']} 行非协议输出")
+    for sample in report["error_samples"]:
+        print(f"   ❌ {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenMemory MCP 端到端压测")
+    parser.add_argument("server", help="服务器脚本路径，例如 openmemory_simple.py")
+    parser.add_argument("--mix", default="add=3,search=5,list=1,delete=1", help="操作比例，例如 add=3,search=5,list=1,delete=1")
+    parser.add_argument("--concurrency", type=int, default=8, help="闭环模式下的并发请求数")
+    parser.add_argument("--rate", type=float, default=0, help="开环模式的目标速率（次/秒），设置后忽略 --concurrency")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="开环模式下允许的最大未完成请求数")
+    parser.add_argument("--duration", type=float, default=10, help="压测时长（秒）")
+    parser.add_argument("--requests", type=int, default=0, help="最多发起的请求数（0 表示只受时长限制）")
+    parser.add_argument("--users", type=int, default=4, help="模拟的用户数")
+    parser.add_argument("--words", type=int, default=8, help="每条新增记忆的词数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rss-interval", type=float, default=0.5, help="RSS 采样间隔（秒）")
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE", help="传给服务器的环境变量，可重复")
+    parser.add_argument("--show-stderr", action="store_true", help="显示服务器的 stderr 输出")
+    parser.add_argument("--json", help="把完整报告（含RSS时间序列）写入该文件")
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadTest(args).run())
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
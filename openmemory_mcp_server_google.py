@@ -8,6 +8,7 @@ import asyncio
 import json
 import sys
 import os
+import time
 from typing import Any, Dict, List, Optional
 
 # 谷歌API支持
@@ -19,27 +20,43 @@ except ImportError:
     GOOGLE_API_AVAILABLE = False
     print("Warning: Google API packages not installed. Install with: pip install google-generativeai litellm")
 
-from mem0 import Memory
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
 from mcp.server.stdio import stdio_server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 from mcp.types import (
     Tool,
     TextContent,
+    Resource,
+    ResourceTemplate,
 )
 
+from openmemory_format import FORMAT_SCHEMA, encode_results, format_options, unwrap_results
+from openmemory_ingest import IngestQueue
+from openmemory_resilience import CircuitOpenError, ResilientCaller
+from openmemory_scheduler import FairScheduler, SchedulerRejected
+from openmemory_profiling import CallProfiler, phase
+from openmemory_mem0_config import apply_timeout, build_mem0_config, describe_config, get_memory
+from openmemory_changes import CHANGES_TEMPLATE, SNAPSHOT_TEMPLATE, ChangeFeed, parse_uri, user_uri
+
 class GoogleAPIMemoryServer:
     """内存服务器，支持谷歌API"""
     
     def __init__(self):
         self.use_google_api = os.getenv("USE_GOOGLE_API", "false").lower() == "true"
         self.google_api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("OPENAI_API_KEY")
+        # 可指向本地伪造端点以便离线测试重试与熔断
+        self.google_api_base = os.getenv("GOOGLE_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
         
         if self.use_google_api and GOOGLE_API_AVAILABLE:
             self._setup_google_api()
         
         # 初始化Mem0内存，支持自定义配置
         self.memory = self._init_memory()
+        # 所有Mem0调用都经过超时、重试、熔断和请求合并
+        self.caller = ResilientCaller()
+        # 被放弃的调用线程靠客户端的请求超时释放
+        apply_timeout(self.memory, self.caller.timeout)
     
     def _setup_google_api(self):
         """设置谷歌API"""
@@ -53,32 +70,69 @@ class GoogleAPIMemoryServer:
             print("⚠️ 未提供谷歌API密钥")
     
     def _init_memory(self):
-        """初始化记忆系统，支持谷歌API"""
+        """初始化记忆系统，支持谷歌API以及本地向量库/嵌入模型配置"""
         try:
-            # 如果使用谷歌API，创建自定义配置
+            # 本地向量库、嵌入模型等来自配置文件或环境变量
+            config = build_mem0_config() or {}
+            # 如果使用谷歌API，由谷歌模型负责LLM部分
             if self.use_google_api and GOOGLE_API_AVAILABLE and self.google_api_key:
-                config = {
-                    "llm": {
-                        "provider": "litellm",
-                        "config": {
-                            "model": "gemini/gemini-pro",
-                            "api_key": self.google_api_key,
-                            "api_base": "https://generativelanguage.googleapis.com/v1beta"
-                        }
+                config["llm"] = {
+                    "provider": "litellm",
+                    "config": {
+                        "model": "gemini/gemini-pro",
+                        "api_key": self.google_api_key,
+                        "api_base": self.google_api_base
                     }
                 }
-                return Memory(config=config)
-            else:
-                # 使用默认配置
-                return Memory()
+            self.mem0_config = config or None
+            # 同一配置只创建一个实例，所有调用复用
+            return get_memory(self.mem0_config)
         except Exception as e:
             print(f"❌ 内存系统初始化失败: {e}")
             # 回退到默认配置
-            return Memory()
+            self.mem0_config = None
+            return get_memory(None)
+    
+    def local_search(self, query: str, user_id: str, limit: int):
+        """不经过LLM的本地文本匹配搜索，用于熔断或远程API失败时降级"""
+        query_lower = query.lower()
+        results = []
+        for item in unwrap_results(self.memory.get_all(user_id=user_id)):
+            if isinstance(item, dict) and query_lower in str(item.get("memory", "")).lower():
+                results.append(item)
+                if len(results) >= limit:
+                    break
+        return results
 
 # 全局内存实例
 memory_server = GoogleAPIMemoryServer()
 memory = memory_server.memory
+caller = memory_server.caller
+
+# 记忆变更序列与资源订阅；Mem0 没有持久的变更计数，序号从当前微秒时间开始，
+# 重启后仍大于客户端见过的序号
+change_feed = ChangeFeed(start_seq=time.time_ns() // 1000)
+
+def _owner_of(record, default: str) -> str:
+    """Mem0 记录中的 user_id；记录不存在或缺少该字段时使用 default"""
+    if isinstance(record, dict) and record.get("user_id"):
+        return record["user_id"]
+    return default
+
+async def _process_ingest(job: dict):
+    """后台执行排队的 add_memories 任务"""
+    result = await caller.call(memory.add, job["text"], user_id=job["user_id"], metadata=job["metadata"], idempotent=False)
+    await change_feed.publish_mem0(job["user_id"], unwrap_results(result))
+    return result
+
+# 异步写入队列，任务持久化在本地SQLite中
+ingest_queue = IngestQueue(_process_ingest)
+
+# 工具调用调度器：单用户并发上限、公平排队与限流
+scheduler = FairScheduler()
+
+# 按环境变量开启的抽样剖析与慢调用日志
+call_profiler = CallProfiler()
 
 class OpenMemoryMCPServer:
     def __init__(self):
@@ -86,6 +140,56 @@ class OpenMemoryMCPServer:
         self._setup_handlers()
     
     def _setup_handlers(self):
+        @self.server.list_resources()
+        async def handle_list_resources() -> List[Resource]:
+            """每个用户的记忆作为一个资源（本次启动后有过变更的用户）"""
+            return [
+                Resource(
+                    uri=user_uri(user_id),
+                    name=f"{user_id} 的记忆",
+                    description="用户的全部记忆；订阅后记忆变更时会收到通知，再读取 /changes?since=序号 增量同步",
+                    mimeType="application/json"
+                )
+                for user_id in change_feed.known_users()
+            ]
+        
+        @self.server.list_resource_templates()
+        async def handle_list_resource_templates() -> List[ResourceTemplate]:
+            return [
+                ResourceTemplate(
+                    uriTemplate=SNAPSHOT_TEMPLATE,
+                    name="用户记忆",
+                    description="用户的全部记忆及当前变更序号",
+                    mimeType="application/json"
+                ),
+                ResourceTemplate(
+                    uriTemplate=CHANGES_TEMPLATE,
+                    name="记忆变更",
+                    description="序号大于 since 的增量变更；complete 为 false 时需重新读取全部记忆",
+                    mimeType="application/json"
+                ),
+            ]
+        
+        @self.server.read_resource()
+        async def handle_read_resource(uri) -> List[ReadResourceContents]:
+            user_id, since = parse_uri(str(uri))
+            if since is None:
+                # 先取序号再读取：与读取并发的变更可能重复出现，但不会丢失
+                seq = change_feed.seq
+                results = await caller.call(memory.get_all, user_id=user_id, coalesce_key=("get_all", user_id))
+                text = change_feed.snapshot_json(user_id, unwrap_results(results), seq=seq)
+            else:
+                text = change_feed.changes_json(user_id, since)
+            return [ReadResourceContents(content=text, mime_type="application/json")]
+        
+        @self.server.subscribe_resource()
+        async def handle_subscribe_resource(uri) -> None:
+            change_feed.subscribe(str(uri), self.server.request_context.session)
+        
+        @self.server.unsubscribe_resource()
+        async def handle_unsubscribe_resource(uri) -> None:
+            change_feed.unsubscribe(str(uri), self.server.request_context.session)
+        
         @self.server.list_tools()
         async def handle_list_tools() -> List[Tool]:
             """列出可用的内存工具"""
@@ -98,7 +202,8 @@ class OpenMemoryMCPServer:
                         "properties": {
                             "text": {"type": "string", "description": "要存储为记忆的文本内容"},
                             "user_id": {"type": "string", "description": "用户标识符", "default": "default_user"},
-                            "metadata": {"type": "object", "description": "记忆的可选元数据"}
+                            "metadata": {"type": "object", "description": "记忆的可选元数据"},
+                            "async": {"type": "boolean", "description": "为true时立即返回任务ID，记忆在后台写入", "default": False}
                         },
                         "required": ["text"]
                     }
@@ -111,7 +216,8 @@ class OpenMemoryMCPServer:
                         "properties": {
                             "query": {"type": "string", "description": "搜索查询"},
                             "user_id": {"type": "string", "description": "用户标识符", "default": "default_user"},
-                            "limit": {"type": "integer", "description": "最大结果数量", "default": 10}
+                            "limit": {"type": "integer", "description": "最大结果数量", "default": 10},
+                            **FORMAT_SCHEMA
                         },
                         "required": ["query"]
                     }
@@ -122,7 +228,8 @@ class OpenMemoryMCPServer:
                     inputSchema={
                         "type": "object",
                         "properties": {
-                            "user_id": {"type": "string", "description": "用户标识符", "default": "default_user"}
+                            "user_id": {"type": "string", "description": "用户标识符", "default": "default_user"},
+                            **FORMAT_SCHEMA
                         }
                     }
                 ),
@@ -161,6 +268,17 @@ class OpenMemoryMCPServer:
                         "required": ["memory_id", "new_text"]
                     }
                 ),
+                Tool(
+                    name="get_ingest_status",
+                    description="查询异步写入任务状态",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "job_id": {"type": "string", "description": "任务ID（可选）"},
+                            "user_id": {"type": "string", "description": "仅统计该用户的任务（可选）"}
+                        }
+                    }
+                ),
                 Tool(
                     name="get_api_status",
                     description="检查API状态和配置",
@@ -171,9 +289,8 @@ class OpenMemoryMCPServer:
                 )
             ]
 
-        @self.server.call_tool()
-        async def handle_call_tool(name: str, arguments: dict) -> List[TextContent]:
-            """处理工具调用"""
+        async def dispatch_tool(name: str, arguments: dict) -> List[TextContent]:
+            """执行具体的工具调用"""
             try:
                 if name == "add_memories":
                     text = arguments.get("text", "")
@@ -186,8 +303,18 @@ class OpenMemoryMCPServer:
                             text="❌ 错误：文本内容不能为空"
                         )]
                     
+                    if arguments.get("async"):
+                        job_id = await ingest_queue.submit(text, user_id, metadata)
+                        return [TextContent(
+                            type="text",
+                            text=f"📥 记忆已加入写入队列\n🆔 任务ID: {job_id}\n使用 get_ingest_status 查询处理进度"
+                        )]
+                    
                     # 使用Mem0添加记忆
-                    result = memory.add(text, user_id=user_id, metadata=metadata)
+                    with phase("mem0"):
+                        result = await caller.call(memory.add, text, user_id=user_id, metadata=metadata, idempotent=False)
+                    with phase("notify"):
+                        await change_feed.publish_mem0(user_id, unwrap_results(result))
                     
                     return [TextContent(
                         type="text",
@@ -205,8 +332,22 @@ class OpenMemoryMCPServer:
                             text="❌ 错误：搜索查询不能为空"
                         )]
                     
-                    # 使用Mem0搜索记忆
-                    results = memory.search(query, user_id=user_id, limit=limit)
+                    # 先校验格式参数，参数无效时不执行查询
+                    options = format_options(arguments)
+                    
+                    # 使用Mem0搜索记忆，相同的并发查询合并为一次调用，远程API不可用时降级为本地搜索
+                    with phase("mem0"):
+                        results = await caller.call(
+                            memory.search, query, user_id=user_id, limit=limit,
+                            coalesce_key=("search", query, user_id, limit),
+                            fallback=lambda: memory_server.local_search(query, user_id, limit)
+                        )
+                    
+                    if options["fmt"] != "pretty":
+                        return [TextContent(
+                            type="text",
+                            text=encode_results(unwrap_results(results), **options)
+                        )]
                     
                     if not results:
                         return [TextContent(
@@ -222,8 +363,17 @@ class OpenMemoryMCPServer:
                 elif name == "list_memories":
                     user_id = arguments.get("user_id", "default_user")
                     
+                    options = format_options(arguments)
+                    
                     # 获取所有记忆
-                    results = memory.get_all(user_id=user_id)
+                    with phase("mem0"):
+                        results = await caller.call(memory.get_all, user_id=user_id, coalesce_key=("get_all", user_id))
+                    
+                    if options["fmt"] != "pretty":
+                        return [TextContent(
+                            type="text",
+                            text=encode_results(unwrap_results(results), **options)
+                        )]
                     
                     if not results:
                         return [TextContent(
@@ -246,8 +396,12 @@ class OpenMemoryMCPServer:
                             text="❌ 错误：记忆ID不能为空"
                         )]
                     
-                    # 删除指定记忆
-                    result = memory.delete(memory_id=memory_id)
+                    # 删除指定记忆；变更发布给记忆的实际所有者，而不是调用方传入的 user_id
+                    with phase("mem0"):
+                        existing = await caller.call(memory.get, memory_id)
+                        result = await caller.call(memory.delete, memory_id=memory_id)
+                    with phase("notify"):
+                        await change_feed.publish(_owner_of(existing, user_id), "delete", memory_id)
                     
                     return [TextContent(
                         type="text",
@@ -258,7 +412,10 @@ class OpenMemoryMCPServer:
                     user_id = arguments.get("user_id", "default_user")
                     
                     # 删除所有记忆
-                    result = memory.delete_all(user_id=user_id)
+                    with phase("mem0"):
+                        result = await caller.call(memory.delete_all, user_id=user_id)
+                    with phase("notify"):
+                        await change_feed.publish(user_id, "delete_all")
                     
                     return [TextContent(
                         type="text",
@@ -276,21 +433,48 @@ class OpenMemoryMCPServer:
                             text="❌ 错误：记忆ID和新文本内容都不能为空"
                         )]
                     
-                    # 更新记忆
-                    result = memory.update(memory_id=memory_id, data=new_text)
+                    # 更新记忆，并把更新后的完整记录发布给记忆的所有者
+                    with phase("mem0"):
+                        existing = await caller.call(memory.get, memory_id)
+                        result = await caller.call(memory.update, memory_id=memory_id, data=new_text)
+                        updated = await caller.call(memory.get, memory_id)
+                    with phase("notify"):
+                        await change_feed.publish(
+                            _owner_of(updated or existing, user_id), "update", memory_id,
+                            updated or {**(existing or {}), "id": memory_id, "memory": new_text}
+                        )
                     
                     return [TextContent(
                         type="text",
                         text=f"✏️ 记忆更新成功 (ID: {memory_id}):\n{json.dumps(result, indent=2, ensure_ascii=False)}"
                     )]
                 
+                elif name == "get_ingest_status":
+                    status = ingest_queue.status(arguments.get("job_id"), arguments.get("user_id"))
+                    
+                    if arguments.get("job_id") and status["job"] is None:
+                        return [TextContent(
+                            type="text",
+                            text=f"❌ 未找到写入任务: {arguments['job_id']}"
+                        )]
+                    
+                    return [TextContent(
+                        type="text",
+                        text=f"📥 写入队列状态:\n{json.dumps(status, indent=2, ensure_ascii=False)}"
+                    )]
+                
                 elif name == "get_api_status":
                     status = {
                         "memory_system": "Mem0",
                         "google_api_available": GOOGLE_API_AVAILABLE,
                         "using_google_api": memory_server.use_google_api,
                         "google_api_key_configured": bool(memory_server.google_api_key),
-                        "server_version": "1.1.0 (Google API Enhanced)"
+                        "server_version": "1.1.0 (Google API Enhanced)",
+                        "resilience": caller.status(),
+                        "scheduler": scheduler.status(),
+                        "profiling": call_profiler.status(),
+                        "mem0": describe_config(memory_server.mem0_config),
+                        "changes": change_feed.status()
                     }
                     
                     return [TextContent(
@@ -304,6 +488,11 @@ class OpenMemoryMCPServer:
                         text=f"❌ 未知工具: {name}"
                     )]
                     
+            except CircuitOpenError as e:
+                return [TextContent(
+                    type="text",
+                    text=f"⚠️ {name} 暂时不可用: {str(e)}"
+                )]
             except Exception as e:
                 error_msg = f"❌ 执行 {name} 时出错: {str(e)}"
                 print(error_msg)  # 也输出到控制台用于调试
@@ -312,7 +501,31 @@ class OpenMemoryMCPServer:
                     text=error_msg
                 )]
 
+        @self.server.call_tool()
+        async def handle_call_tool(name: str, arguments: dict) -> List[TextContent]:
+            """处理工具调用：先经过调度器准入，再分发到具体工具"""
+            arguments = arguments or {}
+            user_id = arguments.get("user_id", "default_user")
+            async with call_profiler.profile(name, user_id, arguments) as call:
+                try:
+                    async with scheduler.admit(name, user_id):
+                        if call:
+                            call.lap("queue")
+                        return await dispatch_tool(name, arguments)
+                except SchedulerRejected as e:
+                    return [TextContent(
+                        type="text",
+                        text=f"⏳ {str(e)}"
+                    )]
+
     async def run(self):
+        await ingest_queue.start()
+        capabilities = self.server.get_capabilities(
+            notification_options=NotificationOptions(),
+            experimental_capabilities={}
+        )
+        # get_capabilities 不会自动声明资源订阅
+        capabilities.resources.subscribe = True
         async with stdio_server() as (read_stream, write_stream):
             await self.server.run(
                 read_stream,
@@ -320,10 +533,7 @@ class OpenMemoryMCPServer:
                 InitializationOptions(
                     server_name="openmemory",
                     server_version="1.1.0",
-                    capabilities=self.server.get_capabilities(
-                        notification_options=NotificationOptions(),
-                        experimental_capabilities={}
-                    )
+                    capabilities=capabilities
                 )
             )
 
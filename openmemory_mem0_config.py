@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+OpenMemory Mem0 配置与实例池
+按配置文件或环境变量组装 Mem0 配置，选择嵌入式的本地向量库（Qdrant 本地
+目录或 FAISS）、本地嵌入模型和本地 LLM，使 Mem0 服务器可以完全离线运行。
+
+配置来源（后者覆盖前者）：
+- ``OPENMEMORY_MEM0_CONFIG``：JSON 文件，内容即 Mem0 配置字典；
+- ``OPENMEMORY_VECTOR_STORE``：``qdrant`` / ``faiss``，数据放在 ``OPENMEMORY_VECTOR_PATH``
+  （默认 ./openmemory_vectors），集合名 ``OPENMEMORY_COLLECTION``；设置
+  ``OPENMEMORY_QDRANT_URL`` 时改连 Qdrant 服务；
+- ``OPENMEMORY_EMBEDDER``：``huggingface`` / ``ollama``，模型 ``OPENMEMORY_EMBED_MODEL``，
+  维度 ``OPENMEMORY_EMBED_DIMS``（常见模型可自动推断）；
+- ``OPENMEMORY_LLM``：``ollama``，模型 ``OPENMEMORY_LLM_MODEL``；
+- ``OPENMEMORY_OLLAMA_URL``：Ollama 地址，默认 http://localhost:11434；
+- ``OPENMEMORY_OFFLINE=true``：关闭 Mem0 遥测，嵌入模型只从本地缓存加载。
+
+全部未设置时返回 None，沿用 Mem0 默认配置。
+
+嵌入式 Qdrant 和 FAISS 会独占数据目录，嵌入模型加载也很慢，因此同一配置
+在进程内只创建一个 ``Memory`` 实例，所有调用复用它。
+"""
+
+import copy
+import json
+import os
+import sys
+import threading
+from typing import Dict, Optional
+
+OFFLINE = os.getenv("OPENMEMORY_OFFLINE", "false").lower() == "true"
+if OFFLINE:
+    # 必须在导入 mem0 / sentence-transformers 之前设置
+    os.environ.setdefault("MEM0_TELEMETRY", "False")
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+VECTOR_STORES = ("qdrant", "faiss")
+EMBEDDERS = ("huggingface", "ollama")
+LLMS = ("ollama",)
+
+DEFAULT_EMBED_MODELS = {"huggingface": "all-MiniLM-L6-v2", "ollama": "nomic-embed-text"}
+KNOWN_EMBED_DIMS = {
+    "all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "all-mpnet-base-v2": 768,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-small-zh-v1.5": 512,
+    "BAAI/bge-m3": 1024,
+    "nomic-embed-text": 768,
+    "mxbai-embed-large": 1024,
+}
+
+_pool: Dict[str, object] = {}
+_pool_lock = threading.Lock()
+
+
+def _load_file(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"❌ 读取Mem0配置文件失败 ({path}): {e}", file=sys.stderr)
+        return {}
+
+
+def _embed_dims(model: str) -> Optional[int]:
+    raw = os.getenv("OPENMEMORY_EMBED_DIMS")
+    if raw:
+        return int(raw)
+    return KNOWN_EMBED_DIMS.get(model)
+
+
+def build_mem0_config() -> Optional[dict]:
+    """根据配置文件和环境变量生成 Mem0 配置，未配置任何项时返回 None"""
+    path = os.getenv("OPENMEMORY_MEM0_CONFIG")
+    config = _load_file(path) if path else {}
+    ollama_url = os.getenv("OPENMEMORY_OLLAMA_URL", "http://localhost:11434")
+
+    embedder = os.getenv("OPENMEMORY_EMBEDDER", "").lower()
+    if embedder:
+        if embedder not in EMBEDDERS:
+            raise ValueError(f"不支持的嵌入模型提供方: {embedder}（可选: {', '.join(EMBEDDERS)}）")
+        embed_config = {"model": os.getenv("OPENMEMORY_EMBED_MODEL", DEFAULT_EMBED_MODELS[embedder])}
+        if embedder == "ollama":
+            embed_config["ollama_base_url"] = ollama_url
+        dims = _embed_dims(embed_config["model"])
+        if dims:
+            embed_config["embedding_dims"] = dims
+        config["embedder"] = {"provider": embedder, "config": embed_config}
+
+    vector_store = os.getenv("OPENMEMORY_VECTOR_STORE", "").lower()
+    if vector_store:
+        if vector_store not in VECTOR_STORES:
+            raise ValueError(f"不支持的向量库: {vector_store}（可选: {', '.join(VECTOR_STORES)}）")
+        store_config = {"collection_name": os.getenv("OPENMEMORY_COLLECTION", "openmemory")}
+        qdrant_url = os.getenv("OPENMEMORY_QDRANT_URL")
+        if vector_store == "qdrant" and qdrant_url:
+            store_config["url"] = qdrant_url
+        else:
+            store_config["path"] = os.path.abspath(os.getenv("OPENMEMORY_VECTOR_PATH", "./openmemory_vectors"))
+        if vector_store == "qdrant" and "url" not in store_config:
+            store_config["on_disk"] = True
+        embed_model = config.get("embedder", {}).get("config", {}).get("model")
+        dims = config.get("embedder", {}).get("config", {}).get("embedding_dims") or (
+            _embed_dims(embed_model) if embed_model else None
+        )
+        if dims:
+            # 向量库维度必须与嵌入模型一致
+            store_config["embedding_model_dims"] = dims
+        config["vector_store"] = {"provider": vector_store, "config": store_config}
+
+    llm = os.getenv("OPENMEMORY_LLM", "").lower()
+    if llm:
+        if llm not in LLMS:
+            raise ValueError(f"不支持的LLM提供方: {llm}（可选: {', '.join(LLMS)}）")
+        config["llm"] = {
+            "provider": llm,
+            "config": {"model": os.getenv("OPENMEMORY_LLM_MODEL", "llama3.1"), "ollama_base_url": ollama_url},
+        }
+
+    return config or None
+
+
+def get_memory(config: Optional[dict] = None):
+    """返回该配置对应的共享 Memory 实例，首次调用时创建"""
+    from mem0 import Memory
+
+    key = json.dumps(config, sort_keys=True, default=str)
+    with _pool_lock:
+        memory = _pool.get(key)
+        if memory is None:
+            memory = Memory.from_config(copy.deepcopy(config)) if config else Memory()
+            _pool[key] = memory
+        return memory
+
+
+def apply_timeout(memory, seconds: float):
+    """给 Mem0 使用的 LLM 客户端设置请求超时
+
+    调用方的超时只能放弃等待，阻塞在网络请求上的线程要等客户端自身超时才会
+    释放。Mem0 的配置不接受超时参数，这里设置 litellm 的全局超时，并直接
+    修改已创建的 OpenAI / Ollama（httpx）客户端。
+    """
+    try:
+        import litellm
+        litellm.request_timeout = seconds
+    except ImportError:
+        pass
+    client = getattr(getattr(memory, "llm", None), "client", None)
+    for target in (client, getattr(client, "_client", None)):
+        if target is not None and hasattr(target, "timeout"):
+            try:
+                target.timeout = seconds
+            except (AttributeError, TypeError, ValueError):
+                pass
+
+
+def describe_config(config: Optional[dict]) -> dict:
+    """供状态工具展示的配置摘要（不含密钥）"""
+    if not config:
+        return {"source": "mem0 defaults"}
+    summary = {"offline": OFFLINE}
+    for section in ("vector_store", "embedder", "llm"):
+        entry = config.get(section)
+        if entry:
+            details = entry.get("config", {})
+            summary[section] = {
+                "provider": entry.get("provider"),
+                **{k: details[k] for k in ("model", "path", "url", "collection_name") if k in details},
+            }
+    return summary
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+OpenMemory 工具调用剖析与慢调用日志
+默认关闭，全部由环境变量控制：
+
+- ``OPENMEMORY_PROFILE``：``cprofile`` 或 ``tracemalloc``，按比例抽样剖析调用；
+- ``OPENMEMORY_PROFILE_SAMPLE``：抽样比例，默认 0.01；
+- ``OPENMEMORY_PROFILE_DIR``：剖析文件目录，默认 ./openmemory_profiles；
+- ``OPENMEMORY_SLOW_CALL_MS``：超过该耗时的调用写入慢调用日志，0 表示关闭；
+- ``OPENMEMORY_SLOW_CALL_LOG``：慢调用日志文件（每行一条 JSON），默认写到 stderr。
+
+stdout 承载 stdio 协议，这里的任何输出都不会写到 stdout。
+
+同一时刻只剖析一个调用。cProfile 只跟踪启用它的线程：事件循环线程上的
+剖析会计入同时在事件循环上运行的其他调用；交给工作线程的阻塞调用（Mem0、
+嵌入模型）需要经由本模块的 ``to_thread`` 执行，才会在该线程内单独剖析，
+结束时合并到同一个剖析文件。tracemalloc 是进程级的，会计入所有线程的分配。
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+TRACEMALLOC_TOP = 50
+
+_current: contextvars.ContextVar = contextvars.ContextVar("openmemory_call", default=None)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _size(value) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class ProfiledCall:
+    """单次工具调用的计时记录"""
+
+    __slots__ = ("tool", "user_id", "arg_sizes", "phases", "started", "thread_profiles", "_last")
+
+    def __init__(self, tool: str, user_id: str, arguments: dict):
+        self.tool = tool
+        self.user_id = user_id
+        self.arg_sizes = {key: _size(value) for key, value in arguments.items()}
+        self.phases: Dict[str, float] = {}
+        self.started = self._last = time.perf_counter()
+        # 被 cProfile 抽样时，工作线程中的剖析结果（见 to_thread）
+        self.thread_profiles: Optional[List[Any]] = None
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def lap(self, name: str):
+        """把距上一次 lap（或调用开始）的时间记为一个阶段"""
+        now = time.perf_counter()
+        self.add(name, now - self._last)
+        self._last = now
+
+
+@contextmanager
+def phase(name: str):
+    """统计当前调用中某一阶段的耗时；不在剖析中的调用没有额外开销"""
+    call = _current.get()
+    if call is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        call.add(name, time.perf_counter() - started)
+
+
+def _run_profiled(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    # to_thread / run_in_executor 会把上下文复制到工作线程，这里能取到发起调用的记录
+    call = _current.get()
+    if call is None or call.thread_profiles is None:
+        return func(*args, **kwargs)
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return func(*args, **kwargs)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        call.thread_profiles.append(profiler)
+
+
+async def to_thread(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """与 ``asyncio.to_thread`` 相同；当前调用被 cProfile 抽样时也剖析工作线程"""
+    return await asyncio.to_thread(_run_profiled, func, *args, **kwargs)
+
+
+async def run_in_executor(executor, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """与 ``to_thread`` 相同，但在指定的线程池中执行"""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, _run_profiled, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+
+class CallProfiler:
+    """包在 handle_call_tool 外层的抽样剖析器"""
+
+    def __init__(self, mode: Optional[str] = None, sample_rate: Optional[float] = None,
+                 profile_dir: Optional[str] = None, slow_ms: Optional[float] = None,
+                 slow_log: Optional[str] = None):
+        mode = (mode if mode is not None else os.getenv("OPENMEMORY_PROFILE", "")).lower()
+        if mode and mode not in PROFILE_MODES:
+            print(f"Warning: unknown OPENMEMORY_PROFILE={mode}, profiling disabled", file=sys.stderr)
+            mode = ""
+        self.mode = mode
+        self.sample_rate = sample_rate if sample_rate is not None else _env_float("OPENMEMORY_PROFILE_SAMPLE", 0.01)
+        self.profile_dir = profile_dir or os.getenv("OPENMEMORY_PROFILE_DIR", "./openmemory_profiles")
+        self.slow_ms = slow_ms if slow_ms is not None else _env_float("OPENMEMORY_SLOW_CALL_MS", 0)
+        self.slow_log = slow_log or os.getenv("OPENMEMORY_SLOW_CALL_LOG", "")
+        self.profiles_written = 0
+        self.slow_calls = 0
+        self._active = False
+        self._seq = 0
+        self._log_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.mode) or self.slow_ms > 0
+
+    @asynccontextmanager
+    async def profile(self, tool: str, user_id: str, arguments: dict):
+        """记录调用耗时，按需抽样剖析并写慢调用日志；关闭时直接放行"""
+        if not self.enabled:
+            yield None
+            return
+        call = ProfiledCall(tool, user_id, arguments)
+        token = _current.set(call)
+        sampler = self._start_sampling()
+        if sampler is not None and self.mode == "cprofile":
+            call.thread_profiles = []
+        error = None
+        try:
+            yield call
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - call.started
+            _current.reset(token)
+            profile_path = self._finish_sampling(sampler, call) if sampler else None
+            if self.slow_ms > 0 and elapsed * 1000 >= self.slow_ms:
+                self._log_slow(call, elapsed, profile_path, error)
+
+    # --- 抽样剖析 ---
+
+    def _start_sampling(self):
+        if not self.mode or self._active or random.random() >= self.sample_rate:
+            return None
+        self._active = True
+        if self.mode == "cprofile":
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # 已有其他剖析器（例如调试器）在运行
+                self._active = False
+                return None
+            return profiler
+        import tracemalloc
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        return (tracemalloc.take_snapshot(), started_tracing)
+
+    def _finish_sampling(self, sampler, call: ProfiledCall) -> Optional[str]:
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            self._seq += 1
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            base = os.path.join(self.profile_dir, f"{stamp}-{os.getpid()}-{self._seq}-{call.tool}")
+            if self.mode == "cprofile":
+                import pstats
+                sampler.disable()
+                path = base + ".prof"
+                stats = pstats.Stats(sampler)
+                for profiler in call.thread_profiles or ():
+                    try:
+                        stats.add(profiler)
+                    except TypeError:
+                        pass  # 线程内没有记录到任何调用
+                stats.dump_stats(path)
+            else:
+                import tracemalloc
+                before, started_tracing = sampler
+                after = tracemalloc.take_snapshot()
+                if started_tracing:
+                    tracemalloc.stop()
+                path = base + ".txt"
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(f"# {call.tool} user={call.user_id}\n")
+                    for stat in after.compare_to(before, "lineno")[:TRACEMALLOC_TOP]:
+                        f.write(f"{stat}\n")
+            self.profiles_written += 1
+            return path
+        except Exception as e:
+            print(f"写入剖析文件失败: {e}", file=sys.stderr)
+            return None
+        finally:
+            self._active = False
+
+    # --- 慢调用日志 ---
+
+    def _log_slow(self, call: ProfiledCall, elapsed: float, profile_path: Optional[str], error: Optional[str]):
+        self.slow_calls += 1
+        phases = dict(call.phases)
+        # 未单独计时的部分主要是参数解析和结果格式化
+        phases["format"] = phases.get("format", 0.0) + max(0.0, elapsed - sum(call.phases.values()))
+        record = {
+            "ts": datetime.now().isoformat(),
+            "tool": call.tool,
+            "user_id": call.user_id,
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "phases_ms": {name: round(seconds * 1000, 2) for name, seconds in phases.items()},
+            "arg_bytes": call.arg_sizes,
+        }
+        if profile_path:
+            record["profile"] = profile_path
+        if error:
+            record["error"] = error
+        line = json.dumps(record, ensure_ascii=False)
+        with self._log_lock:
+            try:
+                if self.slow_log:
+                    with open(self.slow_log, "a", encoding="utf-8") as f:
+                        f.write(line + "\n")
+                else:
+                    print(line, file=sys.stderr, flush=True)
+            except OSError as e:
+                print(f"写入慢调用日志失败: {e}", file=sys.stderr)
+
+    def status(self) -> dict:
+        return {
+            "mode": self.mode or "off",
+            "sample_rate": self.sample_rate,
+            "slow_call_ms": self.slow_ms,
+            "profiles_written": self.profiles_written,
+            "slow_calls": self.slow_calls,
+        }
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+OpenMemory 弹性调用层
+为依赖远程 LLM 的 Mem0 调用提供超时、带抖动的指数退避重试、熔断器以及
+相同请求合并（singleflight），避免一次 API 故障拖住所有工具调用。
+"""
+
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from openmemory_profiling import run_in_executor, to_thread
+
+# 可重试的 HTTP 状态码：限流与服务端错误
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被快速拒绝"""
+
+
+class OutcomeUnknownError(Exception):
+    """非幂等调用已开始执行后超时，远程操作可能已经生效，不能自动重试"""
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    """从 litellm/httpx/urllib 等异常中提取 HTTP 状态码"""
+    for candidate in (error, getattr(error, "response", None)):
+        code = getattr(candidate, "status_code", None)
+        if isinstance(code, int):
+            return code
+    # urllib.error.HTTPError 使用 code 属性
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and 100 <= code <= 599:
+        return code
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """判断错误是否属于瞬时故障（超时、连接失败、429/5xx）"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    return status_code_of(error) in RETRYABLE_STATUS
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开，冷却期过后允许一次试探调用"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def release_probe(self):
+        """试探调用既未成功也未失败（例如被取消）时，允许下一次试探"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = self._clock()
+
+
+class SingleFlight:
+    """相同 key 的并发请求只执行一次，其余请求等待并共享结果
+
+    共享调用在独立的任务中运行，所有请求（包括发起者）都通过 ``shield``
+    等待它；任一请求被取消只影响它自己，不会让其他等待者收到取消。
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 等待者都已取消时，避免出现 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+class ResilientCaller:
+    """在线程中执行阻塞调用，并套上超时、重试、熔断和请求合并
+
+    ``timeout`` 是整个调用（含所有重试）的总时限。注意超时只能放弃等待，
+    无法中断已在线程中运行的阻塞调用，因此远程调用在独立的有界线程池
+    （``OPENMEMORY_CALL_WORKERS`` 个线程）中执行：故障期间挂起的线程不会
+    占满默认线程池，降级用的 ``fallback`` 仍在默认线程池中立即执行；超时
+    时尚未开始的排队调用会被取消，不再执行。挂起的线程要靠客户端自身的
+    请求超时释放（见 ``openmemory_mem0_config.apply_timeout``）。
+    """
+
+    def __init__(self, timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 backoff_base: Optional[float] = None, backoff_max: Optional[float] = None,
+                 breaker: Optional[CircuitBreaker] = None, workers: Optional[int] = None):
+        self.timeout = timeout if timeout is not None else _env_float("OPENMEMORY_CALL_TIMEOUT", 30.0)
+        self.max_retries = max_retries if max_retries is not None else int(_env_float("OPENMEMORY_MAX_RETRIES", 3))
+        self.backoff_base = backoff_base if backoff_base is not None else _env_float("OPENMEMORY_BACKOFF_BASE", 0.5)
+        self.backoff_max = backoff_max if backoff_max is not None else _env_float("OPENMEMORY_BACKOFF_MAX", 8.0)
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(_env_float("OPENMEMORY_BREAKER_THRESHOLD", 5)),
+            reset_timeout=_env_float("OPENMEMORY_BREAKER_RESET", 30.0),
+        )
+        self.singleflight = SingleFlight()
+        self.workers = workers or int(_env_float("OPENMEMORY_CALL_WORKERS", 8))
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="openmemory-remote")
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0, "coalesced": 0, "fallbacks": 0}
+
+    def backoff(self, attempt: int) -> float:
+        """full jitter：在 [0, min(max, base * 2^attempt)] 内均匀取值"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _attempts(self, func: Callable[..., Any], args: tuple, kwargs: dict, idempotent: bool = True) -> Any:
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        started = []
+
+        def tracked(*args: Any, **kwargs: Any) -> Any:
+            started.append(True)
+            return func(*args, **kwargs)
+
+        while True:
+            if not self.breaker.allow():
+                self.stats["rejected"] += 1
+                raise CircuitOpenError("远程API熔断中，请稍后重试")
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                result = await asyncio.wait_for(run_in_executor(self._executor, tracked, *args, **kwargs), remaining)
+            except Exception as e:
+                if not is_retryable(e):
+                    # 参数错误等非瞬时故障不计入熔断
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                self.stats["failures"] += 1
+                if not idempotent and started and isinstance(e, asyncio.TimeoutError):
+                    # 调用仍在线程中运行，重试可能重复写入；仍在排队的调用已被取消，可以重试
+                    raise OutcomeUnknownError("远程调用超时，结果未知（可能已经生效），未自动重试") from e
+                delay = self.backoff(attempt)
+                attempt += 1
+                if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+            except BaseException:
+                # 被取消时既不算成功也不算失败，但要让出试探名额，否则熔断器无法恢复
+                self.breaker.release_probe()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def call(self, func: Callable[..., Any], *args: Any, coalesce_key: Optional[Hashable] = None,
+                   fallback: Optional[Callable[[], Any]] = None, idempotent: bool = True, **kwargs: Any) -> Any:
+        """执行调用；指定 ``coalesce_key`` 时合并相同的并发请求，
+        熔断或最终失败时若提供了 ``fallback`` 则返回其结果。
+
+        ``idempotent=False``（如 ``memory.add``）时，已开始执行的调用超时后
+        不再重试，而是抛出 ``OutcomeUnknownError``。"""
+        self.stats["calls"] += 1
+        try:
+            if coalesce_key is None:
+                return await self._attempts(func, args, kwargs, idempotent)
+            if coalesce_key in self.singleflight:
+                self.stats["coalesced"] += 1
+            return await self.singleflight.do(coalesce_key, lambda: self._attempts(func, args, kwargs, idempotent))
+        except Exception as e:
+            if fallback is None or not (isinstance(e, CircuitOpenError) or is_retryable(e)):
+                raise
+            self.stats["fallbacks"] += 1
+            return await to_thread(fallback)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "inflight": len(self.singleflight),
+            "timeout_seconds": self.timeout,
+            "max_retries": self.max_retries,
+            "workers": self.workers,
+            **self.stats,
+        }
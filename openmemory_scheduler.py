@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+OpenMemory 工具调用调度器
+放在 handle_call_tool 之前做准入控制：
+- 全局与单用户并发上限；
+- 按用户加权的公平排队（start-time fair queuing），单个用户的大量请求
+  不会饿死其他用户；
+- 可选：昂贵工具按 (用户, 工具) 的令牌桶限流（默认关闭，由
+  ``OPENMEMORY_RATE_LIMITS`` 开启）；
+- 队列已满时立即拒绝并给出明确错误，而不是无限排队。
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+# 相对开销：全量列出和清空的代价远高于单条读写
+DEFAULT_TOOL_COSTS = {"list_memories": 5.0, "delete_all_memories": 5.0}
+
+# 工具 -> (每秒补充的令牌数, 桶容量)。默认不限流，避免改变现有客户端的行为；
+# 需要时设置例如 OPENMEMORY_RATE_LIMITS="add_memories=5/20,list_memories=1/5,delete_all_memories=0.2/2"
+DEFAULT_RATE_LIMITS: Dict[str, tuple] = {}
+
+# 状态查询不排队，保证过载时仍能观察服务器
+DEFAULT_EXEMPT = frozenset({"get_server_status", "get_api_status", "get_ingest_status"})
+
+# 用户状态达到此数量后才开始清理令牌桶未补满的空闲用户
+SWEEP_MIN_USERS = 1024
+
+
+class SchedulerRejected(Exception):
+    """请求未被接受"""
+
+
+class RateLimited(SchedulerRejected):
+    def __init__(self, tool: str, user_id: str, retry_after: float):
+        super().__init__(f"用户 {user_id} 调用 {tool} 过于频繁，请在 {retry_after:.1f} 秒后重试")
+        self.retry_after = retry_after
+
+
+class Overloaded(SchedulerRejected):
+    pass
+
+
+def _parse_pairs(raw: str) -> Dict[str, str]:
+    """解析 "a=1,b=2" 形式的环境变量"""
+    pairs = {}
+    for item in raw.split(","):
+        key, sep, value = item.partition("=")
+        if sep and key.strip():
+            pairs[key.strip()] = value.strip()
+    return pairs
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self.updated = clock()
+
+    def take(self, cost: float = 1.0) -> float:
+        """取出令牌，成功返回0，否则返回需要等待的秒数"""
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def full(self) -> bool:
+        """桶是否已补满；补满的桶与新建的桶等价"""
+        return self.tokens + (self._clock() - self.updated) * self.rate >= self.capacity
+
+
+class _UserState:
+    __slots__ = ("user_id", "weight", "running", "queue", "finish", "buckets")
+
+    def __init__(self, user_id: str, weight: float):
+        self.user_id = user_id
+        self.weight = weight
+        self.running = 0
+        self.queue = deque()  # (cost, future)
+        self.finish = 0.0  # 该用户最近一次被调度请求的虚拟结束时间
+        self.buckets: Dict[str, TokenBucket] = {}
+
+
+class FairScheduler:
+    """按用户公平排队的并发准入控制器"""
+
+    def __init__(self, max_concurrency: Optional[int] = None, per_user_concurrency: Optional[int] = None,
+                 user_queue_limit: Optional[int] = None, total_queue_limit: Optional[int] = None,
+                 rate_limits: Optional[Dict[str, tuple]] = None, tool_costs: Optional[Dict[str, float]] = None,
+                 weights: Optional[Dict[str, float]] = None, exempt=DEFAULT_EXEMPT):
+        self.max_concurrency = max_concurrency or _env_int("OPENMEMORY_MAX_CONCURRENCY", 8)
+        self.per_user_concurrency = per_user_concurrency or _env_int("OPENMEMORY_USER_CONCURRENCY", 2)
+        self.user_queue_limit = user_queue_limit or _env_int("OPENMEMORY_USER_QUEUE", 32)
+        self.total_queue_limit = total_queue_limit or _env_int("OPENMEMORY_TOTAL_QUEUE", 256)
+        if rate_limits is None:
+            # OPENMEMORY_RATE_LIMITS="list_memories=1/5,add_memories=5/20"，速率为0表示不限流
+            rate_limits = dict(DEFAULT_RATE_LIMITS)
+            for tool, spec in _parse_pairs(os.getenv("OPENMEMORY_RATE_LIMITS", "")).items():
+                rate, _, burst = spec.partition("/")
+                rate_limits[tool] = (float(rate), float(burst or rate))
+        self.rate_limits = {tool: limit for tool, limit in rate_limits.items() if limit[0] > 0}
+        self.tool_costs = tool_costs if tool_costs is not None else dict(DEFAULT_TOOL_COSTS)
+        if weights is None:
+            # OPENMEMORY_USER_WEIGHTS="alice=2,bob=1"
+            weights = {user: float(w) for user, w in _parse_pairs(os.getenv("OPENMEMORY_USER_WEIGHTS", "")).items()}
+        self.weights = weights
+        self.exempt = exempt
+        self.running = 0
+        self.queued = 0
+        self.vtime = 0.0
+        self.rejected = {"rate_limited": 0, "overloaded": 0}
+        # 只保留有调用在运行/排队、或令牌桶尚未补满的用户；_waiting 是其中有排队请求的用户
+        self._users: Dict[str, _UserState] = {}
+        self._waiting: Dict[str, _UserState] = {}
+        self._sweep_at = SWEEP_MIN_USERS
+
+    def _user(self, user_id: str) -> _UserState:
+        state = self._users.get(user_id)
+        if state is None:
+            if len(self._users) >= self._sweep_at:
+                self._sweep()
+            state = self._users[user_id] = _UserState(user_id, self.weights.get(user_id, 1.0))
+        return state
+
+    def _idle(self, state: _UserState) -> bool:
+        # 丢弃状态后用户重新排队时从 vtime 开始，与新用户相同，最多提前一个请求的开销
+        return not state.running and not state.queue and all(bucket.full() for bucket in state.buckets.values())
+
+    def _forget(self, state: _UserState):
+        if self._idle(state) and self._users.get(state.user_id) is state:
+            del self._users[state.user_id]
+
+    def _sweep(self):
+        """清理空闲用户；令牌桶当时未补满的用户留到下一次清理"""
+        for state in [state for state in self._users.values() if self._idle(state)]:
+            del self._users[state.user_id]
+        # 用户数翻倍时才再次清理，均摊开销为常数
+        self._sweep_at = max(SWEEP_MIN_USERS, 2 * len(self._users))
+
+    def _check_rate(self, state: _UserState, tool: str, user_id: str):
+        limit = self.rate_limits.get(tool)
+        if limit is None:
+            return
+        bucket = state.buckets.get(tool)
+        if bucket is None:
+            bucket = state.buckets[tool] = TokenBucket(*limit)
+        wait = bucket.take()
+        if wait:
+            self.rejected["rate_limited"] += 1
+            raise RateLimited(tool, user_id, wait)
+
+    def _dispatch(self):
+        """有空闲并发时，按虚拟开始时间最小的用户依次放行"""
+        while self.running < self.max_concurrency:
+            best = None
+            best_start = 0.0
+            for state in self._waiting.values():
+                if state.running < self.per_user_concurrency:
+                    start = max(self.vtime, state.finish)
+                    if best is None or start < best_start:
+                        best, best_start = state, start
+            if best is None:
+                return
+            cost, future = best.queue.popleft()
+            self.queued -= 1
+            if not best.queue:
+                del self._waiting[best.user_id]
+            if future.done():
+                continue
+            self.vtime = best_start
+            best.finish = best_start + cost / best.weight
+            best.running += 1
+            self.running += 1
+            future.set_result(None)
+
+    def _release(self, state: _UserState):
+        state.running -= 1
+        self.running -= 1
+        self._dispatch()
+        self._forget(state)
+
+    @asynccontextmanager
+    async def admit(self, tool: str, user_id: str):
+        """获得执行许可；被限流或队列已满时抛出 SchedulerRejected"""
+        if tool in self.exempt:
+            yield
+            return
+        state = self._user(user_id)
+        try:
+            # 先检查队列再取令牌，被拒绝的请求不消耗限流额度
+            if len(state.queue) >= self.user_queue_limit or self.queued >= self.total_queue_limit:
+                self.rejected["overloaded"] += 1
+                raise Overloaded(f"服务器繁忙：用户 {user_id} 排队请求过多，请稍后重试")
+            self._check_rate(state, tool, user_id)
+        except SchedulerRejected:
+            self._forget(state)
+            raise
+        future = asyncio.get_running_loop().create_future()
+        entry = (self.tool_costs.get(tool, 1.0), future)
+        state.queue.append(entry)
+        self._waiting[user_id] = state
+        self.queued += 1
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已获得许可但调用方取消，归还并发名额
+                self._release(state)
+            elif entry in state.queue:
+                state.queue.remove(entry)
+                self.queued -= 1
+                if not state.queue:
+                    del self._waiting[user_id]
+            self._forget(state)
+            raise
+        try:
+            yield
+        finally:
+            self._release(state)
+
+    def status(self) -> dict:
+        """供状态工具报告的队列深度"""
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "per_user_concurrency": self.per_user_concurrency,
+            "rejected": dict(self.rejected),
+            "users": {
+                user_id: {"running": state.running, "queued": len(state.queue)}
+                for user_id, state in self._users.items()
+                if state.running or state.queue
+            },
+        }
@@ -8,7 +8,9 @@ import asyncio
 import json
 import sys
 import os
+import itertools
 import pickle
+import time
 from typing import Any, Dict, List, Optional
 from datetime import datetime
 import uuid
@@ -16,35 +18,479 @@ import uuid
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
 from mcp.server.stdio import stdio_server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 from mcp.types import (
     Tool,
     TextContent,
+    Resource,
+    ResourceTemplate,
 )
 
+from openmemory_format import FORMAT_SCHEMA, encode_results, format_options
+from openmemory_index import build_token_index, build_user_index, candidates, default_max_distance, fuzzy_candidates, index_add, substring_distance
+from openmemory_tiers import ColdStore, created_timestamp, heat, memory_cost
+from openmemory_codec import BlockCodec
+from openmemory_scheduler import FairScheduler, SchedulerRejected
+from openmemory_profiling import CallProfiler, phase, to_thread
+from openmemory_vectors import VectorIndex, load_embedder
+from openmemory_changes import CHANGES_TEMPLATE, SNAPSHOT_TEMPLATE, ChangeFeed, parse_uri, user_uri
+
 class SimpleMemoryStore:
-    """简单的内存存储，使用文件系统"""
+    """简单的内存存储，使用文件系统
+
+    记忆按用户分组保存在列表中，并维护 ``id -> (user_id, slot)`` 索引，
+    单条删除/更新只需 O(1)。删除时在原槽位留下墓碑 (None)，墓碑比例
+    超过阈值时再按用户压缩。所有变更先追加写入日志文件，日志达到一定
+    规模后才整体落盘快照，避免每次变更都重写整个文件。
+    搜索使用按用户划分的三元组倒排索引，启动时可多进程并行构建；删除和
+    更新留下的过期倒排条目同样在压缩时清理。
+
+    设置内存预算后启用冷热分层：超出预算时把热度最低的记忆降级到压缩的
+    冷存储段，只有热层结果不足 ``limit`` 时才搜索冷层；被检索到的冷记忆
+    会重新提升到热层。
+
+    启用压缩后，快照按用户分块、冷段按段，用从语料训练的共享字典压缩。
+
+    设置向量模式后，用本地嵌入模型为每条记忆生成向量，量化后常驻内存，
+    完整向量追加写入 ``.vec`` 文件，支持语义搜索。
+    """
     
-    def __init__(self, storage_path="./simple_memory.pkl"):
+    # 快照中每个压缩块包含的记忆条数
+    BLOCK_RECORDS = 256
+    
+    def __init__(self, storage_path="./simple_memory.pkl", compact_ratio=0.25, checkpoint_min=1000,
+                 ram_budget: Optional[int] = None, promote_hits: int = 1, compression: Optional[str] = None,
+                 vector_mode: Optional[str] = None):
         self.storage_path = storage_path
+        self.journal_path = storage_path + ".journal"
+        self.compact_ratio = compact_ratio
+        self.checkpoint_min = checkpoint_min
+        # 热层内存预算（字节），0 表示不分层
+        if ram_budget is None:
+            ram_budget = int(float(os.getenv("OPENMEMORY_HOT_BUDGET_MB", "0")) * 1024 * 1024)
+        self.ram_budget = ram_budget
+        self.promote_hits = promote_hits
+        # none / zlib / zstd；未启用时冷段仍使用不带字典的 zlib
+        self.codec = BlockCodec(compression or os.getenv("OPENMEMORY_COMPRESSION", "none"))
+        self.cold = ColdStore(storage_path + ".cold", self.codec if self.codec.enabled else None)
+        self._seq = 0  # 最近一条日志的序号，快照中记录已包含到哪一条
         self.memories = self._load_memories()
+        if self.cold.codec is not self.codec:
+            # 之前启用过压缩时，旧冷段可能用快照中恢复的字典压缩过
+            self.cold.codec.dictionaries = self.codec.dictionaries
+        self._id_index = {}   # memory_id -> (user_id, slot)
+        self._tombstones = {}  # user_id -> 墓碑数量
+        self._stale = {}  # user_id -> 更新留下的过期倒排条目数
+        self._token_index = {}  # user_id -> {trigram: array(slot)}
+        self._access = {}  # memory_id -> [检索次数, 最近检索时间]
+        self._hot_bytes = 0
+        self.index_build_seconds = 0.0
+        self._journal_ops = 0
+        self._journal = None
+        self._rebuild_index()
+        # 无用的冷段文件只在快照落盘后清理，此前重放日志可能仍需要它们
+        self._replay_journal()
+        self._enforce_budget()
+        # float32 / int8 / binary，未设置时不生成向量
+        self.embedder = None
+        self.vectors = None
+        vector_mode = vector_mode if vector_mode is not None else os.getenv("OPENMEMORY_VECTOR_MODE", "")
+        if vector_mode:
+            self.embedder = load_embedder()
+            if self.embedder is not None:
+                self.vectors = VectorIndex(vector_mode, storage_path + ".vec")
+                self.vectors.load(lambda memory_id: self._owned(memory_id, None), dim=self.embedder.dim)
+        # 新增或更新后等待生成向量的记忆ID（有序集合），由 sync_vectors 处理
+        self._pending_vectors: Dict[str, None] = {}
     
     def _load_memories(self):
         """从文件加载记忆"""
         try:
             if os.path.exists(self.storage_path):
                 with open(self.storage_path, 'rb') as f:
-                    return pickle.load(f)
+                    memories = pickle.load(f)
+                    try:
+                        state = pickle.load(f)
+                    except EOFError:
+                        # 旧版快照只有记忆字典
+                        state = {}
+                self._seq = state.get("seq", 0)
+                self.codec.load_state(state.get("codec"))
+                self.cold.load_manifest(state.get("cold"))
+                if state.get("blocks"):
+                    memories = self._decode_blocks(memories)
+                return memories
         except Exception as e:
-            print(f"加载记忆失败: {e}")
+            print(f"加载记忆失败: {e}", file=sys.stderr)
         return {}
     
+    def _encode_blocks(self) -> dict:
+        """把每个用户的记忆按块序列化并压缩"""
+        if self.codec.should_train(len(self._id_index)):
+            texts = [m["text"] for user_memories in self.memories.values() for m in user_memories if m is not None]
+            self.codec.train(texts, len(texts))
+        blocks = {}
+        for user_id, user_memories in self.memories.items():
+            blocks[user_id] = [
+                self.codec.encode("\n".join(
+                    json.dumps(memory, ensure_ascii=False)
+                    for memory in user_memories[start:start + self.BLOCK_RECORDS]
+                ).encode("utf-8"))
+                for start in range(0, len(user_memories), self.BLOCK_RECORDS)
+            ]
+        return blocks
+    
+    def _decode_blocks(self, blocks: dict) -> dict:
+        memories = {}
+        for user_id, user_blocks in blocks.items():
+            user_memories = memories[user_id] = []
+            for blob in user_blocks:
+                raw = self.codec.decode(blob)
+                self.codec.account(len(raw), len(blob))
+                user_memories.extend(json.loads(line) for line in raw.decode("utf-8").split("\n"))
+        return memories
+    
     def _save_memories(self):
-        """保存记忆到文件"""
+        """保存记忆快照到文件，并清空变更日志"""
+        for user_id in set(self._tombstones) | set(self._stale):
+            self._compact_user(user_id)
+        try:
+            self.cold.compact()
+            tmp_path = self.storage_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                if self.codec.enabled:
+                    pickle.dump(self._encode_blocks(), f)
+                else:
+                    pickle.dump(self.memories, f)
+                pickle.dump({
+                    "seq": self._seq,
+                    "cold": self.cold.manifest(),
+                    "codec": self.codec.state(),
+                    "blocks": self.codec.enabled
+                }, f)
+            os.replace(tmp_path, self.storage_path)
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_ops = 0
+            self.cold.remove_orphans()
+            if self.vectors is not None and self.vectors.should_compact():
+                self.vectors.compact()
+        except Exception as e:
+            print(f"保存记忆失败: {e}", file=sys.stderr)
+    
+    def _rebuild_index(self, workers: Optional[int] = None):
+        """根据当前记忆列表重建ID索引和搜索索引"""
+        started = time.perf_counter()
+        self._id_index = {}
+        self._tombstones = {}
+        self._stale = {}
+        self._hot_bytes = 0
+        for user_id, user_memories in self.memories.items():
+            for slot, memory in enumerate(user_memories):
+                if memory is None:
+                    self._tombstones[user_id] = self._tombstones.get(user_id, 0) + 1
+                else:
+                    self._id_index[memory["id"]] = (user_id, slot)
+                    self._hot_bytes += memory_cost(memory)
+        self._token_index = build_token_index(self.memories, workers)
+        self.index_build_seconds = time.perf_counter() - started
+    
+    def rebuild_indexes(self, workers: Optional[int] = None):
+        """重建全部索引（例如导入数据后），workers 为并行进程数"""
+        self._rebuild_index(workers)
+    
+    def _replay_journal(self):
+        """重放快照之后的变更日志
+
+        进程中断可能在日志末尾留下不完整的一行。重放后把日志截断到最后一条
+        完整记录，否则下一条日志会接在残行后面，下次重启时连同之后的所有
+        变更一起被丢弃。
+        """
+        if not os.path.exists(self.journal_path):
+            return
+        good_bytes = 0
+        torn = False
+        try:
+            with open(self.journal_path, 'rb') as f:
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        torn = True
+                        break
+                    line = raw.strip()
+                    if line:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            torn = True
+                            break
+                        seq = entry.get("seq")
+                        if seq is not None:
+                            # 快照写入后、日志删除前退出时，日志中的条目已包含在快照里
+                            if seq <= self._seq:
+                                good_bytes += len(raw)
+                                continue
+                            self._seq = seq
+                        self._apply(entry)
+                        self._journal_ops += 1
+                    good_bytes += len(raw)
+            if torn:
+                with open(self.journal_path, 'r+b') as f:
+                    dropped = f.seek(0, os.SEEK_END) - good_bytes
+                    f.truncate(good_bytes)
+                print(f"记忆日志末尾有 {dropped} 字节不完整的记录，已截断", file=sys.stderr)
+        except Exception as e:
+            print(f"重放记忆日志失败: {e}", file=sys.stderr)
+    
+    def _log(self, entry: dict):
+        """追加一条变更日志，必要时落盘快照"""
+        self._seq += 1
+        entry["seq"] = self._seq
         try:
-            with open(self.storage_path, 'wb') as f:
-                pickle.dump(self.memories, f)
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._journal.flush()
+            self._journal_ops += 1
         except Exception as e:
-            print(f"保存记忆失败: {e}")
+            print(f"写入记忆日志失败: {e}", file=sys.stderr)
+        # 日志条数与存活记忆数成正比时才写快照，摊还成本为 O(1)
+        if self._journal_ops >= max(self.checkpoint_min, self.total_memories):
+            self._save_memories()
+    
+    def _apply(self, entry: dict):
+        """将一条变更应用到内存结构（不写日志）"""
+        op = entry.get("op")
+        if op == "add":
+            self._insert(entry["memory"])
+        elif op == "update":
+            self._update(entry["id"], entry["text"], entry.get("metadata"), entry["updated_at"])
+        elif op == "delete":
+            self._delete(entry["id"])
+        elif op == "delete_all":
+            self._delete_user(entry["user_id"])
+        elif op == "demote":
+            self._demote(entry["user_id"], entry["segment"], entry["ids"])
+        elif op == "promote":
+            self._promote(entry["id"])
+    
+    def _index_memory(self, memory: dict, slot: int):
+        """将记忆加入索引"""
+        self._id_index[memory["id"]] = (memory["user_id"], slot)
+        index_add(self._token_index.setdefault(memory["user_id"], {}), slot, memory["text"])
+    
+    def _unindex_memory(self, memory: dict):
+        """从索引中移除记忆（倒排条目延迟到压缩时清理）"""
+        self._id_index.pop(memory["id"], None)
+    
+    def _insert(self, memory: dict):
+        user_memories = self.memories.setdefault(memory["user_id"], [])
+        user_memories.append(memory)
+        self._index_memory(memory, len(user_memories) - 1)
+        self._hot_bytes += memory_cost(memory)
+    
+    def _update(self, memory_id: str, text: str, metadata: Optional[dict], updated_at: str):
+        location = self._id_index.get(memory_id)
+        if location is None:
+            return None
+        user_id, slot = location
+        memory = self.memories[user_id][slot]
+        self._unindex_memory(memory)
+        self._hot_bytes -= memory_cost(memory)
+        memory = dict(memory, text=text, updated_at=updated_at)
+        if metadata is not None:
+            memory["metadata"] = metadata
+        self.memories[user_id][slot] = memory
+        self._index_memory(memory, slot)
+        self._hot_bytes += memory_cost(memory)
+        self._stale[user_id] = self._stale.get(user_id, 0) + 1
+        self._maybe_compact(user_id)
+        return memory
+    
+    def _delete(self, memory_id: str):
+        location = self._id_index.get(memory_id)
+        if location is None:
+            # 冷层中的记忆直接从段清单移除
+            memory = self.cold.get(memory_id)
+            self.cold.remove(memory_id)
+            return memory
+        user_id, slot = location
+        memory = self.memories[user_id][slot]
+        self._unindex_memory(memory)
+        self._hot_bytes -= memory_cost(memory)
+        self.memories[user_id][slot] = None
+        self._tombstones[user_id] = self._tombstones.get(user_id, 0) + 1
+        self._maybe_compact(user_id)
+        return memory
+    
+    def _delete_user(self, user_id: str):
+        user_memories = self.memories.pop(user_id, [])
+        self._tombstones.pop(user_id, None)
+        self._stale.pop(user_id, None)
+        self._token_index.pop(user_id, None)
+        removed = self.cold.remove_user(user_id)
+        for memory in user_memories:
+            if memory is not None:
+                self._id_index.pop(memory["id"], None)
+                self._hot_bytes -= memory_cost(memory)
+                removed.append(memory["id"])
+        for memory_id in removed:
+            self._access.pop(memory_id, None)
+        return len(removed)
+    
+    def _demote(self, user_id: str, segment: str, ids: List[str]):
+        """把已写入冷段的记忆移出热层"""
+        for memory_id in ids:
+            self._delete(memory_id)
+        self.cold.register(segment, user_id, ids, len(ids))
+    
+    def _promote(self, memory_id: str):
+        """把冷层记忆提升回热层"""
+        memory = self.cold.get(memory_id)
+        if memory is None:
+            return None
+        self.cold.remove(memory_id)
+        self._insert(memory)
+        return memory
+    
+    def _enforce_budget(self):
+        """热层超出内存预算时，把热度最低的记忆批量降级到冷层（降到预算的80%）"""
+        if not self.ram_budget or self._hot_bytes <= self.ram_budget:
+            return
+        hot = [memory for user_memories in self.memories.values() for memory in user_memories if memory is not None]
+        hot.sort(key=lambda m: heat(created_timestamp(m), self._access.get(m["id"])))
+        target = self.ram_budget * 0.8
+        victims = {}
+        freed = 0
+        for memory in hot:
+            if self._hot_bytes - freed <= target:
+                break
+            victims.setdefault(memory["user_id"], []).append(memory)
+            freed += memory_cost(memory)
+        for user_id, memories in victims.items():
+            segment = self.cold.write_segment(memories)
+            ids = [memory["id"] for memory in memories]
+            self._demote(user_id, segment, ids)
+            self._log({"op": "demote", "user_id": user_id, "segment": segment, "ids": ids})
+    
+    def _record_access(self, results: List[dict]):
+        """更新检索统计，达到阈值的冷记忆提升回热层"""
+        now = time.time()
+        promoted = False
+        for memory in results:
+            stats = self._access.setdefault(memory["id"], [0, 0.0])
+            stats[0] += 1
+            stats[1] = now
+            if stats[0] >= self.promote_hits and memory["id"] in self.cold.locations:
+                self._promote(memory["id"])
+                self._log({"op": "promote", "id": memory["id"]})
+                promoted = True
+        if promoted:
+            self._enforce_budget()
+    
+    async def _embed(self, memories: List[dict]):
+        """在工作线程中生成向量，回到事件循环后写入索引"""
+        if not memories:
+            return
+        vectors = await to_thread(self.embedder.embed, [memory["text"] for memory in memories])
+        for memory, vector in zip(memories, vectors):
+            # 嵌入期间记忆可能已被删除或再次更新，过期的向量不写入
+            current = self.get_memory(memory["id"])
+            if current is not None and current["text"] == memory["text"]:
+                self.vectors.add(memory["id"], vector, memory["user_id"])
+    
+    async def sync_vectors(self, batch: int = 64):
+        """为新增或更新的记忆生成向量，嵌入模型在工作线程中运行，不阻塞事件循环"""
+        while self.vectors is not None and self._pending_vectors:
+            ids = list(itertools.islice(self._pending_vectors, batch))
+            for memory_id in ids:
+                del self._pending_vectors[memory_id]
+            await self._embed([memory for memory in map(self.get_memory, ids) if memory is not None])
+    
+    async def backfill_vectors(self, batch: int = 64):
+        """为还没有向量的记忆（向量模式开启前写入的、或写入向量前中断的）生成向量
+
+        由服务器启动后在后台运行；逐批嵌入，批次之间事件循环照常处理请求。
+        """
+        if self.vectors is None:
+            return
+        hot = [memory for user_memories in self.memories.values() for memory in user_memories if memory is not None]
+        pending = []
+        for source in (hot, list(self.cold.segments)):
+            for item in source:
+                if isinstance(item, str):
+                    # 冷段可能在等待期间被合并或删除
+                    if item not in self.cold.segments:
+                        continue
+                    memories = list(self.cold.read_segment(item))
+                else:
+                    memories = [item]
+                for memory in memories:
+                    if memory["id"] not in self.vectors and memory["id"] not in self._pending_vectors:
+                        pending.append(memory)
+                if len(pending) >= batch:
+                    await self._embed(pending)
+                    pending = []
+        await self._embed(pending)
+    
+    async def embed_query(self, query: str) -> Optional[List[float]]:
+        """在工作线程中嵌入查询文本，未启用语义搜索时返回None"""
+        if self.vectors is None:
+            return None
+        return (await to_thread(self.embedder.embed, [query]))[0]
+    
+    def _maybe_compact(self, user_id: str):
+        garbage = self._tombstones.get(user_id, 0) + self._stale.get(user_id, 0)
+        if garbage > self.compact_ratio * len(self.memories[user_id]):
+            self._compact_user(user_id)
+    
+    def _compact_user(self, user_id: str):
+        """移除用户列表中的墓碑，重排槽位并重建该用户的倒排索引"""
+        garbage = self._tombstones.pop(user_id, 0) + self._stale.pop(user_id, 0)
+        if not garbage:
+            return
+        live = [m for m in self.memories.get(user_id, []) if m is not None]
+        if not live:
+            self.memories.pop(user_id, None)
+            self._token_index.pop(user_id, None)
+            return
+        self.memories[user_id] = live
+        for slot, memory in enumerate(live):
+            self._id_index[memory["id"]] = (user_id, slot)
+        self._token_index[user_id] = build_user_index(live)
+    
+    def _owned(self, memory_id: str, user_id: Optional[str]) -> bool:
+        location = self._id_index.get(memory_id)
+        owner = location[0] if location is not None else self.cold.owner(memory_id)
+        return owner is not None and (user_id is None or owner == user_id)
+    
+    @property
+    def last_seq(self) -> int:
+        """最近一条变更日志的序号，重启后继续递增"""
+        return self._seq
+    
+    def user_ids(self) -> List[str]:
+        """有记忆的用户（含只剩冷记忆的用户）"""
+        users = {user_id for user_id, user_memories in self.memories.items() if any(user_memories)}
+        users.update(seg["user_id"] for seg in self.cold.segments.values())
+        return sorted(users)
+    
+    @property
+    def total_memories(self) -> int:
+        return len(self._id_index) + self.cold.count()
+    
+    def tier_stats(self) -> dict:
+        """冷热分层统计"""
+        return {
+            "hot_memories": len(self._id_index),
+            "hot_bytes_estimate": self._hot_bytes,
+            "ram_budget_bytes": self.ram_budget,
+            "cold_memories": self.cold.count(),
+            "cold_segments": len(self.cold.segments),
+            "cold_disk_bytes": self.cold.disk_bytes(),
+        }
     
     def add_memory(self, text: str, user_id: str = "default", metadata: dict = None):
         """添加记忆"""
@@ -57,49 +503,240 @@ class SimpleMemoryStore:
             "created_at": datetime.now().isoformat()
         }
         
-        if user_id not in self.memories:
-            self.memories[user_id] = []
-        
-        self.memories[user_id].append(memory)
-        self._save_memories()
+        self._insert(memory)
+        self._log({"op": "add", "memory": memory})
+        if self.vectors is not None:
+            self._pending_vectors[memory_id] = None
+        self._enforce_budget()
+        return memory
+    
+    def get_memory(self, memory_id: str, user_id: Optional[str] = None):
+        """按ID获取记忆"""
+        if not self._owned(memory_id, user_id):
+            return None
+        location = self._id_index.get(memory_id)
+        if location is None:
+            return self.cold.get(memory_id)
+        owner, slot = location
+        return self.memories[owner][slot]
+    
+    def update_memory(self, memory_id: str, text: str, user_id: Optional[str] = None, metadata: dict = None):
+        """更新指定记忆，不存在时返回None"""
+        if not self._owned(memory_id, user_id):
+            return None
+        if memory_id not in self._id_index:
+            # 冷段只读，先提升回热层再更新
+            self._promote(memory_id)
+            self._log({"op": "promote", "id": memory_id})
+        updated_at = datetime.now().isoformat()
+        memory = self._update(memory_id, text, metadata, updated_at)
+        self._log({"op": "update", "id": memory_id, "text": text, "metadata": metadata, "updated_at": updated_at})
+        if self.vectors is not None:
+            self._pending_vectors[memory_id] = None
+        self._enforce_budget()
         return memory
     
-    def search_memories(self, query: str, user_id: str = "default", limit: int = 10):
-        """搜索记忆（简单文本匹配）"""
+    def delete_memory(self, memory_id: str, user_id: Optional[str] = None):
+        """删除指定记忆，不存在时返回None"""
+        if not self._owned(memory_id, user_id):
+            return None
+        memory = self._delete(memory_id)
+        self._access.pop(memory_id, None)
+        self._log({"op": "delete", "id": memory_id})
+        if self.vectors is not None:
+            self.vectors.remove(memory_id)
+        return memory
+    
+    def _search_cold(self, matches, user_id: str, needed: int) -> List[dict]:
+        """按从新到旧的顺序扫描用户的冷段，最多返回 needed 条"""
+        results = []
+        for segment in self.cold.user_segments(user_id):
+            for memory in self.cold.read_segment(segment):
+                if matches(memory):
+                    results.append(memory)
+                    if len(results) >= needed:
+                        return results
+        return results
+    
+    def search_memories(self, query: str, user_id: str = "default", limit: int = 10,
+                        fuzzy: bool = False, max_distance: Optional[int] = None, semantic: bool = False,
+                        query_vector: Optional[List[float]] = None):
+        """搜索记忆（简单文本匹配），fuzzy 为真时容忍拼写错误，semantic 为真时按向量相似度搜索"""
+        if semantic:
+            return self.semantic_search(query, user_id, limit, query_vector)
+        if fuzzy:
+            return self.fuzzy_search(query, user_id, limit, max_distance)
         user_memories = self.memories.get(user_id, [])
         results = []
         
         query_lower = query.lower()
+        slots = candidates(self._token_index.get(user_id, {}), query_lower)
+        if slots is not None:
+            # 只验证索引给出的候选，并保持原有的插入顺序
+            user_memories = [user_memories[slot] for slot in sorted(slots)]
         for memory in user_memories:
-            if query_lower in memory["text"].lower():
+            if memory is not None and query_lower in memory["text"].lower():
                 results.append(memory)
                 if len(results) >= limit:
                     break
         
+        if len(results) < limit:
+            results += self._search_cold(lambda m: query_lower in m["text"].lower(), user_id, limit - len(results))
+        self._record_access(results)
+        return results
+    
+    def fuzzy_search(self, query: str, user_id: str = "default", limit: int = 10,
+                     max_distance: Optional[int] = None):
+        """容错搜索：三元组倒排表收集候选，编辑距离验证，按相似度排序
+
+        返回的记录附带 ``score``（1 - 编辑距离 / 查询长度）。``max_distance``
+        默认约每 6 个字符 1 处错误（见 ``default_max_distance``），更宽的上限会
+        让三元组过滤失效。查询短于 3 个字符
+        时无法使用三元组，退化为精确子串匹配；过短的查询若所有三元组都被
+        拼写错误破坏，也无法召回。
+        """
+        query_lower = query.lower()
+        if max_distance is None:
+            max_distance = default_max_distance(query_lower)
+        token_index = self._token_index.get(user_id, {})
+        if len(query_lower) < 3:
+            return [dict(memory, score=1.0) for memory in self.search_memories(query, user_id, limit)]
+        user_memories = self.memories.get(user_id, [])
+        # 共享三元组越多越可能匹配，先验证它们
+        shared = fuzzy_candidates(token_index, query_lower, max_distance)
+        scored = []
+        for slot in sorted(shared, key=lambda s: (-shared[s], s)):
+            memory = user_memories[slot] if slot < len(user_memories) else None
+            if memory is None:
+                continue
+            distance = substring_distance(query_lower, memory["text"].lower(), max_distance)
+            if distance is not None:
+                scored.append((distance, slot, memory))
+        scored.sort(key=lambda item: (item[0], item[1]))
+        scored = scored[:limit]
+        if len(scored) < limit:
+            # 冷层没有索引，只在热层不足时逐条计算编辑距离
+            distances = {}
+            
+            def matches(memory):
+                distance = substring_distance(query_lower, memory["text"].lower(), max_distance)
+                distances[memory["id"]] = distance
+                return distance is not None
+            
+            for memory in self._search_cold(matches, user_id, limit - len(scored)):
+                scored.append((distances[memory["id"]], len(user_memories), memory))
+            scored.sort(key=lambda item: (item[0], item[1]))
+        self._record_access([memory for _, _, memory in scored])
+        return [
+            dict(memory, score=round(1 - distance / len(query_lower), 3))
+            for distance, _, memory in scored
+        ]
+    
+    def semantic_search(self, query: str, user_id: str = "default", limit: int = 10,
+                        query_vector: Optional[List[float]] = None):
+        """语义搜索：量化向量粗筛，完整向量重排，结果附带余弦相似度 ``score``
+
+        服务器先用 ``embed_query`` 在工作线程中得到 query_vector；未提供时在
+        当前线程嵌入查询。
+        """
+        if self.vectors is None:
+            raise ValueError("语义搜索未启用：请设置 OPENMEMORY_VECTOR_MODE 并安装 sentence-transformers")
+        if query_vector is None:
+            query_vector = self.embedder.embed([query])[0]
+        hits = self.vectors.search(query_vector, limit, group=user_id)
+        results = []
+        for memory_id, score in hits:
+            memory = self.get_memory(memory_id, user_id)
+            if memory is not None:
+                results.append(dict(memory, score=score))
+        self._record_access(results)
         return results
     
     def get_all_memories(self, user_id: str = "default"):
         """获取用户所有记忆"""
-        return self.memories.get(user_id, [])
+        results = [m for m in self.memories.get(user_id, []) if m is not None]
+        if self.ram_budget or self.cold.count():
+            # 分层后热层顺序不再等于写入顺序（提升的记忆追加在末尾）
+            for segment in self.cold.user_segments(user_id):
+                results.extend(self.cold.read_segment(segment))
+            results.sort(key=lambda m: m["created_at"])
+        return results
     
     def delete_all_memories(self, user_id: str = "default"):
         """删除用户所有记忆"""
-        if user_id in self.memories:
-            count = len(self.memories[user_id])
-            del self.memories[user_id]
-            self._save_memories()
+        if user_id in self.memories or self.cold.user_segments(user_id):
+            count = self._delete_user(user_id)
+            self._log({"op": "delete_all", "user_id": user_id})
+            if self.vectors is not None:
+                self.vectors.remove_group(user_id)
             return {"deleted_count": count}
         return {"deleted_count": 0}
 
 # 全局记忆存储
 memory_store = SimpleMemoryStore()
 
+# 工具调用调度器：单用户并发上限、公平排队与限流
+scheduler = FairScheduler()
+
+# 按环境变量开启的抽样剖析与慢调用日志
+call_profiler = CallProfiler()
+
+# 记忆变更序列与资源订阅，序号沿用存储日志序号
+change_feed = ChangeFeed(start_seq=memory_store.last_seq)
+
 class OpenMemoryMCPServer:
     def __init__(self):
         self.server = Server("openmemory")
         self._setup_handlers()
     
     def _setup_handlers(self):
+        @self.server.list_resources()
+        async def handle_list_resources() -> List[Resource]:
+            """每个用户的记忆作为一个资源"""
+            return [
+                Resource(
+                    uri=user_uri(user_id),
+                    name=f"{user_id} 的记忆",
+                    description="用户的全部记忆；订阅后记忆变更时会收到通知，再读取 /changes?since=序号 增量同步",
+                    mimeType="application/json"
+                )
+                for user_id in memory_store.user_ids()
+            ]
+        
+        @self.server.list_resource_templates()
+        async def handle_list_resource_templates() -> List[ResourceTemplate]:
+            return [
+                ResourceTemplate(
+                    uriTemplate=SNAPSHOT_TEMPLATE,
+                    name="用户记忆",
+                    description="用户的全部记忆及当前变更序号",
+                    mimeType="application/json"
+                ),
+                ResourceTemplate(
+                    uriTemplate=CHANGES_TEMPLATE,
+                    name="记忆变更",
+                    description="序号大于 since 的增量变更；complete 为 false 时需重新读取全部记忆",
+                    mimeType="application/json"
+                ),
+            ]
+        
+        @self.server.read_resource()
+        async def handle_read_resource(uri) -> List[ReadResourceContents]:
+            user_id, since = parse_uri(str(uri))
+            if since is None:
+                text = change_feed.snapshot_json(user_id, memory_store.get_all_memories(user_id))
+            else:
+                text = change_feed.changes_json(user_id, since)
+            return [ReadResourceContents(content=text, mime_type="application/json")]
+        
+        @self.server.subscribe_resource()
+        async def handle_subscribe_resource(uri) -> None:
+            change_feed.subscribe(str(uri), self.server.request_context.session)
+        
+        @self.server.unsubscribe_resource()
+        async def handle_unsubscribe_resource(uri) -> None:
+            change_feed.unsubscribe(str(uri), self.server.request_context.session)
+        
         @self.server.list_tools()
         async def handle_list_tools() -> List[Tool]:
             """列出可用的内存工具"""
@@ -125,7 +762,11 @@ class OpenMemoryMCPServer:
                         "properties": {
                             "query": {"type": "string", "description": "搜索查询"},
                             "user_id": {"type": "string", "description": "用户标识符", "default": "default_user"},
-                            "limit": {"type": "integer", "description": "最大结果数量", "default": 10}
+                            "limit": {"type": "integer", "description": "最大结果数量", "default": 10},
+                            "fuzzy": {"type": "boolean", "description": "容忍拼写错误的模糊搜索，结果按相似度排序", "default": False},
+                            "max_distance": {"type": "integer", "description": "模糊搜索允许的最大编辑距离（默认按查询长度自动选择）"},
+                            "semantic": {"type": "boolean", "description": "按语义相似度搜索（需启用向量模式）", "default": False},
+                            **FORMAT_SCHEMA
                         },
                         "required": ["query"]
                     }
@@ -136,10 +777,37 @@ class OpenMemoryMCPServer:
                     inputSchema={
                         "type": "object",
                         "properties": {
-                            "user_id": {"type": "string", "description": "用户标识符", "default": "default_user"}
+                            "user_id": {"type": "string", "description": "用户标识符", "default": "default_user"},
+                            **FORMAT_SCHEMA
                         }
                     }
                 ),
+                Tool(
+                    name="delete_memory",
+                    description="删除指定记忆",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "memory_id": {"type": "string", "description": "要删除的记忆ID"},
+                            "user_id": {"type": "string", "description": "用户标识符", "default": "default_user"}
+                        },
+                        "required": ["memory_id"]
+                    }
+                ),
+                Tool(
+                    name="update_memory",
+                    description="更新现有记忆",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "memory_id": {"type": "string", "description": "要更新的记忆ID"},
+                            "new_text": {"type": "string", "description": "新的记忆内容"},
+                            "user_id": {"type": "string", "description": "用户标识符", "default": "default_user"},
+                            "metadata": {"type": "object", "description": "新的元数据（可选，省略则保留原值）"}
+                        },
+                        "required": ["memory_id", "new_text"]
+                    }
+                ),
                 Tool(
                     name="delete_all_memories",
                     description="清除所有记忆",
@@ -160,9 +828,8 @@ class OpenMemoryMCPServer:
                 )
             ]
 
-        @self.server.call_tool()
-        async def handle_call_tool(name: str, arguments: dict) -> List[TextContent]:
-            """处理工具调用"""
+        async def dispatch_tool(name: str, arguments: dict) -> List[TextContent]:
+            """执行具体的工具调用"""
             try:
                 if name == "add_memories":
                     text = arguments.get("text", "")
@@ -175,7 +842,12 @@ class OpenMemoryMCPServer:
                             text="❌ 错误：文本内容不能为空"
                         )]
                     
-                    result = memory_store.add_memory(text, user_id, metadata)
+                    with phase("store"):
+                        result = memory_store.add_memory(text, user_id, metadata)
+                    with phase("embed"):
+                        await memory_store.sync_vectors()
+                    with phase("notify"):
+                        await change_feed.publish(user_id, "add", result["id"], result, seq=memory_store.last_seq)
                     
                     return [TextContent(
                         type="text",
@@ -193,7 +865,28 @@ class OpenMemoryMCPServer:
                             text="❌ 错误：搜索查询不能为空"
                         )]
                     
-                    results = memory_store.search_memories(query, user_id, limit)
+                    # 先校验格式参数，参数无效时不执行查询
+                    options = format_options(arguments)
+                    
+                    semantic = bool(arguments.get("semantic", False))
+                    query_vector = None
+                    if semantic:
+                        with phase("embed"):
+                            query_vector = await memory_store.embed_query(query)
+                    with phase("search"):
+                        results = memory_store.search_memories(
+                            query, user_id, limit,
+                            fuzzy=bool(arguments.get("fuzzy", False)),
+                            max_distance=arguments.get("max_distance"),
+                            semantic=semantic,
+                            query_vector=query_vector
+                        )
+                    
+                    if options["fmt"] != "pretty":
+                        return [TextContent(
+                            type="text",
+                            text=encode_results(results, **options)
+                        )]
                     
                     if not results:
                         return [TextContent(
@@ -203,7 +896,10 @@ class OpenMemoryMCPServer:
                     
                     result_text = f"🔍 找到 {len(results)} 条相关记忆:\n\n"
                     for i, memory in enumerate(results, 1):
-                        result_text += f"{i}. 📝 {memory['text']}\n   🆔 {memory['id']}\n   ⏰ {memory['created_at']}\n\n"
+                        result_text += f"{i}. 📝 {memory['text']}\n   🆔 {memory['id']}\n   ⏰ {memory['created_at']}\n"
+                        if "score" in memory:
+                            result_text += f"   🎯 相似度: {memory['score']}\n"
+                        result_text += "\n"
                     
                     return [TextContent(
                         type="text",
@@ -213,7 +909,16 @@ class OpenMemoryMCPServer:
                 elif name == "list_memories":
                     user_id = arguments.get("user_id", "default_user")
                     
-                    results = memory_store.get_all_memories(user_id)
+                    options = format_options(arguments)
+                    
+                    with phase("store"):
+                        results = memory_store.get_all_memories(user_id)
+                    
+                    if options["fmt"] != "pretty":
+                        return [TextContent(
+                            type="text",
+                            text=encode_results(results, **options)
+                        )]
                     
                     if not results:
                         return [TextContent(
@@ -230,10 +935,73 @@ class OpenMemoryMCPServer:
                         text=result_text
                     )]
                 
+                elif name == "delete_memory":
+                    memory_id = arguments.get("memory_id", "")
+                    user_id = arguments.get("user_id", "default_user")
+                    
+                    if not memory_id:
+                        return [TextContent(
+                            type="text",
+                            text="❌ 错误：记忆ID不能为空"
+                        )]
+                    
+                    with phase("store"):
+                        result = memory_store.delete_memory(memory_id, user_id)
+                    
+                    if result is None:
+                        return [TextContent(
+                            type="text",
+                            text=f"❌ 未找到用户 {user_id} 的记忆 (ID: {memory_id})"
+                        )]
+                    
+                    with phase("notify"):
+                        await change_feed.publish(user_id, "delete", memory_id, seq=memory_store.last_seq)
+                    
+                    return [TextContent(
+                        type="text",
+                        text=f"🗑️ 记忆删除成功 (ID: {memory_id})"
+                    )]
+                
+                elif name == "update_memory":
+                    memory_id = arguments.get("memory_id", "")
+                    new_text = arguments.get("new_text", "")
+                    user_id = arguments.get("user_id", "default_user")
+                    metadata = arguments.get("metadata")
+                    
+                    if not memory_id or not new_text:
+                        return [TextContent(
+                            type="text",
+                            text="❌ 错误：记忆ID和新文本内容都不能为空"
+                        )]
+                    
+                    with phase("store"):
+                        result = memory_store.update_memory(memory_id, new_text, user_id, metadata)
+                    
+                    if result is None:
+                        return [TextContent(
+                            type="text",
+                            text=f"❌ 未找到用户 {user_id} 的记忆 (ID: {memory_id})"
+                        )]
+                    
+                    with phase("embed"):
+                        await memory_store.sync_vectors()
+                    
+                    with phase("notify"):
+                        await change_feed.publish(result["user_id"], "update", memory_id, result, seq=memory_store.last_seq)
+                    
+                    return [TextContent(
+                        type="text",
+                        text=f"✏️ 记忆更新成功！\n📝 内容: {result['text']}\n🆔 ID: {result['id']}\n⏰ 更新时间: {result['updated_at']}"
+                    )]
+                
                 elif name == "delete_all_memories":
                     user_id = arguments.get("user_id", "default_user")
                     
-                    result = memory_store.delete_all_memories(user_id)
+                    with phase("store"):
+                        result = memory_store.delete_all_memories(user_id)
+                    if result["deleted_count"]:
+                        with phase("notify"):
+                            await change_feed.publish(user_id, "delete_all", seq=memory_store.last_seq)
                     
                     return [TextContent(
                         type="text",
@@ -241,8 +1009,8 @@ class OpenMemoryMCPServer:
                     )]
                 
                 elif name == "get_server_status":
-                    total_memories = sum(len(memories) for memories in memory_store.memories.values())
-                    total_users = len(memory_store.memories)
+                    total_memories = memory_store.total_memories
+                    total_users = len(memory_store.user_ids())
                     
                     status = {
                         "server_name": "OpenMemory Simple",
@@ -251,6 +1019,13 @@ class OpenMemoryMCPServer:
                         "total_memories": total_memories,
                         "total_users": total_users,
                         "storage_path": memory_store.storage_path,
+                        "index_build_seconds": round(memory_store.index_build_seconds, 3),
+                        "tiers": memory_store.tier_stats(),
+                        "compression": memory_store.codec.stats(),
+                        "vectors": memory_store.vectors.stats() if memory_store.vectors is not None else None,
+                        "scheduler": scheduler.status(),
+                        "profiling": call_profiler.status(),
+                        "changes": change_feed.status(),
                         "status": "Running"
                     }
                     
@@ -267,31 +1042,56 @@ class OpenMemoryMCPServer:
                     
             except Exception as e:
                 error_msg = f"❌ 执行 {name} 时出错: {str(e)}"
-                print(error_msg)
+                print(error_msg, file=sys.stderr)
                 return [TextContent(
                     type="text",
                     text=error_msg
                 )]
 
+        @self.server.call_tool()
+        async def handle_call_tool(name: str, arguments: dict) -> List[TextContent]:
+            """处理工具调用：先经过调度器准入，再分发到具体工具"""
+            arguments = arguments or {}
+            user_id = arguments.get("user_id", "default_user")
+            async with call_profiler.profile(name, user_id, arguments) as call:
+                try:
+                    async with scheduler.admit(name, user_id):
+                        if call:
+                            call.lap("queue")
+                        return await dispatch_tool(name, arguments)
+                except SchedulerRejected as e:
+                    return [TextContent(
+                        type="text",
+                        text=f"⏳ {str(e)}"
+                    )]
+
     async def run(self):
-        async with stdio_server() as (read_stream, write_stream):
-            await self.server.run(
-                read_stream,
-                write_stream,
-                InitializationOptions(
-                    server_name="openmemory",
-                    server_version="1.0.0",
-                    capabilities=self.server.get_capabilities(
-                        notification_options=NotificationOptions(),
-                        experimental_capabilities={}
+        capabilities = self.server.get_capabilities(
+            notification_options=NotificationOptions(),
+            experimental_capabilities={}
+        )
+        # get_capabilities 不会自动声明资源订阅
+        capabilities.resources.subscribe = True
+        # 启动后在后台为缺少向量的记忆生成向量，不推迟握手
+        backfill = asyncio.create_task(memory_store.backfill_vectors())
+        try:
+            async with stdio_server() as (read_stream, write_stream):
+                await self.server.run(
+                    read_stream,
+                    write_stream,
+                    InitializationOptions(
+                        server_name="openmemory",
+                        server_version="1.0.0",
+                        capabilities=capabilities
                     )
                 )
-            )
+        finally:
+            backfill.cancel()
 
 async def main():
-    print("🚀 OpenMemory 简化版服务器启动中...")
-    print("📁 存储方式: 本地文件系统")
-    print("✅ 服务器启动成功，等待连接...")
+    print("🚀 OpenMemory 简化版服务器启动中...", file=sys.stderr)
+    print("📁 存储方式: 本地文件系统", file=sys.stderr)
+    print("✅ 服务器启动成功，等待连接...", file=sys.stderr)
     
     server = OpenMemoryMCPServer()
     await server.run()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+OpenMemory 简化版冷存储
+热层记忆常驻内存并带索引；不常访问的旧记忆被降级到冷层，按用户批量写入
+压缩的只读段文件（每行一条 JSON 记录，压缩方式见 openmemory_codec）。内存中只保留段清单：
+``memory_id -> 段名`` 以及每个段的用户与存活ID，段内容在搜索需要时才解压。
+"""
+
+import json
+import math
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from openmemory_codec import BlockCodec
+
+SEGMENT_SUFFIX = ".seg"
+
+# 每次检索相当于把"最近使用时间"推后这么多秒（按次数取对数）
+HIT_WEIGHT_SECONDS = 24 * 3600
+
+
+def memory_cost(memory: dict) -> int:
+    """估算一条热层记忆连同索引占用的内存字节数"""
+    return 512 + 8 * len(memory["text"])
+
+
+def created_timestamp(memory: dict) -> float:
+    try:
+        return datetime.fromisoformat(memory["created_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+
+def heat(created_ts: float, stats: Optional[list]) -> float:
+    """记忆热度：最近一次接触时间，加上按检索次数递增的奖励"""
+    if not stats:
+        return created_ts
+    hits, last_access = stats
+    return max(created_ts, last_access) + HIT_WEIGHT_SECONDS * math.log2(1 + hits)
+
+
+class ColdStore:
+    """压缩段文件组成的冷层"""
+
+    def __init__(self, directory: str, codec: Optional[BlockCodec] = None):
+        self.directory = directory
+        self.codec = codec or BlockCodec("zlib")
+        self.segments: Dict[str, dict] = {}   # 段名 -> {"user_id", "ids": set, "count"}
+        self.locations: Dict[str, str] = {}   # memory_id -> 段名
+        self.next_segment = 0
+        self._cache_name: Optional[str] = None
+        self._cache: Dict[str, dict] = {}
+
+    # --- 清单 ---
+
+    def manifest(self) -> dict:
+        return {
+            "next_segment": self.next_segment,
+            "segments": {
+                name: {"user_id": seg["user_id"], "ids": list(seg["ids"]), "count": seg["count"]}
+                for name, seg in self.segments.items()
+            },
+        }
+
+    def load_manifest(self, manifest: Optional[dict]):
+        self.segments = {}
+        self.locations = {}
+        if not manifest:
+            return
+        self.next_segment = manifest.get("next_segment", 0)
+        for name, seg in manifest.get("segments", {}).items():
+            self.register(name, seg["user_id"], seg["ids"], seg["count"])
+
+    def register(self, name: str, user_id: str, ids: Iterable[str], count: int):
+        ids = set(ids)
+        # 重放日志时登记的段可能晚于清单中的计数
+        self.next_segment = max(self.next_segment, int(name[:-len(SEGMENT_SUFFIX)]) + 1)
+        self.segments[name] = {"user_id": user_id, "ids": ids, "count": count}
+        for memory_id in ids:
+            self.locations[memory_id] = name
+
+    # --- 段文件 ---
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def write_segment(self, memories: List[dict]) -> str:
+        """写入一个新段文件并返回段名（尚未登记到清单）"""
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{self.next_segment:08d}{SEGMENT_SUFFIX}"
+        self.next_segment += 1
+        payload = "\n".join(json.dumps(memory, ensure_ascii=False) for memory in memories)
+        tmp_path = self._path(name) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.codec.encode(payload.encode("utf-8")))
+        os.replace(tmp_path, self._path(name))
+        return name
+
+    def _load(self, name: str) -> Dict[str, dict]:
+        if self._cache_name != name:
+            with open(self._path(name), "rb") as f:
+                payload = self.codec.decode(f.read()).decode("utf-8")
+            self._cache = {}
+            for line in payload.split("\n"):
+                if line:
+                    memory = json.loads(line)
+                    self._cache[memory["id"]] = memory
+            self._cache_name = name
+        return self._cache
+
+    def read_segment(self, name: str) -> Iterator[dict]:
+        """按写入顺序产出段内仍存活的记忆"""
+        live = self.segments[name]["ids"]
+        for memory_id, memory in self._load(name).items():
+            if memory_id in live:
+                yield memory
+
+    # --- 记录 ---
+
+    def get(self, memory_id: str) -> Optional[dict]:
+        name = self.locations.get(memory_id)
+        if name is None:
+            return None
+        return self._load(name).get(memory_id)
+
+    def owner(self, memory_id: str) -> Optional[str]:
+        name = self.locations.get(memory_id)
+        return None if name is None else self.segments[name]["user_id"]
+
+    def remove(self, memory_id: str) -> bool:
+        name = self.locations.pop(memory_id, None)
+        if name is None:
+            return False
+        seg = self.segments[name]
+        seg["ids"].discard(memory_id)
+        if not seg["ids"]:
+            del self.segments[name]
+        return True
+
+    def remove_user(self, user_id: str) -> List[str]:
+        """移除用户的全部冷记忆，返回被移除的ID"""
+        removed = []
+        for name in self.user_segments(user_id):
+            for memory_id in self.segments.pop(name)["ids"]:
+                self.locations.pop(memory_id, None)
+                removed.append(memory_id)
+        return removed
+
+    def user_segments(self, user_id: str) -> List[str]:
+        """用户的段名，按写入顺序从新到旧"""
+        return sorted((name for name, seg in self.segments.items() if seg["user_id"] == user_id), reverse=True)
+
+    def count(self, user_id: Optional[str] = None) -> int:
+        if user_id is None:
+            return len(self.locations)
+        return sum(len(self.segments[name]["ids"]) for name in self.user_segments(user_id))
+
+    # --- 维护 ---
+
+    def compact(self, max_segments_per_user: int = 8):
+        """合并死记录过半或段数过多的用户段
+
+        旧段只是从清单移除，文件要等快照落盘后由 ``remove_orphans`` 删除。
+        """
+        by_user: Dict[str, List[str]] = {}
+        for name, seg in self.segments.items():
+            by_user.setdefault(seg["user_id"], []).append(name)
+        for user_id, names in by_user.items():
+            sparse = any(len(self.segments[n]["ids"]) * 2 < self.segments[n]["count"] for n in names)
+            if not sparse and len(names) <= max_segments_per_user:
+                continue
+            memories = [memory for name in sorted(names) for memory in self.read_segment(name)]
+            for name in names:
+                del self.segments[name]
+            if memories:
+                new_name = self.write_segment(memories)
+                self.register(new_name, user_id, (m["id"] for m in memories), len(memories))
+        self._cache_name = None
+
+    def delete_files(self, names: Iterable[str]):
+        for name in names:
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def remove_orphans(self):
+        """删除清单中不存在的段文件；只能在快照落盘、日志清空之后调用"""
+        if not os.path.isdir(self.directory):
+            return
+        self.delete_files(
+            name for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX) and name not in self.segments
+        )
+
+    def disk_bytes(self) -> int:
+        return sum(os.path.getsize(self._path(name)) for name in self.segments if os.path.exists(self._path(name)))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+OpenMemory 向量量化基准
+对同一批向量分别建立 float32 / int8 / binary 索引，报告常驻内存、相对
+float32 的压缩倍数、recall@k（以 float32 精确结果为基准）和平均查询耗时。
+
+默认使用聚簇的合成向量；``--texts`` 指定每行一条文本的文件时，改用本地
+嵌入模型生成真实向量（需要 sentence-transformers）。
+
+示例:
+    python openmemory_vector_bench.py --count 5000 --dim 384 --queries 50
+    python openmemory_vector_bench.py --texts memories.txt --queries 100
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from openmemory_vectors import DEFAULT_RESCORE, MODES, VectorIndex, load_embedder
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, spread: float, rng: random.Random):
+    centers = [[rng.gauss(0, 1) for _ in range(dim)] for _ in range(clusters)]
+    for _ in range(count):
+        center = rng.choice(centers)
+        yield [c + rng.gauss(0, spread) for c in center]
+
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    if args.texts:
+        embedder = load_embedder(args.model)
+        if embedder is None:
+            raise SystemExit("需要 sentence-transformers 才能嵌入文本")
+        with open(args.texts, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        vectors = embedder.embed(texts)
+        queries = [vectors[i] for i in rng.sample(range(len(vectors)), min(args.queries, len(vectors)))]
+    else:
+        vectors = list(synthetic_vectors(args.count, args.dim, args.clusters, args.spread, rng))
+        queries = list(synthetic_vectors(args.queries, args.dim, args.clusters, args.spread, rng))
+
+    report = {"vectors": len(vectors), "dim": len(vectors[0]), "k": args.k, "modes": {}}
+    truth = None
+    with tempfile.TemporaryDirectory(prefix="openmemory-vec-") as workdir:
+        for mode in MODES:
+            index = VectorIndex(mode, path=os.path.join(workdir, f"{mode}.vec"),
+                                rescore=args.rescore or DEFAULT_RESCORE[mode])
+            started = time.perf_counter()
+            for i, vector in enumerate(vectors):
+                index.add(str(i), vector)
+            build_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            results = [[item_id for item_id, _ in index.search(q, args.k)] for q in queries]
+            query_ms = (time.perf_counter() - started) * 1000 / len(queries)
+            if truth is None:
+                truth = results  # float32 全量扫描即精确结果
+            recall = sum(len(set(r) & set(t)) for r, t in zip(results, truth)) / sum(len(t) for t in truth)
+
+            stats = index.stats()
+            report["modes"][mode] = {
+                "resident_vector_bytes": stats["resident_vector_bytes"],
+                "bytes_per_vector": round(stats["resident_vector_bytes"] / len(vectors), 1),
+                "reduction_vs_float32": round(stats["float32_bytes"] / stats["resident_vector_bytes"], 1),
+                "recall": round(recall, 4),
+                "rescore_candidates": args.k * index.rescore,
+                "query_ms": round(query_ms, 2),
+                "build_s": round(build_seconds, 2),
+            }
+            index.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenMemory 向量量化基准")
+    parser.add_argument("--count", type=int, default=5000, help="合成向量数量")
+    parser.add_argument("--dim", type=int, default=384, help="合成向量维度")
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--spread", type=float, default=0.6, help="簇内噪声标准差")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, default=0, help="粗筛候选倍数（0 表示按模式取默认值）")
+    parser.add_argument("--texts", help="每行一条文本，用本地嵌入模型生成向量")
+    parser.add_argument("--model", help="嵌入模型名称，默认 OPENMEMORY_EMBED_MODEL")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    print(f"📐 {report['vectors']} 个向量, {report['dim']} 维, k={report['k']}")
+    for mode, stats in report["modes"].items():
+        print(f"   {mode:<8} {stats['bytes_per_vector']:>8} B/向量  压缩 {stats['reduction_vs_float32']:>5}x  "
+              f"recall@{report['k']}={stats['recall']:<6}  查询 {stats['query_ms']}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+OpenMemory 量化向量存储
+常驻内存的只有量化后的向量：int8（每维1字节加一个缩放系数，约为 float32 的1/4）
+或二值（每维1位，约1/32）。完整精度的 float32 向量顺序追加在磁盘文件中，
+搜索先用量化向量（int8 点积或汉明距离）粗筛出若干倍的候选，再从磁盘读出
+这些候选的完整向量精确重排。``float32`` 模式保留全部向量在内存中，作为对照。
+
+向量写入前先归一化，分数为余弦相似度。文件只追加，同一ID以最后一行为准；
+已删除的行由调用方在加载时通过 ``live`` 判断剔除，死行过多时重写文件。
+
+安装了 numpy 时粗筛按矩阵批量计算，启动加载时也批量量化；否则逐条用纯
+Python 计算，此时量化只节省内存，不会更快（int8 还要多一次磁盘重排）。
+"""
+
+import heapq
+import operator
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+MODES = ("float32", "int8", "binary")
+MAGIC = b"OMV1"
+_HEADER = struct.Struct(">4sI")  # magic, 维度
+_ROW = struct.Struct(">HH")      # ID长度, 分组长度
+
+# 粗筛候选数 = k × 该倍数；二值量化损失更多，需要更大的候选集
+DEFAULT_RESCORE = {"float32": 1, "int8": 4, "binary": 32}
+
+DEFAULT_EMBED_MODEL = "all-MiniLM-L6-v2"
+
+# 加载时每次批量量化的向量数
+LOAD_CHUNK = 4096
+
+
+def normalize(vector: Sequence[float]) -> array:
+    values = array("f", vector)
+    norm = sum(x * x for x in values) ** 0.5
+    if norm:
+        values = array("f", (x / norm for x in values))
+    return values
+
+
+def quantize_int8(vector: Sequence[float]) -> Tuple[array, float]:
+    """对称量化到 [-127, 127]，返回编码和缩放系数"""
+    peak = max((abs(x) for x in vector), default=0.0)
+    scale = peak / 127 if peak else 1.0
+    return array("b", (int(round(x / scale)) for x in vector)), scale
+
+
+def quantize_binary(vector: Sequence[float]) -> int:
+    """按符号取位，第 i 维对应第 i 位"""
+    bits = 0
+    for i, x in enumerate(vector):
+        if x > 0:
+            bits |= 1 << i
+    return bits
+
+
+def _dot(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum(map(operator.mul, a, b))
+
+
+class VectorIndex:
+    """量化向量常驻内存、完整向量存盘的向量索引"""
+
+    def __init__(self, mode: str = "int8", path: Optional[str] = None, dim: Optional[int] = None,
+                 rescore: Optional[int] = None):
+        if mode not in MODES:
+            raise ValueError(f"不支持的向量模式: {mode}")
+        self.mode = mode
+        self.path = path
+        self.dim = dim
+        self.rescore = rescore or DEFAULT_RESCORE[mode]
+        self.dead_rows = 0
+        self._file = None
+        self._reset()
+
+    def _reset(self):
+        self.ids: List[Optional[str]] = []        # 槽位 -> ID（删除后为 None）
+        self.slot_of: Dict[str, int] = {}
+        self.groups: Dict[str, Set[int]] = {}
+        self._group_of: List[Optional[str]] = []
+        self._offsets = array("Q")                # 槽位 -> 完整向量在文件中的偏移
+        self._floats = array("f")
+        self._codes = array("b")
+        self._scales = array("f")
+        self._bits = bytearray()
+
+    # --- 磁盘文件 ---
+
+    def _open(self):
+        if self._file is not None:
+            return self._file
+        if self.path is None:
+            self._file = tempfile.TemporaryFile()
+        else:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a+b")
+        self._file.seek(0, os.SEEK_END)
+        if self._file.tell() == 0 and self.dim:
+            self._file.write(_HEADER.pack(MAGIC, self.dim))
+        return self._file
+
+    def _append_row(self, item_id: str, group: Optional[str], vector: array) -> int:
+        f = self._open()
+        f.seek(0, os.SEEK_END)
+        id_bytes = item_id.encode("utf-8")
+        group_bytes = (group or "").encode("utf-8")
+        f.write(_ROW.pack(len(id_bytes), len(group_bytes)) + id_bytes + group_bytes)
+        offset = f.tell()
+        f.write(vector.tobytes())
+        return offset
+
+    def _read_vector(self, slot: int) -> array:
+        f = self._open()
+        f.seek(self._offsets[slot])
+        vector = array("f")
+        vector.frombytes(f.read(4 * self.dim))
+        return vector
+
+    def load(self, live: Optional[Callable[[str], bool]] = None, dim: Optional[int] = None) -> int:
+        """从文件重建内存中的量化向量；维度与 dim 不符（更换了嵌入模型）时丢弃旧文件"""
+        self._reset()
+        self.dead_rows = 0
+        if self.path is None or not os.path.exists(self.path):
+            if dim:
+                self.dim = dim
+            return 0
+        self.close()
+        rows: Dict[str, Tuple[Optional[str], int]] = {}
+        with open(self.path, "rb") as f:
+            header = f.read(_HEADER.size)
+            magic, file_dim = _HEADER.unpack(header) if len(header) == _HEADER.size else (None, 0)
+            if magic != MAGIC or (dim and file_dim != dim):
+                print(f"向量文件 {self.path} 与当前嵌入维度不符，将重新生成", file=sys.stderr)
+                f.close()
+                os.remove(self.path)
+                self.dim = dim
+                return 0
+            self.dim = file_dim
+            size = 4 * file_dim
+            total = 0
+            while True:
+                head = f.read(_ROW.size)
+                if len(head) < _ROW.size:
+                    break
+                id_len, group_len = _ROW.unpack(head)
+                key = f.read(id_len + group_len)
+                offset = f.tell()
+                if len(key) < id_len + group_len or len(f.read(size)) < size:
+                    break  # 写入中断留下的残行
+                total += 1
+                item_id = key[:id_len].decode("utf-8")
+                rows[item_id] = (key[id_len:].decode("utf-8") or None, offset)
+        for item_id, (group, offset) in rows.items():
+            if live is None or live(item_id):
+                self._place(item_id, group, offset)
+        self.dead_rows = total - len(self.slot_of)
+        if NUMPY_AVAILABLE:
+            self._encode_bulk()
+        else:
+            for slot in range(len(self.ids)):
+                self._encode(self._read_vector(slot))
+        return len(self.slot_of)
+
+    def _encode_bulk(self):
+        """按块读出完整向量并用 numpy 批量量化，结果与逐条 ``_encode`` 相同"""
+        f = self._open()
+        size = 4 * self.dim
+        for start in range(0, len(self.ids), LOAD_CHUNK):
+            data = bytearray()
+            for offset in self._offsets[start:start + LOAD_CHUNK]:
+                f.seek(offset)
+                data += f.read(size)
+            matrix = numpy.frombuffer(data, dtype=numpy.float32).reshape(-1, self.dim)
+            if self.mode == "float32":
+                self._floats.frombytes(matrix.tobytes())
+            elif self.mode == "int8":
+                # 与 quantize_int8 一样用双精度计算，舍入同为四舍六入五成双
+                values = matrix.astype(numpy.float64)
+                peak = numpy.abs(values).max(axis=1)
+                scales = numpy.where(peak > 0, peak / 127, 1.0)
+                self._codes.frombytes(numpy.rint(values / scales[:, None]).astype(numpy.int8).tobytes())
+                self._scales.frombytes(scales.astype(numpy.float32).tobytes())
+            else:
+                self._bits += numpy.packbits(matrix > 0, axis=1, bitorder="little").tobytes()
+
+    # --- 增删 ---
+
+    def _place(self, item_id: str, group: Optional[str], offset: int) -> int:
+        slot = len(self.ids)
+        self.ids.append(item_id)
+        self._group_of.append(group)
+        self.slot_of[item_id] = slot
+        self.groups.setdefault(group, set()).add(slot)
+        self._offsets.append(offset)
+        return slot
+
+    def _encode(self, vector: array):
+        if self.mode == "float32":
+            self._floats.extend(vector)
+        elif self.mode == "int8":
+            codes, scale = quantize_int8(vector)
+            self._codes.extend(codes)
+            self._scales.append(scale)
+        else:
+            self._bits.extend(quantize_binary(vector).to_bytes((self.dim + 7) // 8, "little"))
+
+    def add(self, item_id: str, vector: Sequence[float], group: Optional[str] = None):
+        """添加或替换一个向量"""
+        if self.dim is None:
+            self.dim = len(vector)
+        elif len(vector) != self.dim:
+            raise ValueError(f"向量维度 {len(vector)} 与索引维度 {self.dim} 不符")
+        self.remove(item_id)
+        vector = normalize(vector)
+        self._place(item_id, group, self._append_row(item_id, group, vector))
+        self._encode(vector)
+
+    def remove(self, item_id: str) -> bool:
+        slot = self.slot_of.pop(item_id, None)
+        if slot is None:
+            return False
+        self.ids[slot] = None
+        group = self._group_of[slot]
+        self.groups[group].discard(slot)
+        if not self.groups[group]:
+            del self.groups[group]
+        self.dead_rows += 1
+        return True
+
+    def remove_group(self, group: str) -> int:
+        ids = [self.ids[slot] for slot in self.groups.get(group, ())]
+        for item_id in ids:
+            self.remove(item_id)
+        return len(ids)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.slot_of
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def should_compact(self) -> bool:
+        return self.dead_rows > max(1000, len(self.slot_of))
+
+    def compact(self):
+        """重写文件只保留存活的行，同时回收内存中的死槽位"""
+        if self.path is None or not self.ids:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(_HEADER.pack(MAGIC, self.dim))
+            for slot, item_id in enumerate(self.ids):
+                if item_id is None:
+                    continue
+                id_bytes = item_id.encode("utf-8")
+                group_bytes = (self._group_of[slot] or "").encode("utf-8")
+                out.write(_ROW.pack(len(id_bytes), len(group_bytes)) + id_bytes + group_bytes)
+                out.write(self._read_vector(slot).tobytes())
+        self.close()
+        os.replace(tmp_path, self.path)
+        live = set(self.slot_of)
+        self.load(live.__contains__)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # --- 搜索 ---
+
+    def _first_pass(self, query: array, slots: Iterable[int], n: int) -> List[Tuple[float, int]]:
+        if NUMPY_AVAILABLE:
+            return self._first_pass_numpy(query, slots, n)
+        dim = self.dim
+        if self.mode == "float32":
+            floats = self._floats
+            scored = ((_dot(query, floats[s * dim:(s + 1) * dim]), s) for s in slots)
+        elif self.mode == "int8":
+            codes, scales = self._codes, self._scales
+            scored = ((_dot(query, codes[s * dim:(s + 1) * dim]) * scales[s], s) for s in slots)
+        else:
+            width = (dim + 7) // 8
+            bits = self._bits
+            target = quantize_binary(query)
+            from_bytes = int.from_bytes
+            scored = ((-(target ^ from_bytes(bits[s * width:(s + 1) * width], "little")).bit_count(), s)
+                      for s in slots)
+        return heapq.nlargest(n, scored)
+
+    def _first_pass_numpy(self, query: array, slots: Iterable[int], n: int) -> List[Tuple[float, int]]:
+        """与 _first_pass 相同的打分，按矩阵批量计算"""
+        index = numpy.fromiter(slots, dtype=numpy.int64)
+        if not len(index):
+            return []
+        q = numpy.frombuffer(query, dtype=numpy.float32)
+        if self.mode == "float32":
+            matrix = numpy.frombuffer(self._floats, dtype=numpy.float32).reshape(-1, self.dim)
+            scores = matrix[index] @ q
+        elif self.mode == "int8":
+            matrix = numpy.frombuffer(self._codes, dtype=numpy.int8).reshape(-1, self.dim)
+            scales = numpy.frombuffer(self._scales, dtype=numpy.float32)
+            scores = (matrix[index].astype(numpy.float32) @ q) * scales[index]
+        else:
+            width = (self.dim + 7) // 8
+            matrix = numpy.frombuffer(bytes(self._bits), dtype=numpy.uint8).reshape(-1, width)
+            target = numpy.frombuffer(quantize_binary(query).to_bytes(width, "little"), dtype=numpy.uint8)
+            scores = -numpy.unpackbits(matrix[index] ^ target, axis=1).sum(axis=1, dtype=numpy.int64)
+        if n < len(index):
+            top = numpy.argpartition(-scores, n - 1)[:n]
+        else:
+            top = numpy.arange(len(index))
+        # 先按分数、再按槽位降序，与纯 Python 的 heapq.nlargest 一致
+        top = top[numpy.lexsort((-index[top], -scores[top]))]
+        return [(float(scores[i]), int(index[i])) for i in top]
+
+    def search(self, vector: Sequence[float], k: int = 10, group: Optional[str] = None) -> List[Tuple[str, float]]:
+        """返回余弦相似度最高的 k 个 ``(ID, 分数)``；指定 group 时只搜索该分组"""
+        if not self.slot_of or k <= 0:
+            return []
+        query = normalize(vector)
+        if group is not None:
+            slots = self.groups.get(group, ())
+        else:
+            slots = (slot for slot, item_id in enumerate(self.ids) if item_id is not None)
+        candidates = self._first_pass(query, slots, k * self.rescore)
+        if self.mode == "float32":
+            top = candidates[:k]
+        else:
+            # 按文件偏移顺序读取候选的完整向量，减少随机读
+            slots = sorted((slot for _, slot in candidates), key=self._offsets.__getitem__)
+            vectors = [self._read_vector(slot) for slot in slots]
+            if NUMPY_AVAILABLE:
+                exact = (numpy.frombuffer(b"".join(v.tobytes() for v in vectors), dtype=numpy.float32)
+                         .reshape(-1, self.dim) @ numpy.frombuffer(query, dtype=numpy.float32)).tolist()
+            else:
+                exact = [_dot(query, vector) for vector in vectors]
+            top = heapq.nlargest(k, zip(exact, slots))
+        return [(self.ids[slot], round(score, 4)) for score, slot in top]
+
+    # --- 统计 ---
+
+    def vector_bytes(self) -> int:
+        """常驻内存的向量数据字节数（含死槽位）"""
+        if self.mode == "float32":
+            return self._floats.itemsize * len(self._floats)
+        if self.mode == "int8":
+            return len(self._codes) + self._scales.itemsize * len(self._scales)
+        return len(self._bits)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "dim": self.dim,
+            "vectors": len(self.slot_of),
+            "dead_rows": self.dead_rows,
+            "resident_vector_bytes": self.vector_bytes(),
+            "float32_bytes": 4 * (self.dim or 0) * len(self.ids),
+            "disk_bytes": os.path.getsize(self.path) if self.path and os.path.exists(self.path) else None,
+        }
+
+
+class LocalEmbedder:
+    """基于 sentence-transformers 的本地嵌入模型"""
+
+    def __init__(self, model_name: Optional[str] = None):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name or os.getenv("OPENMEMORY_EMBED_MODEL", DEFAULT_EMBED_MODEL)
+        self.model = SentenceTransformer(self.model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [list(map(float, vector)) for vector in self.model.encode(texts)]
+
+
+def load_embedder(model_name: Optional[str] = None) -> Optional[LocalEmbedder]:
+    """加载本地嵌入模型，未安装依赖时返回 None"""
+    try:
+        return LocalEmbedder(model_name)
+    except ImportError:
+        print("Warning: sentence-transformers not installed, semantic search disabled. "
+              "Install with: pip install sentence-transformers", file=sys.stderr)
+    except Exception as e:
+        print(f"加载嵌入模型失败: {e}", file=sys.stderr)
+    return None
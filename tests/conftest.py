@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def simple(tmp_path_factory):
+    """openmemory_simple 在导入时创建全局存储，先切到临时目录避免写入仓库"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("import"))
+    try:
+        import openmemory_simple
+    finally:
+        os.chdir(cwd)
+    return openmemory_simple
+
+
+@pytest.fixture
+def make_store(simple, tmp_path):
+    """在同一路径上反复创建存储，模拟进程重启"""
+    path = str(tmp_path / "memories.pkl")
+
+    def make(**kwargs):
+        kwargs.setdefault("vector_mode", "")
+        return simple.SimpleMemoryStore(path, **kwargs)
+
+    make.path = path
+    return make
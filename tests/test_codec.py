@@ -0,0 +1,62 @@
+import zlib
+
+import pytest
+
+from openmemory_codec import BlockCodec
+
+TEXTS = [f"用户喜欢在周末去公园跑步，第 {i} 次记录 user prefers morning runs" for i in range(200)]
+
+
+@pytest.mark.parametrize("method", ["none", "zlib", "zstd"])
+def test_round_trip(method):
+    codec = BlockCodec(method)
+    data = "\n".join(TEXTS).encode("utf-8")
+    assert codec.decode(codec.encode(data)) == data
+
+
+@pytest.mark.parametrize("method", ["zlib", "zstd"])
+def test_dictionary_round_trip_and_retrain(method):
+    codec = BlockCodec(method)
+    codec.train(TEXTS, len(TEXTS))
+    first = codec.encode(TEXTS[0].encode("utf-8"))
+    plain = BlockCodec(method).encode(TEXTS[0].encode("utf-8"))
+    assert len(first) < len(plain)
+
+    codec.train(TEXTS[:50] + ["完全不同的语料 different corpus"] * 50, 400)
+    second = codec.encode(TEXTS[1].encode("utf-8"))
+    # 旧字典压缩的块在重新训练后仍可读取
+    assert codec.decode(first) == TEXTS[0].encode("utf-8")
+    assert codec.decode(second) == TEXTS[1].encode("utf-8")
+
+    restored = BlockCodec(method)
+    restored.load_state(codec.state())
+    assert restored.decode(first) == TEXTS[0].encode("utf-8")
+    assert restored.decode(second) == TEXTS[1].encode("utf-8")
+
+
+def test_reads_legacy_headerless_zlib():
+    data = b"legacy cold segment"
+    assert BlockCodec("zstd").decode(zlib.compress(data)) == data
+
+
+def test_should_train_when_corpus_doubles():
+    codec = BlockCodec("zlib")
+    assert not BlockCodec("none").should_train(100)
+    assert codec.should_train(100)
+    codec.train(TEXTS, 100)
+    assert not codec.should_train(150)
+    assert codec.should_train(200)
+
+
+@pytest.mark.parametrize("method", ["zlib", "zstd"])
+def test_store_snapshot_round_trip_keeps_stats(make_store, method):
+    store = make_store(compression=method)
+    for text in TEXTS:
+        store.add_memory(text, "alice")
+    store._save_memories()
+
+    restarted = make_store(compression=method)
+    assert [m["text"] for m in restarted.get_all_memories("alice")] == TEXTS
+    stats = restarted.codec.stats()
+    assert stats["raw_bytes"] > stats["compressed_bytes"] > 0
+    assert stats["ratio"] > 1
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from openmemory_format import encode_results, format_options
+
+ITEMS = [
+    {"id": f"id-{i}", "text": "记忆正文 " * 20 + str(i), "created_at": "2024-01-01T00:00:00"}
+    for i in range(10)
+]
+
+
+@pytest.mark.parametrize("fmt", ["json", "text"])
+@pytest.mark.parametrize("max_bytes", [40, 100, 200, 611, 2000])
+def test_output_fits_max_bytes(fmt, max_bytes):
+    output = encode_results(ITEMS, fmt, max_bytes=max_bytes)
+    assert len(output.encode("utf-8")) <= max_bytes
+    if fmt == "json":
+        decoded = json.loads(output)
+        assert decoded["count"] + decoded.get("omitted", 0) == len(ITEMS)
+
+
+def test_first_item_is_truncated_to_fit():
+    output = encode_results(ITEMS, "json", max_bytes=100)
+    decoded = json.loads(output)
+    assert len(output.encode("utf-8")) <= 100
+    assert decoded["count"] == 1
+    assert decoded["omitted"] == 9
+    assert decoded["results"][0]["text"].endswith("…")
+
+
+def test_unbounded_output_keeps_everything():
+    decoded = json.loads(encode_results(ITEMS, "json", fields=["id"]))
+    assert decoded == {"count": 10, "results": [{"id": item["id"]} for item in ITEMS]}
+
+
+def test_projection_defaults_to_json():
+    assert format_options({})["fmt"] == "pretty"
+    assert format_options({"max_bytes": 500})["fmt"] == "json"
+    assert format_options({"fields": ["id"], "format": "text"})["fmt"] == "text"
+
+
+def test_pretty_rejects_projection():
+    with pytest.raises(ValueError):
+        format_options({"format": "pretty", "fields": ["id"]})
@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from openmemory_index import build_user_index, default_max_distance, fuzzy_candidates, substring_distance
+
+
+@pytest.mark.parametrize("pattern, text, expected", [
+    ("learning", "deep learning notes", 0),
+    ("lerning", "deep learning notes", 1),
+    ("laerning", "deep learning notes", 2),
+    ("lrenaing", "deep learning notes", None),
+    ("python", "deep learning notes", None),
+    ("", "anything", 0),
+])
+def test_substring_distance(pattern, text, expected):
+    assert substring_distance(pattern, text, 2) == expected
+
+
+@pytest.fixture
+def store(make_store):
+    store = make_store()
+    for text in ["Machine learning notes", "cooking recipes", "machne lerning draft", "machine learning plan"]:
+        store.add_memory(text, "alice")
+    store.add_memory("machine learning for bob", "bob")
+    return store
+
+
+def test_ranks_exact_matches_before_typos(store):
+    results = store.search_memories("machine learning", "alice", fuzzy=True)
+    assert [m["text"] for m in results] == [
+        "Machine learning notes", "machine learning plan", "machne lerning draft",
+    ]
+    assert [m["score"] for m in results] == [1.0, 1.0, 0.875]
+
+
+def test_tolerates_typos_in_query(store):
+    results = store.search_memories("machin lerning", "alice", fuzzy=True)
+    assert results[0]["text"] in ("Machine learning notes", "machine learning plan")
+    assert "cooking recipes" not in [m["text"] for m in results]
+
+
+def test_respects_limit_and_max_distance(store):
+    assert len(store.search_memories("machine learning", "alice", limit=1, fuzzy=True)) == 1
+    exact = store.search_memories("machine learning", "alice", fuzzy=True, max_distance=0)
+    assert [m["text"] for m in exact] == ["Machine learning notes", "machine learning plan"]
+
+
+def test_skips_deleted_and_other_users(store):
+    target = store.search_memories("machine learning notes", "alice")[0]
+    store.delete_memory(target["id"])
+    texts = [m["text"] for m in store.search_memories("machine learning", "alice", fuzzy=True)]
+    assert "Machine learning notes" not in texts
+    assert "machine learning for bob" not in texts
+
+
+def test_short_query_falls_back_to_substring(store):
+    results = store.search_memories("co", "alice", fuzzy=True)
+    assert [m["text"] for m in results] == ["cooking recipes"]
+    assert results[0]["score"] == 1.0
+
+
+def test_default_distance_keeps_candidates_selective():
+    rng = random.Random(7)
+    words = ("cooking garden travel python budget meeting family music project notes weekend "
+             "running reading coffee kitchen market planning chinese evening".split())
+    texts = [" ".join(rng.choice(words) for _ in range(8)) for _ in range(2000)]
+    for slot in range(0, 2000, 100):
+        texts[slot] += " machine learning"
+    index = build_user_index([{"text": text} for text in texts])
+    query = "machine learning"
+    shared = fuzzy_candidates(index, query, default_max_distance(query))
+    assert len(shared) < len(texts) // 10
+    # 每个真正的匹配都仍在候选中
+    matching = {slot for slot, text in enumerate(texts)
+                if substring_distance(query, text, default_max_distance(query)) is not None}
+    assert matching <= shared.keys()
@@ -0,0 +1,56 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+mcp = pytest.importorskip("mcp")
+from mcp import ClientSession, StdioServerParameters  # noqa: E402
+from mcp.client.stdio import stdio_client  # noqa: E402
+import mcp.types as types  # noqa: E402
+
+from conftest import ROOT  # noqa: E402
+from openmemory_loadtest import MEM0_STUB  # noqa: E402
+
+
+def test_update_and_delete_publish_to_memory_owner(tmp_path):
+    stubs = tmp_path / "stubs" / "mem0"
+    stubs.mkdir(parents=True)
+    (stubs / "__init__.py").write_text(MEM0_STUB, encoding="utf-8")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path / "stubs"), ROOT]))
+    params = StdioServerParameters(command=sys.executable, args=[os.path.join(ROOT, "openmemory_mcp_server_google.py")],
+                                   env=env, cwd=str(tmp_path))
+    updated_uris = []
+
+    async def on_message(message):
+        if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ResourceUpdatedNotification):
+            updated_uris.append(str(message.root.params.uri))
+
+    async def read(session, uri):
+        return json.loads((await session.read_resource(uri)).contents[0].text)
+
+    async def scenario():
+        with open(os.devnull, "w") as devnull:
+            async with stdio_client(params, errlog=devnull) as (read_stream, write_stream):
+                async with ClientSession(read_stream, write_stream, message_handler=on_message) as session:
+                    await session.initialize()
+                    await session.call_tool("add_memories", {"text": "likes tea", "user_id": "alice"})
+                    snapshot = await read(session, "memory://users/alice")
+                    memory_id = snapshot["memories"][0]["id"]
+                    await session.subscribe_resource("memory://users/alice")
+
+                    # 调用方没有传入（或传错）user_id
+                    await session.call_tool("update_memory", {"memory_id": memory_id, "new_text": "likes coffee"})
+                    await session.call_tool("delete_memory", {"memory_id": memory_id, "user_id": "mallory"})
+                    await asyncio.sleep(0.2)
+                    return (await read(session, f"memory://users/alice/changes?since={snapshot['seq']}"),
+                            await read(session, "memory://users/mallory/changes?since=0"))
+
+    alice, mallory = asyncio.run(scenario())
+    assert [change["op"] for change in alice["changes"]] == ["update", "delete"]
+    update = alice["changes"][0]["memory"]
+    assert update["memory"] == "likes coffee"
+    assert update["user_id"] == "alice"
+    assert updated_uris == ["memory://users/alice"] * 2
+    assert mallory["changes"] == []
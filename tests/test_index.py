@@ -0,0 +1,41 @@
+import multiprocessing
+
+import pytest
+
+import openmemory_index
+from openmemory_index import build_token_index
+
+
+def sample_memories():
+    memories = {}
+    for u in range(7):
+        memories[f"user{u}"] = [
+            None if i % 5 == 3 else {"text": f"User {u} memory {i} about machine learning and cooking"}
+            for i in range(20 + u * 13)
+        ]
+    return memories
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_parallel_build_matches_serial(monkeypatch, start_method):
+    if start_method not in multiprocessing.get_all_start_methods():
+        pytest.skip(f"{start_method} 不可用")
+    memories = sample_memories()
+    serial = build_token_index(memories, workers=1)
+    monkeypatch.setattr(openmemory_index, "PARALLEL_MIN_MEMORIES", 0)
+    # 只留下一种启动方式，覆盖不支持 fork 时把分片数据传给子进程的路径
+    monkeypatch.setattr(multiprocessing, "get_all_start_methods", lambda: [start_method])
+    pools = []
+
+    class RecordingPool(openmemory_index.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            pools.append(self)
+
+    monkeypatch.setattr(openmemory_index, "ProcessPoolExecutor", RecordingPool)
+    parallel = build_token_index(memories, workers=3)
+    assert len(pools) == 1
+    assert parallel.keys() == serial.keys()
+    for user_id, index in serial.items():
+        assert {gram: list(p) for gram, p in parallel[user_id].items()} == {gram: list(p) for gram, p in index.items()}
+    assert openmemory_index._SOURCE is None
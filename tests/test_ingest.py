@@ -0,0 +1,78 @@
+import asyncio
+
+from openmemory_ingest import IngestQueue
+from openmemory_resilience import CircuitOpenError, OutcomeUnknownError
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+async def wait_for_status(queue, job_id, status):
+    for _ in range(200):
+        if queue.get_job(job_id)["status"] == status:
+            return queue.get_job(job_id)
+        await asyncio.sleep(0.01)
+    raise AssertionError(queue.get_job(job_id))
+
+
+def run_job(tmp_path, process, expect="done", **kwargs):
+    async def scenario():
+        queue = IngestQueue(process, db_path=str(tmp_path / "ingest.db"), workers=1, retry_base=0.01, **kwargs)
+        job_id = await queue.submit("hello", "alice")
+        try:
+            return await wait_for_status(queue, job_id, expect)
+        finally:
+            await queue.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_transient_failures_are_retried(tmp_path):
+    errors = [CircuitOpenError("open"), ServerError("unavailable")]
+
+    async def process(job):
+        if errors:
+            raise errors.pop(0)
+        return {"text": job["text"]}
+
+    job = run_job(tmp_path, process)
+    assert job["result"] == {"text": "hello"}
+    assert job["attempts"] == 2
+    assert job["error"] is None
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    calls = []
+
+    async def process(job):
+        calls.append(job["id"])
+        raise ServerError("unavailable")
+
+    job = run_job(tmp_path, process, "failed", max_attempts=3)
+    assert len(calls) == 3
+    assert job["attempts"] == 3
+
+
+def test_permanent_failure_is_not_retried(tmp_path):
+    calls = []
+
+    async def process(job):
+        calls.append(job["id"])
+        raise ValueError("bad input")
+
+    job = run_job(tmp_path, process, "failed")
+    assert calls == [job["id"]]
+    assert job["error"] == "bad input"
+
+
+def test_unknown_outcome_is_not_retried(tmp_path):
+    calls = []
+
+    async def process(job):
+        calls.append(job["id"])
+        raise OutcomeUnknownError("timed out")
+
+    job = run_job(tmp_path, process, "failed")
+    assert calls == [job["id"]]
+    assert job["attempts"] == 1
@@ -0,0 +1,139 @@
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import openmemory_mem0_config
+from openmemory_loadtest import MEM0_STUB
+from openmemory_mem0_config import apply_timeout, build_mem0_config, get_memory
+
+ENV_VARS = (
+    "OPENMEMORY_MEM0_CONFIG", "OPENMEMORY_VECTOR_STORE", "OPENMEMORY_VECTOR_PATH", "OPENMEMORY_COLLECTION",
+    "OPENMEMORY_QDRANT_URL", "OPENMEMORY_EMBEDDER", "OPENMEMORY_EMBED_MODEL", "OPENMEMORY_EMBED_DIMS",
+    "OPENMEMORY_LLM", "OPENMEMORY_LLM_MODEL", "OPENMEMORY_OLLAMA_URL",
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ENV_VARS:
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_no_configuration_uses_mem0_defaults():
+    assert build_mem0_config() is None
+
+
+def test_env_overrides_file(tmp_path, monkeypatch):
+    path = tmp_path / "mem0.json"
+    path.write_text(json.dumps({
+        "embedder": {"provider": "openai", "config": {"model": "text-embedding-3-small"}},
+        "history_db_path": "/data/history.db",
+    }), encoding="utf-8")
+    monkeypatch.setenv("OPENMEMORY_MEM0_CONFIG", str(path))
+    assert build_mem0_config()["embedder"]["provider"] == "openai"
+
+    monkeypatch.setenv("OPENMEMORY_EMBEDDER", "ollama")
+    monkeypatch.setenv("OPENMEMORY_OLLAMA_URL", "http://gpu:11434")
+    config = build_mem0_config()
+    assert config["embedder"] == {
+        "provider": "ollama",
+        "config": {"model": "nomic-embed-text", "ollama_base_url": "http://gpu:11434", "embedding_dims": 768},
+    }
+    # 环境变量没有涉及的项保留文件中的值
+    assert config["history_db_path"] == "/data/history.db"
+
+
+def test_unreadable_file_is_ignored(tmp_path, monkeypatch):
+    path = tmp_path / "mem0.json"
+    path.write_text("{not json", encoding="utf-8")
+    monkeypatch.setenv("OPENMEMORY_MEM0_CONFIG", str(path))
+    assert build_mem0_config() is None
+
+
+def test_vector_store_takes_embedder_dims(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENMEMORY_EMBEDDER", "huggingface")
+    monkeypatch.setenv("OPENMEMORY_EMBED_MODEL", "BAAI/bge-small-zh-v1.5")
+    monkeypatch.setenv("OPENMEMORY_VECTOR_STORE", "faiss")
+    monkeypatch.setenv("OPENMEMORY_VECTOR_PATH", str(tmp_path / "vectors"))
+    config = build_mem0_config()
+    assert config["embedder"]["config"]["embedding_dims"] == 512
+    assert config["vector_store"] == {
+        "provider": "faiss",
+        "config": {"collection_name": "openmemory", "path": str(tmp_path / "vectors"), "embedding_model_dims": 512},
+    }
+
+    # 显式指定的维度优先于推断
+    monkeypatch.setenv("OPENMEMORY_EMBED_DIMS", "256")
+    config = build_mem0_config()
+    assert config["embedder"]["config"]["embedding_dims"] == 256
+    assert config["vector_store"]["config"]["embedding_model_dims"] == 256
+
+
+def test_unknown_model_has_no_dims(monkeypatch):
+    monkeypatch.setenv("OPENMEMORY_EMBEDDER", "huggingface")
+    monkeypatch.setenv("OPENMEMORY_EMBED_MODEL", "my-org/custom-model")
+    monkeypatch.setenv("OPENMEMORY_VECTOR_STORE", "qdrant")
+    config = build_mem0_config()
+    assert "embedding_dims" not in config["embedder"]["config"]
+    assert "embedding_model_dims" not in config["vector_store"]["config"]
+
+
+def test_qdrant_path_or_url(monkeypatch):
+    monkeypatch.setenv("OPENMEMORY_VECTOR_STORE", "qdrant")
+    monkeypatch.setenv("OPENMEMORY_COLLECTION", "notes")
+    store = build_mem0_config()["vector_store"]["config"]
+    assert store == {"collection_name": "notes", "path": os.path.abspath("./openmemory_vectors"), "on_disk": True}
+
+    monkeypatch.setenv("OPENMEMORY_QDRANT_URL", "http://qdrant:6333")
+    store = build_mem0_config()["vector_store"]["config"]
+    assert store == {"collection_name": "notes", "url": "http://qdrant:6333"}
+
+
+def test_llm(monkeypatch):
+    monkeypatch.setenv("OPENMEMORY_LLM", "Ollama")
+    assert build_mem0_config()["llm"] == {
+        "provider": "ollama",
+        "config": {"model": "llama3.1", "ollama_base_url": "http://localhost:11434"},
+    }
+
+
+@pytest.mark.parametrize("name, value", [
+    ("OPENMEMORY_EMBEDDER", "openai"),
+    ("OPENMEMORY_VECTOR_STORE", "chroma"),
+    ("OPENMEMORY_LLM", "openai"),
+])
+def test_rejects_unknown_providers(monkeypatch, name, value):
+    monkeypatch.setenv(name, value)
+    with pytest.raises(ValueError, match=value):
+        build_mem0_config()
+
+
+@pytest.fixture
+def mem0_stub(tmp_path, monkeypatch):
+    package = tmp_path / "stubs" / "mem0"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text(MEM0_STUB, encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path / "stubs"))
+    monkeypatch.delitem(sys.modules, "mem0", raising=False)
+    monkeypatch.setattr(openmemory_mem0_config, "_pool", {})
+
+
+def test_get_memory_reuses_instance_per_config(mem0_stub):
+    config = {"vector_store": {"provider": "faiss", "config": {"path": "/tmp/a"}}}
+    memory = get_memory(config)
+    assert get_memory(json.loads(json.dumps(config))) is memory
+    assert get_memory({"vector_store": {"provider": "faiss", "config": {"path": "/tmp/b"}}}) is not memory
+    assert get_memory(None) is get_memory(None) is not memory
+
+
+def test_apply_timeout_sets_client_timeouts():
+    http = SimpleNamespace(timeout=None)
+    memory = SimpleNamespace(llm=SimpleNamespace(client=SimpleNamespace(timeout=600, _client=http)))
+    apply_timeout(memory, 12.5)
+    assert memory.llm.client.timeout == 12.5
+    assert http.timeout == 12.5
+    # 没有 LLM 客户端（例如测试桩）时什么也不做
+    apply_timeout(SimpleNamespace(), 12.5)
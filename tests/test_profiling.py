@@ -0,0 +1,60 @@
+import asyncio
+import json
+import pstats
+
+from openmemory_profiling import CallProfiler, phase, to_thread
+
+
+def blocking_work(n):
+    return sum(i * i for i in range(n))
+
+
+def test_cprofile_includes_worker_threads(tmp_path):
+    profiler = CallProfiler(mode="cprofile", sample_rate=1.0, profile_dir=str(tmp_path), slow_ms=0)
+
+    async def scenario():
+        async with profiler.profile("search_memories", "alice", {"query": "x"}):
+            return await to_thread(blocking_work, 10000)
+
+    assert asyncio.run(scenario()) == blocking_work(10000)
+    [path] = tmp_path.glob("*.prof")
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "blocking_work" in functions
+    assert profiler.profiles_written == 1
+
+
+def test_to_thread_without_profiling():
+    async def scenario():
+        return await to_thread(blocking_work, 10)
+
+    assert asyncio.run(scenario()) == blocking_work(10)
+
+
+def test_slow_call_log_records_phases(tmp_path):
+    log = tmp_path / "slow.jsonl"
+    profiler = CallProfiler(mode="", slow_ms=0.001, slow_log=str(log))
+
+    async def scenario():
+        async with profiler.profile("add_memories", "alice", {"text": "hello"}) as call:
+            await asyncio.sleep(0.01)
+            call.lap("queue")
+            with phase("store"):
+                await to_thread(blocking_work, 1000)
+
+    asyncio.run(scenario())
+    [line] = log.read_text(encoding="utf-8").splitlines()
+    record = json.loads(line)
+    assert record["tool"] == "add_memories"
+    assert set(record["phases_ms"]) == {"queue", "store", "format"}
+    assert record["phases_ms"]["queue"] >= 5
+    assert record["arg_bytes"] == {"text": 5}
+
+
+def test_disabled_profiler_yields_none():
+    profiler = CallProfiler(mode="", slow_ms=0)
+
+    async def scenario():
+        async with profiler.profile("list_memories", "alice", {}) as call:
+            return call
+
+    assert asyncio.run(scenario()) is None
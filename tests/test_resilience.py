@@ -0,0 +1,193 @@
+import asyncio
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from openmemory_resilience import CircuitBreaker, CircuitOpenError, OutcomeUnknownError, ResilientCaller
+
+
+class FakeEndpoint:
+    """本地假 API：按脚本依次返回状态码，可设置响应延迟"""
+
+    def __init__(self):
+        self.statuses = []
+        self.delay = 0.0
+        self.requests = 0
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                endpoint.requests += 1
+                if endpoint.delay:
+                    threading.Event().wait(endpoint.delay)
+                status = endpoint.statuses.pop(0) if endpoint.statuses else 200
+                body = f"response {endpoint.requests}".encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def fetch(self) -> str:
+        with urllib.request.urlopen(self.url, timeout=5) as response:
+            return response.read().decode()
+
+
+@pytest.fixture
+def endpoint():
+    endpoint = FakeEndpoint()
+    yield endpoint
+    endpoint.server.shutdown()
+    endpoint.server.server_close()
+
+
+def make_caller(**kwargs):
+    kwargs.setdefault("timeout", 10.0)
+    kwargs.setdefault("max_retries", 3)
+    kwargs.setdefault("backoff_base", 0.001)
+    return ResilientCaller(**kwargs)
+
+
+def test_retries_transient_errors(endpoint):
+    endpoint.statuses = [503, 429]
+    caller = make_caller()
+    assert asyncio.run(caller.call(endpoint.fetch)) == "response 3"
+    assert caller.stats["retries"] == 2
+    assert caller.breaker.state == "closed"
+
+
+def test_does_not_retry_client_errors(endpoint):
+    endpoint.statuses = [400]
+    caller = make_caller()
+    with pytest.raises(urllib.error.HTTPError):
+        asyncio.run(caller.call(endpoint.fetch))
+    assert endpoint.requests == 1
+
+
+def test_breaker_opens_and_rejects_without_calling(endpoint):
+    endpoint.statuses = [503] * 10
+    caller = make_caller(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(urllib.error.HTTPError):
+                await caller.call(endpoint.fetch)
+        with pytest.raises(CircuitOpenError):
+            await caller.call(endpoint.fetch)
+        assert await caller.call(endpoint.fetch, fallback=lambda: "cached") == "cached"
+
+    asyncio.run(scenario())
+    assert endpoint.requests == 2
+    assert caller.breaker.state == "open"
+
+
+def test_cancelled_probe_does_not_wedge_breaker(endpoint):
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 10.0
+    endpoint.delay = 0.3
+    caller = make_caller(breaker=breaker)
+
+    async def scenario():
+        probe = asyncio.create_task(caller.call(endpoint.fetch))
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        endpoint.delay = 0
+        return await caller.call(endpoint.fetch)
+
+    assert asyncio.run(scenario()).startswith("response")
+    assert breaker.state == "closed"
+
+
+def test_coalesces_identical_calls(endpoint):
+    endpoint.delay = 0.2
+    caller = make_caller()
+
+    async def scenario():
+        return await asyncio.gather(*(caller.call(endpoint.fetch, coalesce_key="same") for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["response 1"] * 5
+    assert endpoint.requests == 1
+    assert caller.stats["coalesced"] == 4
+    assert len(caller.singleflight) == 0
+
+
+def test_leader_cancel_does_not_fail_followers(endpoint):
+    endpoint.delay = 0.2
+    caller = make_caller()
+
+    async def scenario():
+        leader = asyncio.create_task(caller.call(endpoint.fetch, coalesce_key="same"))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(caller.call(endpoint.fetch, coalesce_key="same")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(scenario()) == ["response 1"] * 2
+    assert endpoint.requests == 1
+
+
+def test_hung_calls_do_not_delay_fallbacks():
+    release = threading.Event()
+    started = []
+
+    def hang():
+        started.append(1)
+        release.wait(10)
+
+    caller = make_caller(timeout=0.3, max_retries=0, workers=4,
+                         breaker=CircuitBreaker(failure_threshold=1000))
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        begin = loop.time()
+        results = await asyncio.gather(*(caller.call(hang, fallback=lambda: "local") for _ in range(40)))
+        return results, loop.time() - begin
+
+    try:
+        results, elapsed = asyncio.run(scenario())
+    finally:
+        release.set()
+    assert results == ["local"] * 40
+    assert elapsed < 2
+    # 超时时还在排队的调用被取消，不会在线程空出后继续执行
+    assert len(started) == 4
+
+
+def test_non_idempotent_timeout_is_not_retried():
+    release = threading.Event()
+    started = []
+
+    def add():
+        started.append(1)
+        release.wait(10)
+
+    caller = make_caller(timeout=0.2, workers=1)
+
+    async def scenario():
+        running = asyncio.ensure_future(caller.call(add, idempotent=False))
+        await asyncio.sleep(0.05)
+        # 唯一的工作线程被占用，第二个调用超时时还没有开始执行
+        queued = caller.call(add, idempotent=False)
+        return await asyncio.gather(running, queued, return_exceptions=True)
+
+    try:
+        running, queued = asyncio.run(scenario())
+    finally:
+        release.set()
+    assert isinstance(running, OutcomeUnknownError)
+    assert isinstance(queued, asyncio.TimeoutError)
+    assert len(started) == 1
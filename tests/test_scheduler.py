@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+import openmemory_scheduler
+from openmemory_scheduler import FairScheduler, Overloaded, RateLimited
+
+
+async def hold(scheduler, tool, user_id, release):
+    async with scheduler.admit(tool, user_id):
+        await release.wait()
+
+
+def test_no_rate_limits_by_default(monkeypatch):
+    monkeypatch.delenv("OPENMEMORY_RATE_LIMITS", raising=False)
+    scheduler = FairScheduler()
+    assert scheduler.rate_limits == {}
+
+    async def scenario():
+        for _ in range(50):
+            async with scheduler.admit("list_memories", "alice"):
+                pass
+
+    asyncio.run(scenario())
+    assert scheduler.rejected == {"rate_limited": 0, "overloaded": 0}
+
+
+def test_rate_limits_from_env(monkeypatch):
+    monkeypatch.setenv("OPENMEMORY_RATE_LIMITS", "list_memories=0.001/2")
+    scheduler = FairScheduler()
+
+    async def scenario():
+        for _ in range(2):
+            async with scheduler.admit("list_memories", "alice"):
+                pass
+        with pytest.raises(RateLimited):
+            async with scheduler.admit("list_memories", "alice"):
+                pass
+        # 限流按用户计算
+        async with scheduler.admit("list_memories", "bob"):
+            pass
+
+    asyncio.run(scenario())
+
+
+def test_overloaded_requests_do_not_consume_tokens():
+    scheduler = FairScheduler(max_concurrency=1, per_user_concurrency=1, user_queue_limit=1,
+                              rate_limits={"add_memories": (0.001, 3)})
+
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(scheduler, "add_memories", "alice", release))
+        queued = asyncio.create_task(hold(scheduler, "add_memories", "alice", release))
+        await asyncio.sleep(0)
+        for _ in range(5):
+            with pytest.raises(Overloaded):
+                async with scheduler.admit("add_memories", "alice"):
+                    pass
+        release.set()
+        await asyncio.gather(running, queued)
+        # 两个请求各用一个令牌，被拒绝的五个请求没有消耗令牌
+        async with scheduler.admit("add_memories", "alice"):
+            pass
+
+    asyncio.run(scenario())
+    assert scheduler.rejected == {"rate_limited": 0, "overloaded": 5}
+
+
+def test_fair_between_users():
+    scheduler = FairScheduler(max_concurrency=1, per_user_concurrency=1)
+    order = []
+
+    async def call(user_id):
+        async with scheduler.admit("search_memories", user_id):
+            order.append(user_id)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        tasks = [asyncio.create_task(call("alice")) for _ in range(4)]
+        tasks += [asyncio.create_task(call("bob")) for _ in range(2)]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order[:4] == ["alice", "bob", "alice", "bob"]
+
+
+def test_idle_users_are_dropped():
+    scheduler = FairScheduler(max_concurrency=2, per_user_concurrency=1)
+
+    async def scenario():
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(scheduler, "search_memories", f"user{i}", release)) for i in range(200)]
+        await asyncio.sleep(0)
+        assert len(scheduler._waiting) == 198
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert scheduler._users == {} and scheduler._waiting == {}
+    assert scheduler.running == scheduler.queued == 0
+
+
+def test_rate_limited_users_are_kept_until_refilled(monkeypatch):
+    monkeypatch.setattr(openmemory_scheduler, "SWEEP_MIN_USERS", 2)
+    scheduler = FairScheduler(rate_limits={"add_memories": (0.001, 1), "list_memories": (1000, 1)})
+
+    async def scenario():
+        async with scheduler.admit("add_memories", "alice"):
+            pass
+        # 桶未补满时保留状态，否则限流可以被绕过
+        with pytest.raises(RateLimited):
+            async with scheduler.admit("add_memories", "alice"):
+                pass
+        async with scheduler.admit("list_memories", "bob"):
+            pass
+        assert set(scheduler._users) == {"alice", "bob"}
+        await asyncio.sleep(0.01)
+        # 新用户触发清理，桶已补满的 bob 被移除
+        async with scheduler.admit("list_memories", "carol"):
+            pass
+
+    asyncio.run(scenario())
+    assert set(scheduler._users) == {"alice", "carol"}
@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import mcp.types as types
+import pytest
+
+
+@pytest.fixture
+def call_tool(simple, make_store, monkeypatch):
+    """在进程内调用简化版服务器的工具，存储换成临时目录中的实例"""
+    store = make_store()
+    monkeypatch.setattr(simple, "memory_store", store)
+    server = simple.OpenMemoryMCPServer()
+    handler = server.server.request_handlers[types.CallToolRequest]
+
+    def call(name, arguments):
+        request = types.CallToolRequest(method="tools/call", params=types.CallToolRequestParams(name=name, arguments=arguments))
+        result = asyncio.run(handler(request))
+        return result.root.content[0].text
+
+    call.store = store
+    return call
+
+
+@pytest.mark.parametrize("tool, arguments", [
+    ("search_memory", {"query": "tea", "format": "pretty", "fields": ["id"]}),
+    ("list_memories", {"format": "pretty", "max_bytes": 100}),
+])
+def test_invalid_format_is_rejected_before_querying(call_tool, monkeypatch, tool, arguments):
+    call_tool.store.add_memory("likes tea", "default_user")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("查询不应执行")
+
+    monkeypatch.setattr(call_tool.store, "search_memories", fail)
+    monkeypatch.setattr(call_tool.store, "get_all_memories", fail)
+    assert "格式" in call_tool(tool, arguments)
+    assert call_tool.store._access == {}
+
+
+def test_projection_defaults_to_json(call_tool):
+    call_tool.store.add_memory("likes tea", "default_user")
+    assert call_tool("search_memory", {"query": "tea", "fields": ["text"]}) == '{"count":1,"results":[{"text":"likes tea"}]}'
+
+
+def test_status_counts_cold_only_users(call_tool, make_store, simple, monkeypatch):
+    store = make_store(ram_budget=4000)
+    monkeypatch.setattr(simple, "memory_store", store)
+    store.add_memory("bob's only memory", "bob")
+    carol = store.add_memory("carol's memory", "carol")
+    store.delete_memory(carol["id"])
+    for i in range(30):
+        store.add_memory(f"memory number {i}", "alice")
+    # bob 的记忆已全部降级到冷层，热层中已没有他
+    assert "bob" not in store.memories
+    text = call_tool("get_server_status", {})
+    status = json.loads(text[text.index("{"):])
+    assert status["total_users"] == 2
@@ -0,0 +1,61 @@
+import shutil
+
+
+def texts(store, user_id="alice"):
+    return [m["text"] for m in store.get_all_memories(user_id)]
+
+
+def test_journal_replay_restores_changes(make_store):
+    store = make_store()
+    first = store.add_memory("first memory", "alice")
+    second = store.add_memory("second memory", "alice")
+    store.add_memory("bob's memory", "bob")
+    store.update_memory(first["id"], "first memory, edited")
+    store.delete_memory(second["id"])
+
+    restarted = make_store()
+    assert texts(restarted) == ["first memory, edited"]
+    assert texts(restarted, "bob") == ["bob's memory"]
+    assert restarted.last_seq == store.last_seq
+
+
+def test_torn_journal_tail_is_truncated(make_store):
+    store = make_store()
+    store.add_memory("first memory", "alice")
+    store.add_memory("second memory", "alice")
+    with open(store.journal_path, "rb+") as f:
+        f.seek(-10, 2)
+        f.truncate()
+
+    restarted = make_store()
+    assert texts(restarted) == ["first memory"]
+    restarted.add_memory("third memory", "alice")
+
+    # 残行被截掉后，新日志不会接在残行后面而在下次重启时丢失
+    again = make_store()
+    assert texts(again) == ["first memory", "third memory"]
+
+
+def test_journal_left_behind_after_snapshot_is_not_replayed(make_store):
+    store = make_store()
+    store.add_memory("first memory", "alice")
+    store.add_memory("second memory", "alice")
+    journal = store.journal_path + ".bak"
+    shutil.copy(store.journal_path, journal)
+    store._save_memories()
+    # 模拟快照替换后、删除日志前进程退出
+    shutil.copy(journal, store.journal_path)
+
+    restarted = make_store()
+    assert texts(restarted) == ["first memory", "second memory"]
+    restarted.add_memory("third memory", "alice")
+    assert texts(make_store()) == ["first memory", "second memory", "third memory"]
+
+
+def test_checkpoint_then_replay(make_store):
+    store = make_store(checkpoint_min=2)
+    for i in range(5):
+        store.add_memory(f"memory {i}", "alice")
+
+    restarted = make_store()
+    assert texts(restarted) == [f"memory {i}" for i in range(5)]
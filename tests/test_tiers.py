@@ -0,0 +1,114 @@
+import pytest
+
+from openmemory_codec import BlockCodec
+from openmemory_tiers import ColdStore
+
+BUDGET = 4000
+
+
+def texts(store, user_id="alice"):
+    return [m["text"] for m in store.get_all_memories(user_id)]
+
+
+@pytest.fixture
+def tiered(make_store):
+    def make(**kwargs):
+        kwargs.setdefault("ram_budget", BUDGET)
+        return make_store(**kwargs)
+
+    store = make()
+    for i in range(30):
+        store.add_memory(f"memory number {i}", "alice")
+    store.add_memory("bob's only memory", "bob")
+    return make, store
+
+
+EXPECTED = [f"memory number {i}" for i in range(30)]
+
+
+def test_demotes_beyond_budget(tiered):
+    _, store = tiered
+    stats = store.tier_stats()
+    assert stats["hot_bytes_estimate"] <= BUDGET
+    assert stats["cold_memories"] > 0
+    assert store.total_memories == 31
+    assert texts(store) == EXPECTED
+
+
+@pytest.mark.parametrize("checkpoint", [False, True])
+def test_cold_tier_survives_restart(tiered, checkpoint):
+    make, store = tiered
+    if checkpoint:
+        store._save_memories()
+    restarted = make()
+    assert restarted.tier_stats()["cold_memories"] == store.tier_stats()["cold_memories"]
+    assert texts(restarted) == EXPECTED
+    assert texts(restarted, "bob") == ["bob's only memory"]
+
+
+def test_search_promotes_cold_memory(tiered):
+    make, store = tiered
+    cold_id = next(iter(store.cold.locations))
+    text = store.cold.get(cold_id)["text"]
+    results = store.search_memories(text, "alice", limit=50)
+    assert cold_id in [m["id"] for m in results]
+    assert cold_id not in store.cold.locations
+    assert texts(make()) == EXPECTED
+
+
+def test_update_and_delete_cold_memories(tiered):
+    make, store = tiered
+    cold_ids = [memory_id for memory_id in store.cold.locations if store.cold.owner(memory_id) == "alice"]
+    updated, deleted = cold_ids[:2]
+    old_text = store.get_memory(deleted)["text"]
+    assert store.update_memory(updated, "rewritten while cold")["text"] == "rewritten while cold"
+    assert store.delete_memory(deleted) is not None
+
+    for current in (store, make()):
+        assert current.get_memory(updated)["text"] == "rewritten while cold"
+        assert current.get_memory(deleted) is None
+        assert old_text not in texts(current)
+        assert len(texts(current)) == 29
+
+
+def test_delete_all_removes_cold_segments(tiered):
+    make, store = tiered
+    assert store.delete_all_memories("alice") == {"deleted_count": 30}
+    assert store.cold.count("alice") == 0
+    assert texts(make()) == []
+    assert texts(make(), "bob") == ["bob's only memory"]
+
+
+@pytest.mark.parametrize("method", ["none", "zlib", "zstd"])
+def test_segment_round_trip(tmp_path, method):
+    codec = BlockCodec(method) if method != "none" else None
+    cold = ColdStore(str(tmp_path / "cold"), codec)
+    memories = [{"id": str(i), "text": f"记忆 {i}", "user_id": "alice"} for i in range(5)]
+    name = cold.write_segment(memories)
+    cold.register(name, "alice", [m["id"] for m in memories], len(memories))
+    assert list(cold.read_segment(name)) == memories
+
+    cold.remove("2")
+    reopened = ColdStore(str(tmp_path / "cold"), codec)
+    reopened.load_manifest(cold.manifest())
+    assert [m["id"] for m in reopened.read_segment(name)] == ["0", "1", "3", "4"]
+    assert reopened.get("2") is None
+    assert reopened.owner("4") == "alice"
+
+
+@pytest.mark.parametrize("method", ["zlib", "zstd"])
+def test_restart_without_compression_reads_dictionary_segments(make_store, method):
+    store = make_store(ram_budget=BUDGET, compression=method)
+    for i in range(15):
+        store.add_memory(f"memory number {i}", "alice")
+    # 快照时训练字典，此后降级的冷段都用字典压缩
+    store._save_memories()
+    for i in range(15, 30):
+        store.add_memory(f"memory number {i}", "alice")
+    assert store.codec.current_dict
+    store._save_memories()
+
+    restarted = make_store(ram_budget=BUDGET, compression="none")
+    assert texts(restarted) == EXPECTED
+    cold_id = next(iter(restarted.cold.locations))
+    assert restarted.search_memories(restarted.cold.get(cold_id)["text"], "alice", limit=50)
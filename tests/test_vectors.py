@@ -0,0 +1,177 @@
+import asyncio
+import os
+import random
+import zlib
+
+import pytest
+
+import openmemory_vectors
+from openmemory_vectors import MODES, VectorIndex
+
+
+def random_vectors(count, dim=32, seed=0):
+    rng = random.Random(seed)
+    return [[rng.gauss(0, 1) for _ in range(dim)] for _ in range(count)]
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "pure"])
+def numpy_mode(request, monkeypatch):
+    if request.param and not openmemory_vectors.NUMPY_AVAILABLE:
+        pytest.skip("numpy not installed")
+    monkeypatch.setattr(openmemory_vectors, "NUMPY_AVAILABLE", request.param)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_search_finds_exact_vector(tmp_path, mode, numpy_mode):
+    vectors = random_vectors(200)
+    index = VectorIndex(mode, str(tmp_path / "index.vec"))
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector, group="even" if i % 2 == 0 else "odd")
+    for i in (0, 17, 150):
+        item_id, score = index.search(vectors[i], k=3)[0]
+        assert item_id == str(i)
+        assert score == pytest.approx(1.0, abs=1e-3)
+    assert all(int(item_id) % 2 == 1 for item_id, _ in index.search(vectors[0], k=10, group="odd"))
+    index.close()
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_numpy_and_pure_python_agree(tmp_path, mode, monkeypatch):
+    if not openmemory_vectors.NUMPY_AVAILABLE:
+        pytest.skip("numpy not installed")
+    vectors = random_vectors(300, seed=1)
+    index = VectorIndex(mode, str(tmp_path / "index.vec"))
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector)
+    queries = random_vectors(5, seed=2)
+    fast = [[item_id for item_id, _ in index.search(q, k=10)] for q in queries]
+    monkeypatch.setattr(openmemory_vectors, "NUMPY_AVAILABLE", False)
+    assert [[item_id for item_id, _ in index.search(q, k=10)] for q in queries] == fast
+    index.close()
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_bulk_load_matches_incremental_encoding(tmp_path, mode, monkeypatch):
+    if not openmemory_vectors.NUMPY_AVAILABLE:
+        pytest.skip("numpy not installed")
+    monkeypatch.setattr(openmemory_vectors, "LOAD_CHUNK", 7)
+    path = str(tmp_path / "index.vec")
+    index = VectorIndex(mode, path)
+    for i, vector in enumerate(random_vectors(40, dim=37) + [[0.0] * 37]):
+        index.add(str(i), vector)
+    index.close()
+
+    def encoded(index):
+        return bytes(index._floats), bytes(index._codes), bytes(index._scales), bytes(index._bits)
+
+    loaded = {}
+    for numpy_available in (True, False):
+        monkeypatch.setattr(openmemory_vectors, "NUMPY_AVAILABLE", numpy_available)
+        everything = VectorIndex(mode, path)
+        assert everything.load() == 41
+        assert encoded(everything) == encoded(index)
+        everything.close()
+        # 剔除死行后槽位不再与文件顺序一致
+        filtered = VectorIndex(mode, path)
+        assert filtered.load(lambda item_id: item_id != "5") == 40
+        loaded[numpy_available] = encoded(filtered)
+        filtered.close()
+    assert loaded[True] == loaded[False]
+
+
+def test_reload_and_compact(tmp_path):
+    path = str(tmp_path / "index.vec")
+    vectors = random_vectors(50)
+    index = VectorIndex("int8", path)
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector)
+    index.add("3", vectors[4])  # 替换
+    index.remove("7")
+    index.close()
+
+    live = {str(i) for i in range(50)} - {"7"}
+    reloaded = VectorIndex("int8", path)
+    assert reloaded.load(live.__contains__, dim=32) == 49
+    assert reloaded.search(vectors[4], k=2)[0][0] in ("3", "4")
+    size = os.path.getsize(path)
+    reloaded.compact()
+    assert os.path.getsize(path) < size
+    assert len(reloaded) == 49 and reloaded.dead_rows == 0
+    assert reloaded.search(vectors[10], k=1)[0][0] == "10"
+    reloaded.close()
+
+    # 更换嵌入模型（维度变化）时丢弃旧文件
+    assert VectorIndex("int8", path).load(dim=64) == 0
+    assert not os.path.exists(path)
+
+
+class HashEmbedder:
+    """按词哈希的假嵌入模型，相同词越多越相似"""
+
+    dim = 64
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dim
+            for word in text.lower().split():
+                vector[zlib.crc32(word.encode()) % self.dim] += 1.0
+            vectors.append(vector)
+        return vectors
+
+
+@pytest.fixture
+def semantic_store(simple, make_store, monkeypatch):
+    embedder = HashEmbedder()
+    monkeypatch.setattr(simple, "load_embedder", lambda: embedder)
+
+    def make():
+        return make_store(vector_mode="int8")
+
+    return make, embedder
+
+
+def test_store_embeds_off_the_event_loop_and_backfills(semantic_store):
+    make, embedder = semantic_store
+    store = make()
+    assert embedder.calls == 0
+
+    async def scenario(store):
+        store.add_memory("the cat sat on the mat", "alice")
+        store.add_memory("quarterly revenue report", "alice")
+        assert len(store.vectors) == 0  # 写入本身不嵌入
+        await store.sync_vectors()
+        vector = await store.embed_query("cat on a mat")
+        return store.search_memories("cat on a mat", "alice", limit=1, semantic=True, query_vector=vector)
+
+    [hit] = asyncio.run(scenario(store))
+    assert hit["text"] == "the cat sat on the mat"
+
+    os.remove(store.vectors.path)
+    store.vectors.close()
+    restarted = make()  # 启动时不嵌入，由后台任务补齐
+    assert len(restarted.vectors) == 0
+    asyncio.run(restarted.backfill_vectors())
+    assert len(restarted.vectors) == 2
+
+
+def test_stale_embedding_is_not_written(semantic_store):
+    make, _ = semantic_store
+    store = make()
+
+    async def scenario():
+        memory = store.add_memory("first text", "alice")
+        embedding = asyncio.create_task(store.sync_vectors())
+        await asyncio.sleep(0)
+        store.update_memory(memory["id"], "second text")
+        await embedding
+        await store.sync_vectors()
+        return memory["id"], await store.embed_query("second text")
+
+    memory_id, vector = asyncio.run(scenario())
+    [hit] = store.semantic_search("second text", "alice", 1, vector)
+    assert hit["id"] == memory_id and hit["score"] == pytest.approx(1.0, abs=1e-3)